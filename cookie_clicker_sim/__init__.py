@@ -10,9 +10,6 @@ __author__ = "Cookie Clicker Simulator Team"
 from .core.game_state import GameState
 from .core.buildings import Building, BUILDINGS
 from .core.upgrades import Upgrade, UPGRADES
-from .engines.simulator import GameSimulator
-from .engines.cps_calculator import CPSCalculator
-from .engines.purchase_optimizer import PurchaseOptimizer
 
 # 可选的可视化模块
 try:
@@ -33,3 +30,11 @@ __all__ = [
 
 if _HAS_VISUALIZATION:
     __all__.append('DataVisualizer')
+
+
+def __getattr__(name):
+    """引擎类经由engines包按需导入"""
+    if name in ('GameSimulator', 'CPSCalculator', 'PurchaseOptimizer'):
+        from . import engines
+        return getattr(engines, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
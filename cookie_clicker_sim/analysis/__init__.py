@@ -3,11 +3,14 @@
 """
 
 from .visualizer import DataVisualizer
-from .predictor import ProgressPredictor
-from .efficiency import EfficiencyAnalyzer
+from .predictor import ProgressPredictor, AscensionOption
+from .efficiency import EfficiencyAnalyzer, BuildingEfficiencyRow, StrategyResult
 
 __all__ = [
     'DataVisualizer',
     'ProgressPredictor', 
-    'EfficiencyAnalyzer'
+    'EfficiencyAnalyzer',
+    'AscensionOption',
+    'BuildingEfficiencyRow',
+    'StrategyResult'
 ]
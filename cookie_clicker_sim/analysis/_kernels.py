@@ -0,0 +1,25 @@
+"""
+分析模块的数值内核
+
+在建筑物数组(见core.buildings_soa)上运行的紧凑循环，安装numba时会被JIT编译。
+"""
+
+from ..core._jit import njit
+
+
+@njit(cache=True, fastmath=True)
+def best_building_index(base_prices, base_cps, price_factors, multipliers):
+    """
+    返回效率(CPS增长/价格)最高的建筑物下标，全部效率都不为正时返回-1
+    
+    price_factors由调用方按数量算好(见buildings_soa.price_factors)，
+    numba不做越界检查，内核里不再按数量查表
+    """
+    best = -1
+    best_efficiency = 0.0
+    for i in range(base_prices.shape[0]):
+        efficiency = base_cps[i] * multipliers[i] / (base_prices[i] * price_factors[i])
+        if efficiency > best_efficiency:
+            best_efficiency = efficiency
+            best = i
+    return best
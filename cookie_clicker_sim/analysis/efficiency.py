@@ -4,10 +4,42 @@
 分析Cookie Clicker中各种购买选项的效率
 """
 
+import numpy as np
+from dataclasses import dataclass
+from operator import attrgetter
 from typing import Dict, List, Tuple, Optional, Any
 from ..core.game_state import GameState
 from ..core.buildings import BUILDINGS
+from ..core.buildings_soa import NAMES, BASE_PRICES, BASE_CPS, price_factors
 from ..core.upgrades import UPGRADES
+from ._kernels import best_building_index
+
+
+# 一次性取出策略比较所需的游戏状态字段
+_STRATEGY_FIELDS = attrgetter('cookies', 'cookies_per_second', 'prestige')
+
+# 建筑物按基础效率(基础CPS/基础价格)从高到低的下标排序 (稳定排序，与逐个比较时的并列处理一致)
+_EFF_RANK = np.argsort(-(BASE_CPS / BASE_PRICES), kind='stable')
+
+
+@dataclass(slots=True)
+class BuildingEfficiencyRow:
+    """单种建筑物的效率分析结果"""
+    amount: int
+    price: float
+    cps: float
+    efficiency: float
+    cps_per_building: float
+
+
+@dataclass(slots=True)
+class StrategyResult:
+    """单个策略的比较结果"""
+    cookies: float
+    cps: float
+    buildings: int
+    upgrades: int
+    prestige: int
 
 
 class EfficiencyAnalyzer:
@@ -16,27 +48,35 @@ class EfficiencyAnalyzer:
     def __init__(self):
         pass
     
-    def analyze_building_efficiency(self, game_state: GameState) -> Dict[str, Dict[str, float]]:
+    def analyze_building_efficiency(self, game_state: GameState) -> Dict[str, BuildingEfficiencyRow]:
         """
         分析所有建筑物的效率
         """
         results = {}
         
-        for building_name, building in BUILDINGS.items():
-            current_amount = game_state.get_building_count(building_name)
-            
-            if current_amount > 0:
-                price = building.get_price(current_amount)
-                cps = building.get_cps_contribution(current_amount, game_state)
-                efficiency = building.get_efficiency(current_amount, game_state)
-                
-                results[building_name] = {
-                    'amount': current_amount,
-                    'price': price,
-                    'cps': cps,
-                    'efficiency': efficiency,
-                    'cps_per_building': cps / current_amount if current_amount > 0 else 0
-                }
+        counts = self._building_counts(game_state)
+        owned = np.flatnonzero(counts > 0)
+        if owned.size == 0:
+            return results
+        
+        names = NAMES[owned].tolist()
+        amounts = counts[owned]
+        
+        # 每个建筑物的倍数只计算一次，其余全部为数组运算
+        multipliers = np.fromiter(
+            (BUILDINGS[name].get_total_multiplier(game_state) for name in names),
+            dtype=np.float64, count=len(names)
+        )
+        cps_per_building = BASE_CPS[owned] * multipliers
+        prices = BASE_PRICES[owned] * price_factors(amounts)
+        cps = cps_per_building * amounts
+        efficiencies = cps_per_building / prices
+        
+        for name, amount, price, building_cps, efficiency, per_building in zip(
+                names, amounts.tolist(), prices.tolist(), cps.tolist(),
+                efficiencies.tolist(), cps_per_building.tolist()):
+            results[name] = BuildingEfficiencyRow(amount, price, building_cps,
+                                                  efficiency, per_building)
         
         return results
     
@@ -44,32 +84,42 @@ class EfficiencyAnalyzer:
         """
         找到效率最高的建筑物
         """
-        best_building = None
-        best_efficiency = 0.0
+        counts = self._building_counts(game_state)
         
-        for building_name, building in BUILDINGS.items():
-            current_amount = game_state.get_building_count(building_name)
-            efficiency = building.get_efficiency(current_amount, game_state)
-            
-            if efficiency > best_efficiency:
-                best_efficiency = efficiency
-                best_building = building_name
+        # 空白状态下各建筑物倍数只剩全局的牛奶/声望倍数，排名就是基础效率排名
+        if (not counts.any() and not game_state.upgrades_owned
+                and not any(game_state.building_levels.values())):
+            return str(NAMES[_EFF_RANK[0]])
         
-        return best_building
+        multipliers = np.fromiter(
+            (building.get_total_multiplier(game_state) for building in BUILDINGS.values()),
+            dtype=np.float64, count=len(BUILDINGS)
+        )
+        best = best_building_index(BASE_PRICES, BASE_CPS, price_factors(counts), multipliers)
+        if best < 0:
+            return None
+        return str(NAMES[best])
+    
+    def _building_counts(self, game_state: GameState) -> np.ndarray:
+        """
+        按BUILDINGS顺序收集建筑物数量
+        """
+        return np.array(game_state._amounts, dtype=np.int64)
     
-    def compare_strategies(self, strategies: Dict[str, GameState]) -> Dict[str, Dict[str, Any]]:
+    def compare_strategies(self, strategies: Dict[str, GameState]) -> Dict[str, StrategyResult]:
         """
         比较不同策略的效果
         """
         results = {}
         
         for strategy_name, game_state in strategies.items():
-            results[strategy_name] = {
-                'cookies': game_state.cookies,
-                'cps': game_state.cookies_per_second,
-                'buildings': game_state.get_total_buildings(),
-                'upgrades': len(game_state.upgrades_owned),
-                'prestige': game_state.prestige
-            }
+            cookies, cps, prestige = _STRATEGY_FIELDS(game_state)
+            results[strategy_name] = StrategyResult(
+                cookies=cookies,
+                cps=cps,
+                buildings=game_state.get_total_buildings(),
+                upgrades=len(game_state.upgrades_owned),
+                prestige=prestige
+            )
         
         return results
@@ -4,26 +4,124 @@ Cookie Clicker 数值模型深度分析
 分析游戏的核心数值机制、增长模型和最优策略
 """
 
+import functools
+import io
 import math
+from types import MappingProxyType
+from typing import Dict, List, Mapping, Tuple, Any
 import numpy as np
-import pandas as pd
-from typing import Dict, List, Tuple, Any
 from ..core.game_state import GameState
-from ..core.buildings import BUILDINGS
+from ..core.buildings_soa import NAMES, NAME_TO_IDX, BASE_PRICES, BASE_CPS, POW_TABLE
 from ..core.constants import *
 
 
+# 价格翻倍所需建筑物数量与每个建筑物的效率衰减百分比 (只依赖价格倍数)
+_DOUBLING_TIME = math.log(2) / math.log(BUILDING_PRICE_MULTIPLIER)
+_DECAY_RATE_PCT = (1 - 1 / BUILDING_PRICE_MULTIPLIER) * 100
+
+# 价格增长示例的结构化数组字段 (数量, 价格)
+_PRICE_PROGRESSION_DTYPE = [('amount', 'i4'), ('price', 'f8')]
+
+# 综合报告中不依赖分析结果的固定结论部分
+_REPORT_CONCLUSIONS = """
+## 4. 关键洞察
+
+### 4.1 数学本质
+Cookie Clicker本质上是一个指数增长与指数成本的平衡游戏。建筑物价格的1.15倍增长创造了一个自然的效率衰减，迫使玩家不断寻找新的增长点。
+
+### 4.2 策略核心
+最优策略的核心是在任何给定时刻选择效率最高的投资选项。这需要平衡：
+- 短期CPS增长 vs 长期投资
+- 建筑物购买 vs 升级购买
+- 当前进度 vs 重生收益
+
+### 4.3 心理设计
+游戏通过以下机制维持玩家参与：
+- 指数增长带来的成就感
+- 持续的新解锁内容
+- 重生系统提供的"重新开始"动机
+- 数字增长的视觉满足感
+
+## 5. 建议与结论
+
+对于新玩家：
+1. 早期专注于建立基础CPS
+2. 不要忽视升级的重要性
+3. 学会计算购买效率
+4. 适时进行第一次重生
+
+对于高级玩家：
+1. 精确计算重生时机
+2. 优化天堂升级路径
+3. 利用小游戏系统
+4. 平衡主动和挂机游戏
+
+Cookie Clicker的成功在于其简单而深刻的数学模型，以及精心设计的心理激励机制。
+"""
+
+
+def _freeze(value):
+    """把分析结果转为只读结构: 字典->只读映射，列表->元组，数组->只读数组"""
+    if isinstance(value, dict):
+        return MappingProxyType({k: _freeze(v) for k, v in value.items()})
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(v) for v in value)
+    if isinstance(value, np.ndarray):
+        value.setflags(write=False)
+    return value
+
+
+def _memoized(report):
+    """
+    缓存无参分析方法的结果
+    
+    结果只依赖模块级常量和buildings_soa在导入时冻结的数组，首次计算后冻结为只读结构存入
+    self.analysis_results，之后直接返回同一对象，调用方无法修改缓存。
+    verbose模式下每次调用都经report(self, analysis)输出该部分的分析过程，命中缓存时也不例外
+    """
+    def decorate(method):
+        key = method.__name__
+        
+        @functools.wraps(method)
+        def wrapper(self):
+            analysis = self.analysis_results.get(key)
+            if analysis is None:
+                analysis = self.analysis_results[key] = _freeze(method(self))
+            if self.verbose:
+                report(self, analysis)
+            return analysis
+        
+        return wrapper
+    
+    return decorate
+
+
 class NumericalAnalyzer:
     """数值模型分析器"""
     
-    def __init__(self):
+    def __init__(self, verbose: bool = False):
+        self.verbose = verbose
         self.analysis_results = {}
     
+    def _log(self, message: str = ""):
+        """仅在verbose模式下输出分析过程，计算方法本身不产生stdout输出"""
+        if self.verbose:
+            print(message)
+    
+    def invalidate(self):
+        """
+        清空缓存的分析结果，下次调用时重新计算
+        
+        建筑物价格/CPS来自buildings_soa在导入时冻结的数组，运行时修改BUILDINGS
+        不会反映到分析结果中，清空缓存也不会
+        """
+        self.analysis_results.clear()
+    
     def analyze_growth_model(self) -> Dict[str, Any]:
         """
         分析游戏的增长模型
         """
-        print("=== Cookie Clicker 增长模型分析 ===")
+        self._log("=== Cookie Clicker 增长模型分析 ===")
         
         # 1. 建筑物价格增长模型
         price_analysis = self._analyze_price_growth()
@@ -44,9 +142,17 @@ class NumericalAnalyzer:
             'efficiency_decay': efficiency_analysis
         }
     
-    def _analyze_price_growth(self) -> Dict[str, Any]:
+    def _report_price_growth(self, analysis: Mapping[str, Any]):
+        """输出建筑物价格增长模型"""
+        self._log("\n1. 建筑物价格增长模型")
+        self._log(f"  增长模型: {analysis['model_type']}")
+        self._log(f"  增长公式: {analysis['formula']}")
+        self._log(f"  每个建筑物价格增长: {analysis['growth_rate']}")
+        self._log(f"  价格翻倍需要建筑物数量: {analysis['doubling_time']:.1f}个")
+    
+    @_memoized(_report_price_growth)
+    def _analyze_price_growth(self) -> Mapping[str, Any]:
         """分析建筑物价格增长模型"""
-        print("\n1. 建筑物价格增长模型")
         
         # 价格增长公式: price = base_price * (1.15^amount)
         multiplier = BUILDING_PRICE_MULTIPLIER  # 1.15
@@ -55,35 +161,40 @@ class NumericalAnalyzer:
             'model_type': 'Exponential Growth',
             'formula': f'price = base_price × {multiplier}^amount',
             'growth_rate': f'{(multiplier - 1) * 100:.0f}% per building',
-            'doubling_time': math.log(2) / math.log(multiplier),
+            'doubling_time': _DOUBLING_TIME,
             'examples': {}
         }
         
-        # 分析不同建筑物的价格增长
-        for name, building in list(BUILDINGS.items())[:5]:
-            base_price = building.base_price
-            prices_at_amounts = []
-            
-            for amount in [0, 10, 25, 50, 100]:
-                price = base_price * (multiplier ** amount)
-                prices_at_amounts.append((amount, price))
-            
+        # 分析不同建筑物的价格增长 (广播一次算出所有建筑物×数量的价格)
+        amounts = np.array([0, 10, 25, 50, 100])
+        base_prices = BASE_PRICES[:5]
+        prices = np.outer(base_prices, POW_TABLE[amounts])
+        prices_at_100 = base_prices * POW_TABLE[100]
+        
+        # 每行是一个建筑物的 (amount, price) 结构化数组，可直接按字段取列绘图
+        progression = np.empty(prices.shape, dtype=_PRICE_PROGRESSION_DTYPE)
+        progression['amount'] = amounts
+        progression['price'] = prices
+        
+        for i, name in enumerate(NAMES[:5].tolist()):
             analysis['examples'][name] = {
-                'base_price': base_price,
-                'price_progression': prices_at_amounts,
-                'price_at_100': base_price * (multiplier ** 100)
+                'base_price': float(base_prices[i]),
+                'price_progression': progression[i],
+                'price_at_100': float(prices_at_100[i])
             }
         
-        print(f"  增长模型: {analysis['model_type']}")
-        print(f"  增长公式: {analysis['formula']}")
-        print(f"  每个建筑物价格增长: {analysis['growth_rate']}")
-        print(f"  价格翻倍需要建筑物数量: {analysis['doubling_time']:.1f}个")
-        
         return analysis
     
-    def _analyze_cps_growth(self) -> Dict[str, Any]:
+    def _report_cps_growth(self, analysis: Mapping[str, Any]):
+        """输出CPS增长模型"""
+        best = analysis['most_efficient_building']
+        self._log("\n2. CPS增长模型")
+        self._log(f"  CPS模型: {analysis['model_type']}")
+        self._log(f"  最高效建筑物: {best['name']} (效率: {best['efficiency']:.6f})")
+    
+    @_memoized(_report_cps_growth)
+    def _analyze_cps_growth(self) -> Mapping[str, Any]:
         """分析CPS增长模型"""
-        print("\n2. CPS增长模型")
         
         analysis = {
             'model_type': 'Linear per Building + Exponential via Price',
@@ -92,26 +203,20 @@ class NumericalAnalyzer:
             'building_efficiency': {}
         }
         
+        # 计算基础效率 (CPS per cookie spent) 和0~10个时的边际效率 (建筑物×数量矩阵)
+        amount_list = list(range(11))
+        base_efficiencies = BASE_CPS / BASE_PRICES
+        marginal_matrix = base_efficiencies[:, None] / POW_TABLE[:11]
+        
         # 分析每个建筑物的CPS效率
-        for name, building in BUILDINGS.items():
-            base_cps = building.base_cps
-            base_price = building.base_price
-            
-            # 计算基础效率 (CPS per cookie spent)
-            base_efficiency = base_cps / base_price
-            
-            # 计算在不同数量下的边际效率
-            marginal_efficiencies = []
-            for amount in range(0, 11):
-                price = building.get_price(amount)
-                marginal_efficiency = base_cps / price
-                marginal_efficiencies.append((amount, marginal_efficiency))
-            
+        for name, base_cps, base_price, base_efficiency, marginal in zip(
+                NAMES.tolist(), BASE_CPS.tolist(), BASE_PRICES.tolist(),
+                base_efficiencies.tolist(), marginal_matrix.tolist()):
             analysis['building_efficiency'][name] = {
                 'base_cps': base_cps,
                 'base_price': base_price,
                 'base_efficiency': base_efficiency,
-                'marginal_efficiency_decay': marginal_efficiencies
+                'marginal_efficiency_decay': list(zip(amount_list, marginal))
             }
         
         # 找出最高效的建筑物
@@ -122,90 +227,83 @@ class NumericalAnalyzer:
             'name': best_building[0],
             'efficiency': best_building[1]['base_efficiency']
         }
-        
-        print(f"  CPS模型: {analysis['model_type']}")
-        print(f"  最高效建筑物: {best_building[0]} (效率: {best_building[1]['base_efficiency']:.6f})")
+
         
         return analysis
     
-    def _analyze_prestige_model(self) -> Dict[str, Any]:
+    def _report_prestige_model(self, analysis: Mapping[str, Any]):
+        """输出声望系统模型"""
+        self._log("\n3. 声望系统模型")
+        self._log(f"  声望模型: {analysis['model_type']}")
+        self._log(f"  增长特性: {analysis['growth_rate']}")
+        self._log("  声望等级示例:")
+        for prestige, cookies in analysis['prestige_levels'][:3]:
+            self._log(f"    {prestige}级声望需要: {cookies:.2e} 饼干")
+    
+    @_memoized(_report_prestige_model)
+    def _analyze_prestige_model(self) -> Mapping[str, Any]:
         """分析声望系统模型"""
-        print("\n3. 声望系统模型")
         
         # 声望公式: prestige = (total_cookies / 1e12)^(1/3)
         analysis = {
             'model_type': 'Cube Root Growth',
             'formula': 'prestige = (total_cookies / 1×10¹²)^(1/3)',
             'growth_rate': 'Decreasing marginal returns',
-            'prestige_levels': [],
-            'cookie_requirements': []
         }
         
-        # 计算不同声望等级需要的饼干数
+        # 计算不同声望等级需要的饼干数 (公式按元素广播，一次算完；用浮点避免int64溢出)
         prestige_levels = [1, 10, 100, 1000, 10000]
-        for prestige in prestige_levels:
-            cookies_needed = calculate_cookies_for_prestige(prestige)
-            analysis['prestige_levels'].append((prestige, cookies_needed))
+        cookies_needed = calculate_cookies_for_prestige(np.array(prestige_levels, dtype=np.float64))
+        analysis['prestige_levels'] = list(zip(prestige_levels, cookies_needed.tolist()))
         
         # 计算不同饼干数量对应的声望
-        cookie_amounts = [1e12, 1e15, 1e18, 1e21, 1e24]
-        for cookies in cookie_amounts:
-            prestige = calculate_prestige(cookies)
-            analysis['cookie_requirements'].append((cookies, prestige))
-        
-        print(f"  声望模型: {analysis['model_type']}")
-        print(f"  增长特性: {analysis['growth_rate']}")
-        print("  声望等级示例:")
-        for prestige, cookies in analysis['prestige_levels'][:3]:
-            print(f"    {prestige}级声望需要: {cookies:.2e} 饼干")
+        cookie_amounts = np.array([1e12, 1e15, 1e18, 1e21, 1e24])
+        prestiges = calculate_prestige(cookie_amounts)
+        analysis['cookie_requirements'] = list(zip(cookie_amounts.tolist(), prestiges.tolist()))
         
         return analysis
     
-    def _analyze_efficiency_decay(self) -> Dict[str, Any]:
+    def _report_efficiency_decay(self, analysis: Mapping[str, Any]):
+        """输出效率衰减模型"""
+        self._log("\n4. 效率衰减模型")
+        self._log(f"  衰减模型: {analysis['model_type']}")
+        self._log(f"  衰减率: {analysis['decay_rate']}")
+    
+    @_memoized(_report_efficiency_decay)
+    def _analyze_efficiency_decay(self) -> Mapping[str, Any]:
         """分析效率衰减模型"""
-        print("\n4. 效率衰减模型")
         
         analysis = {
             'model_type': 'Exponential Decay due to Price Growth',
-            'decay_rate': f'{(1 - 1/BUILDING_PRICE_MULTIPLIER) * 100:.1f}% per building',
+            'decay_rate': f'{_DECAY_RATE_PCT:.1f}% per building',
             'efficiency_curves': {}
         }
         
         # 分析主要建筑物的效率衰减
         key_buildings = ['Cursor', 'Grandma', 'Farm', 'Factory']
         
-        for building_name in key_buildings:
-            if building_name in BUILDINGS:
-                building = BUILDINGS[building_name]
-                
-                # 计算效率衰减曲线
-                amounts = list(range(0, 51))
-                efficiencies = []
-                
-                for amount in amounts:
-                    price = building.get_price(amount)
-                    efficiency = building.base_cps / price
-                    efficiencies.append(efficiency)
-                
-                # 找到效率减半点
-                initial_efficiency = efficiencies[0]
-                half_efficiency = initial_efficiency / 2
-                
-                half_point = None
-                for i, eff in enumerate(efficiencies):
-                    if eff <= half_efficiency:
-                        half_point = i
-                        break
-                
-                analysis['efficiency_curves'][building_name] = {
-                    'initial_efficiency': initial_efficiency,
-                    'efficiency_at_10': efficiencies[10] if len(efficiencies) > 10 else 0,
-                    'efficiency_at_25': efficiencies[25] if len(efficiencies) > 25 else 0,
-                    'half_efficiency_point': half_point
-                }
-        
-        print(f"  衰减模型: {analysis['model_type']}")
-        print(f"  衰减率: {analysis['decay_rate']}")
+        indices = [NAME_TO_IDX[name] for name in key_buildings if name in NAME_TO_IDX]
+        
+        # 计算效率衰减曲线 (每行一个建筑物, 0~50个)
+        curves = (BASE_CPS[indices] / BASE_PRICES[indices])[:, None] / POW_TABLE[:51]
+        
+        for row, idx in enumerate(indices):
+            building_name = str(NAMES[idx])
+            efficiencies = curves[row]
+            
+            # 找到效率减半点 (效率单调递减，取负后升序即可二分查找)
+            initial_efficiency = float(efficiencies[0])
+            half_efficiency = initial_efficiency / 2
+            
+            half_index = int(np.searchsorted(-efficiencies, -half_efficiency))
+            half_point = half_index if half_index < len(efficiencies) else None
+            
+            analysis['efficiency_curves'][building_name] = {
+                'initial_efficiency': initial_efficiency,
+                'efficiency_at_10': float(efficiencies[10]),
+                'efficiency_at_25': float(efficiencies[25]),
+                'half_efficiency_point': half_point
+            }
         
         return analysis
     
@@ -213,7 +311,7 @@ class NumericalAnalyzer:
         """
         分析最优策略
         """
-        print("\n=== 最优策略分析 ===")
+        self._log("\n=== 最优策略分析 ===")
         
         # 1. 早期策略 (0-1小时)
         early_strategy = self._analyze_early_game_strategy()
@@ -236,7 +334,7 @@ class NumericalAnalyzer:
     
     def _analyze_early_game_strategy(self) -> Dict[str, Any]:
         """分析早期游戏策略"""
-        print("\n1. 早期策略分析 (0-1小时)")
+        self._log("\n1. 早期策略分析 (0-1小时)")
         
         strategy = {
             'phase': 'Early Game (0-1 hour)',
@@ -256,15 +354,15 @@ class NumericalAnalyzer:
             }
         }
         
-        print(f"  阶段: {strategy['phase']}")
-        print(f"  主要目标: {strategy['primary_goal']}")
-        print(f"  建筑物优先级: {', '.join(strategy['building_priority'])}")
+        self._log(f"  阶段: {strategy['phase']}")
+        self._log(f"  主要目标: {strategy['primary_goal']}")
+        self._log(f"  建筑物优先级: {', '.join(strategy['building_priority'])}")
         
         return strategy
     
     def _analyze_mid_game_strategy(self) -> Dict[str, Any]:
         """分析中期游戏策略"""
-        print("\n2. 中期策略分析 (1-10小时)")
+        self._log("\n2. 中期策略分析 (1-10小时)")
         
         strategy = {
             'phase': 'Mid Game (1-10 hours)',
@@ -284,15 +382,15 @@ class NumericalAnalyzer:
             }
         }
         
-        print(f"  阶段: {strategy['phase']}")
-        print(f"  主要目标: {strategy['primary_goal']}")
-        print(f"  建筑物优先级: {', '.join(strategy['building_priority'])}")
+        self._log(f"  阶段: {strategy['phase']}")
+        self._log(f"  主要目标: {strategy['primary_goal']}")
+        self._log(f"  建筑物优先级: {', '.join(strategy['building_priority'])}")
         
         return strategy
     
     def _analyze_late_game_strategy(self) -> Dict[str, Any]:
         """分析后期游戏策略"""
-        print("\n3. 后期策略分析 (10小时+)")
+        self._log("\n3. 后期策略分析 (10小时+)")
         
         strategy = {
             'phase': 'Late Game (10+ hours)',
@@ -312,15 +410,15 @@ class NumericalAnalyzer:
             }
         }
         
-        print(f"  阶段: {strategy['phase']}")
-        print(f"  主要目标: {strategy['primary_goal']}")
-        print(f"  建筑物优先级: {', '.join(strategy['building_priority'])}")
+        self._log(f"  阶段: {strategy['phase']}")
+        self._log(f"  主要目标: {strategy['primary_goal']}")
+        self._log(f"  建筑物优先级: {', '.join(strategy['building_priority'])}")
         
         return strategy
     
     def _analyze_ascension_strategy(self) -> Dict[str, Any]:
         """分析重生策略"""
-        print("\n4. 重生策略分析")
+        self._log("\n4. 重生策略分析")
         
         strategy = {
             'optimal_timing': 'When prestige gain >= current prestige × 0.5',
@@ -337,16 +435,23 @@ class NumericalAnalyzer:
             ]
         }
         
-        print(f"  最优重生时机: {strategy['optimal_timing']}")
-        print(f"  最小声望增长: {strategy['minimum_prestige_gain']}")
+        self._log(f"  最优重生时机: {strategy['optimal_timing']}")
+        self._log(f"  最小声望增长: {strategy['minimum_prestige_gain']}")
         
         return strategy
     
-    def calculate_theoretical_limits(self) -> Dict[str, Any]:
+    def _report_theoretical_limits(self, limits: Mapping[str, Any]):
+        """输出理论极限"""
+        self._log("\n=== 理论极限分析 ===")
+        self._log(f"最大安全整数: {limits['max_cookies']:.2e}")
+        self._log(f"理论最大声望: {limits['max_prestige']:.0f}")
+        self._log(f"理论最大CPS: {limits['theoretical_max_cps']:.2e}")
+    
+    @_memoized(_report_theoretical_limits)
+    def calculate_theoretical_limits(self) -> Mapping[str, Any]:
         """
         计算理论极限
         """
-        print("\n=== 理论极限分析 ===")
         
         # JavaScript Number.MAX_SAFE_INTEGER = 2^53 - 1
         max_safe_integer = 2**53 - 1
@@ -355,129 +460,102 @@ class NumericalAnalyzer:
         limits = {
             'max_cookies': max_safe_integer,
             'max_prestige': calculate_prestige(max_safe_integer),
-            'max_building_amount': 5000,  # 游戏内部限制
+            'max_building_amount': MAX_BUILDING_AMOUNT,  # 游戏内部限制
             'theoretical_max_cps': 0
         }
         
         # 计算理论最大CPS
-        max_cps = 0
-        for building in BUILDINGS.values():
-            building_max_cps = building.base_cps * limits['max_building_amount']
-            max_cps += building_max_cps
+        max_cps = float(BASE_CPS.sum() * limits['max_building_amount'])
         
         # 考虑各种倍数 (简化估算)
         total_multiplier = 1000  # 保守估计的总倍数
         limits['theoretical_max_cps'] = max_cps * total_multiplier
         
-        print(f"最大安全整数: {limits['max_cookies']:.2e}")
-        print(f"理论最大声望: {limits['max_prestige']:.0f}")
-        print(f"理论最大CPS: {limits['theoretical_max_cps']:.2e}")
-        
         return limits
     
     def generate_comprehensive_report(self) -> str:
         """
         生成综合分析报告
         """
-        print("\n=== 生成综合分析报告 ===")
+        self._log("\n=== 生成综合分析报告 ===")
         
         # 执行所有分析
         growth_analysis = self.analyze_growth_model()
         strategy_analysis = self.analyze_optimal_strategies()
         limits_analysis = self.calculate_theoretical_limits()
         
-        # 生成报告
-        report = f"""
+        # 生成报告 (先取出各部分结果，避免在模板中反复索引嵌套字典)
+        price = growth_analysis['price_growth']
+        cps = growth_analysis['cps_growth']
+        best = cps['most_efficient_building']
+        prestige = growth_analysis['prestige_model']
+        decay = growth_analysis['efficiency_decay']
+        early = strategy_analysis['early_game']
+        mid = strategy_analysis['mid_game']
+        late = strategy_analysis['late_game']
+        ascension = strategy_analysis['ascension']
+        
+        buf = io.StringIO()
+        buf.write(f"""
 Cookie Clicker 数值模型与策略深度分析报告
 ==========================================
 
 ## 1. 核心数值模型
 
 ### 1.1 建筑物价格增长模型
-- 模型类型: {growth_analysis['price_growth']['model_type']}
-- 增长公式: {growth_analysis['price_growth']['formula']}
-- 增长率: {growth_analysis['price_growth']['growth_rate']}
-- 价格翻倍点: {growth_analysis['price_growth']['doubling_time']:.1f}个建筑物
+- 模型类型: {price['model_type']}
+- 增长公式: {price['formula']}
+- 增长率: {price['growth_rate']}
+- 价格翻倍点: {price['doubling_time']:.1f}个建筑物
 
 ### 1.2 CPS增长模型
-- 模型类型: {growth_analysis['cps_growth']['model_type']}
-- 最高效建筑物: {growth_analysis['cps_growth']['most_efficient_building']['name']}
-- 基础效率: {growth_analysis['cps_growth']['most_efficient_building']['efficiency']:.6f}
+- 模型类型: {cps['model_type']}
+- 最高效建筑物: {best['name']}
+- 基础效率: {best['efficiency']:.6f}
 
 ### 1.3 声望系统模型
-- 模型类型: {growth_analysis['prestige_model']['model_type']}
-- 增长公式: {growth_analysis['prestige_model']['formula']}
-- 增长特性: {growth_analysis['prestige_model']['growth_rate']}
+- 模型类型: {prestige['model_type']}
+- 增长公式: {prestige['formula']}
+- 增长特性: {prestige['growth_rate']}
 
 ### 1.4 效率衰减模型
-- 模型类型: {growth_analysis['efficiency_decay']['model_type']}
-- 衰减率: {growth_analysis['efficiency_decay']['decay_rate']}
-
+- 模型类型: {decay['model_type']}
+- 衰减率: {decay['decay_rate']}
+""")
+        buf.write(f"""
 ## 2. 最优策略分析
 
 ### 2.1 早期策略 (0-1小时)
-- 主要目标: {strategy_analysis['early_game']['primary_goal']}
-- 建筑物优先级: {', '.join(strategy_analysis['early_game']['building_priority'])}
-- 预期进度: {strategy_analysis['early_game']['expected_progress']['cookies_by_1hour']} 饼干
+- 主要目标: {early['primary_goal']}
+- 建筑物优先级: {', '.join(early['building_priority'])}
+- 预期进度: {early['expected_progress']['cookies_by_1hour']} 饼干
 
 ### 2.2 中期策略 (1-10小时)
-- 主要目标: {strategy_analysis['mid_game']['primary_goal']}
-- 建筑物优先级: {', '.join(strategy_analysis['mid_game']['building_priority'])}
-- 预期进度: {strategy_analysis['mid_game']['expected_progress']['cookies_by_10hour']} 饼干
+- 主要目标: {mid['primary_goal']}
+- 建筑物优先级: {', '.join(mid['building_priority'])}
+- 预期进度: {mid['expected_progress']['cookies_by_10hour']} 饼干
 
 ### 2.3 后期策略 (10小时+)
-- 主要目标: {strategy_analysis['late_game']['primary_goal']}
-- 建筑物优先级: {', '.join(strategy_analysis['late_game']['building_priority'])}
-- 重生频率: {strategy_analysis['late_game']['expected_progress']['ascension_frequency']}
+- 主要目标: {late['primary_goal']}
+- 建筑物优先级: {', '.join(late['building_priority'])}
+- 重生频率: {late['expected_progress']['ascension_frequency']}
 
 ### 2.4 重生策略
-- 最优时机: {strategy_analysis['ascension']['optimal_timing']}
-- 最小声望增长: {strategy_analysis['ascension']['minimum_prestige_gain']}
-
+- 最优时机: {ascension['optimal_timing']}
+- 最小声望增长: {ascension['minimum_prestige_gain']}
+""")
+        buf.write(f"""
 ## 3. 理论极限
 - 最大饼干数: {limits_analysis['max_cookies']:.2e}
 - 理论最大声望: {limits_analysis['max_prestige']:.0f}
 - 理论最大CPS: {limits_analysis['theoretical_max_cps']:.2e}
-
-## 4. 关键洞察
-
-### 4.1 数学本质
-Cookie Clicker本质上是一个指数增长与指数成本的平衡游戏。建筑物价格的1.15倍增长创造了一个自然的效率衰减，迫使玩家不断寻找新的增长点。
-
-### 4.2 策略核心
-最优策略的核心是在任何给定时刻选择效率最高的投资选项。这需要平衡：
-- 短期CPS增长 vs 长期投资
-- 建筑物购买 vs 升级购买
-- 当前进度 vs 重生收益
-
-### 4.3 心理设计
-游戏通过以下机制维持玩家参与：
-- 指数增长带来的成就感
-- 持续的新解锁内容
-- 重生系统提供的"重新开始"动机
-- 数字增长的视觉满足感
-
-## 5. 建议与结论
-
-对于新玩家：
-1. 早期专注于建立基础CPS
-2. 不要忽视升级的重要性
-3. 学会计算购买效率
-4. 适时进行第一次重生
-
-对于高级玩家：
-1. 精确计算重生时机
-2. 优化天堂升级路径
-3. 利用小游戏系统
-4. 平衡主动和挂机游戏
-
-Cookie Clicker的成功在于其简单而深刻的数学模型，以及精心设计的心理激励机制。
-"""
+""")
+        buf.write(_REPORT_CONCLUSIONS)
         
-        return report
+        return buf.getvalue()
 
 
 if __name__ == "__main__":
-    analyzer = NumericalAnalyzer()
+    analyzer = NumericalAnalyzer(verbose=True)
     report = analyzer.generate_comprehensive_report()
     print(report)
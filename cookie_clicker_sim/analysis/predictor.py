@@ -5,11 +5,21 @@
 """
 
 import math
+import numpy as np
+from dataclasses import dataclass
 from typing import Dict, List, Tuple, Optional, Any
 from ..core.game_state import GameState
 from ..core.constants import calculate_prestige, calculate_cookies_for_prestige
 
 
+@dataclass(slots=True)
+class AscensionOption:
+    """一个声望增长目标的重生时间预测"""
+    target_prestige: int
+    time_needed: float
+    prestige_gain: int
+
+
 class ProgressPredictor:
     """进度预测器"""
     
@@ -32,6 +42,18 @@ class ProgressPredictor:
         needed_cookies = target_cookies - current_cookies
         return needed_cookies / current_cps
     
+    def predict_time_to_cookies_batch(self, game_state: GameState, targets) -> np.ndarray:
+        """
+        批量预测达到多个目标饼干数所需时间
+
+        规则与predict_time_to_cookies一致：已达到的目标为0，CPS不为正时未达到的目标为inf
+        """
+        needed = np.maximum(np.asarray(targets, dtype=np.float64) - game_state.cookies, 0.0)
+        cps = game_state.cookies_per_second
+        if cps > 0:
+            return needed / cps
+        return np.where(needed == 0, 0.0, np.inf)
+    
     def predict_time_to_prestige(self, game_state: GameState, target_prestige: int) -> float:
         """
         预测达到目标声望等级所需时间
@@ -45,24 +67,24 @@ class ProgressPredictor:
         
         return self.predict_time_to_cookies(game_state, total_cookies_needed)
     
-    def predict_optimal_ascension_time(self, game_state: GameState) -> Dict[str, Any]:
+    def predict_optimal_ascension_time(self, game_state: GameState) -> Dict[str, AscensionOption]:
         """
         预测最优重生时机
         """
         current_total = game_state.cookies_reset + game_state.cookies_earned
         current_prestige = int(calculate_prestige(current_total))
         
-        # 计算不同声望增长的时间成本
-        predictions = {}
+        # 计算不同声望增长的时间成本 (所有目标一次性向量计算)
+        gains = np.array([1, 5, 10, 25, 50])
+        target_prestiges = current_prestige + gains
+        totals_needed = (calculate_cookies_for_prestige(target_prestiges.astype(np.float64))
+                         - game_state.cookies_reset)
         
-        for prestige_gain in [1, 5, 10, 25, 50]:
-            target_prestige = current_prestige + prestige_gain
-            time_needed = self.predict_time_to_prestige(game_state, target_prestige)
-            
-            predictions[f'+{prestige_gain}声望'] = {
-                'target_prestige': target_prestige,
-                'time_needed': time_needed,
-                'prestige_gain': prestige_gain
-            }
+        times = np.where(game_state.cookies_earned >= totals_needed, 0.0,
+                         self.predict_time_to_cookies_batch(game_state, totals_needed))
         
-        return predictions
+        return {
+            f'+{gain}声望': AscensionOption(target, time_needed, gain)
+            for gain, target, time_needed in zip(gains.tolist(), target_prestiges.tolist(),
+                                                 times.tolist())
+        }
@@ -4,41 +4,177 @@
 提供Cookie Clicker模拟数据的图表绘制功能
 """
 
-import matplotlib.pyplot as plt
-import matplotlib.dates as mdates
+from __future__ import annotations
+
+import importlib.util
+import io
+import os
+import queue
+import threading
+from concurrent.futures import Future
 import numpy as np
-import pandas as pd
-from datetime import datetime, timedelta
-from typing import Dict, List, Tuple, Optional, Any
-import seaborn as sns
+from typing import TYPE_CHECKING, Dict, List, Tuple, Optional, Any
 
-# 设置英文字体和样式
-plt.rcParams['font.family'] = ['Arial', 'DejaVu Sans', 'Liberation Sans']
-plt.rcParams['axes.unicode_minus'] = False
-sns.set_style("whitegrid")
-sns.set_palette("husl")
+if TYPE_CHECKING:
+    import matplotlib.pyplot as plt
+
+# matplotlib/seaborn在首次创建DataVisualizer时才导入，只跑模拟不绘图时不付导入开销；
+# 这里只检查是否已安装，缺失时仍在导入本模块时抛出ImportError
+for _dependency in ('matplotlib', 'seaborn'):
+    if importlib.util.find_spec(_dependency) is None:
+        raise ImportError(f"No module named '{_dependency}'", name=_dependency)
+
+# 矢量格式不经过Agg像素缓冲，save_figure_fast对这些格式仍走savefig
+_VECTOR_FORMATS = frozenset({'.svg', '.svgz', '.pdf', '.eps', '.ps'})
+
+
+def _downsample(x, y, n_target: int = 2000) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Largest-Triangle-Three-Buckets降采样
+    
+    保留首尾点，其余点均分为n_target-2个桶，每个桶选出与前一个选中点、下一个桶均值
+    构成三角形面积最大的点；曲线形状基本不变，绘图开销与模拟长度无关
+    """
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    n = len(x)
+    if n <= n_target or n_target < 3:
+        return x, y
+    
+    edges = np.linspace(1, n - 1, n_target - 1).astype(np.intp)
+    selected = np.empty(n_target, dtype=np.intp)
+    selected[0] = 0
+    selected[-1] = n - 1
+    
+    a = 0
+    for i in range(n_target - 2):
+        start, end = edges[i], edges[i + 1]
+        next_end = edges[i + 2] if i + 2 < len(edges) else n
+        avg_x = x[end:next_end].mean()
+        avg_y = y[end:next_end].mean()
+        
+        area = np.abs((x[a] - avg_x) * (y[start:end] - y[a])
+                      - (x[a] - x[start:end]) * (avg_y - y[a]))
+        a = start + int(area.argmax())
+        selected[i + 1] = a
+    
+    return x[selected], y[selected]
+
+
+class _RenderWorker(threading.Thread):
+    """
+    后台绘图线程
+    
+    串行执行提交的绘图任务，结果通过Future返回 (任务只用Figure/FigureCanvasAgg，不经过pyplot)
+    """
+    
+    def __init__(self):
+        super().__init__(name='DataVisualizerRender', daemon=True)
+        self._tasks = queue.Queue()
+        self.start()
+    
+    def run(self):
+        while True:
+            task = self._tasks.get()
+            if task is None:
+                break
+            future, render = task
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                future.set_result(render())
+            except BaseException as e:
+                future.set_exception(e)
+    
+    def submit(self, render) -> Future:
+        """提交绘图任务"""
+        future = Future()
+        self._tasks.put((future, render))
+        return future
+    
+    def stop(self):
+        """处理完已提交的任务后结束线程"""
+        self._tasks.put(None)
+        self.join()
 
 
 class DataVisualizer:
     """数据可视化器"""
     
+    # 绘图库与全局样式只在第一次创建实例时导入/设置一次
+    _configured = False
+    _plt = None
+    _palette = None
+    
     def __init__(self, figsize=(12, 8), dpi=100):
+        self._configure()
         self.figsize = figsize
         self.dpi = dpi
-        self.colors = plt.cm.Set3(np.linspace(0, 1, 12))
+        self.colors = self._palette
+        self._render_worker = None
+        self._thread_state = threading.local()  # detached=True: 当前线程不经过pyplot创建Figure
+        
+        # 实时进度图 (init_live_progress创建后复用同一个Figure)
+        self._live_fig = None
+        self._cookies_line = None
+        self._cps_line = None
+        self._bg = None
+        
+    @classmethod
+    def _configure(cls):
+        """
+        导入pyplot/seaborn，设置字体、样式并求出调色板
+        """
+        if cls._configured:
+            return
         
+        import matplotlib.pyplot as plt
+        import seaborn as sns
+        
+        # 设置英文字体和样式
+        plt.rcParams['font.family'] = ['Arial', 'DejaVu Sans', 'Liberation Sans']
+        plt.rcParams['axes.unicode_minus'] = False
+        sns.set_style("whitegrid")
+        sns.set_palette("husl")
+        
+        # Set3调色板只求值一次；扩展到32色(循环重复)，切片超过12种颜色时与matplotlib循环取色一致
+        palette = np.tile(plt.cm.Set3(np.linspace(0, 1, 12)), (3, 1))[:32]
+        palette.setflags(write=False)
+        
+        cls._plt = plt
+        cls._palette = palette
+        cls._configured = True
+    
+    def _subplots(self, nrows=1, ncols=1, **fig_kw):
+        """
+        与plt.subplots相同的返回值；在异步渲染线程里改为直接创建Figure并挂上Agg画布，
+        不注册到pyplot的全局图形管理器
+        """
+        if not getattr(self._thread_state, 'detached', False):
+            return self._plt.subplots(nrows, ncols, **fig_kw)
+        
+        from matplotlib.backends.backend_agg import FigureCanvasAgg
+        from matplotlib.figure import Figure
+        
+        fig = Figure(**fig_kw)
+        FigureCanvasAgg(fig)
+        return fig, fig.subplots(nrows, ncols)
+    
     def plot_progress_curve(self, time_data: List[float], cookies_data: List[float],
                            cps_data: List[float], title: str = "Game Progress Curve") -> plt.Figure:
         """
         Plot game progress curve (cookies and CPS over time)
         """
-        fig, (ax1, ax2) = plt.subplots(2, 1, figsize=self.figsize, dpi=self.dpi)
+        fig, (ax1, ax2) = self._subplots(2, 1, figsize=self.figsize, dpi=self.dpi,
+                                         constrained_layout=True)
 
-        # Convert time to hours
-        time_hours = [t / 3600 for t in time_data]
+        # Convert time to hours, then cap each series at ~2000 vertices
+        time_hours = np.asarray(time_data, dtype=np.float64) / 3600
+        cookies_x, cookies_y = _downsample(time_hours, cookies_data)
+        cps_x, cps_y = _downsample(time_hours, cps_data)
 
         # Cookies curve
-        ax1.plot(time_hours, cookies_data, 'b-', linewidth=2, label='Cookies')
+        ax1.plot(cookies_x, cookies_y, 'b-', linewidth=2, label='Cookies')
         ax1.set_ylabel('Cookies', fontsize=12)
         ax1.set_title(title, fontsize=14, fontweight='bold')
         ax1.grid(True, alpha=0.3)
@@ -48,22 +184,101 @@ class DataVisualizer:
         ax1.ticklabel_format(style='scientific', axis='y', scilimits=(0,0))
 
         # CPS curve
-        ax2.plot(time_hours, cps_data, 'r-', linewidth=2, label='Cookies per Second (CPS)')
+        ax2.plot(cps_x, cps_y, 'r-', linewidth=2, label='Cookies per Second (CPS)')
         ax2.set_xlabel('Time (hours)', fontsize=12)
         ax2.set_ylabel('CPS', fontsize=12)
         ax2.grid(True, alpha=0.3)
         ax2.legend()
         ax2.ticklabel_format(style='scientific', axis='y', scilimits=(0,0))
-        
-        plt.tight_layout()
+
         return fig
     
+    def init_live_progress(self, title: str = "Game Progress (Live)") -> plt.Figure:
+        """
+        Create a reusable live progress figure; update it with update_live_progress
+        (lines are animated artists, use plot_progress_curve for saved charts)
+        """
+        fig, (ax1, ax2) = self._subplots(2, 1, figsize=self.figsize, dpi=self.dpi,
+                                         constrained_layout=True)
+
+        # animated=True: lines are skipped by canvas.draw() and blitted separately
+        self._cookies_line, = ax1.plot([], [], 'b-', linewidth=2, label='Cookies', animated=True)
+        ax1.set_ylabel('Cookies', fontsize=12)
+        ax1.set_title(title, fontsize=14, fontweight='bold')
+        ax1.grid(True, alpha=0.3)
+        ax1.legend()
+
+        self._cps_line, = ax2.plot([], [], 'r-', linewidth=2,
+                                   label='Cookies per Second (CPS)', animated=True)
+        ax2.set_xlabel('Time (hours)', fontsize=12)
+        ax2.set_ylabel('CPS', fontsize=12)
+        ax2.grid(True, alpha=0.3)
+        ax2.legend()
+
+        self._live_fig = fig
+        self._redraw_live_background()
+        return fig
+    
+    def update_live_progress(self, time_data: List[float], cookies_data: List[float],
+                             cps_data: List[float]):
+        """
+        Update the live progress lines in place (set_data + blit, no figure rebuild)
+        """
+        if self._live_fig is None:
+            self.init_live_progress()
+
+        time_hours = np.asarray(time_data, dtype=np.float64) / 3600
+        self._cookies_line.set_data(*_downsample(time_hours, cookies_data))
+        self._cps_line.set_data(*_downsample(time_hours, cps_data))
+
+        # Full redraw only when the data leaves the current axis limits; limits are
+        # doubled with headroom so growing series trigger only O(log n) redraws
+        if not (self._line_in_view(self._cookies_line) and self._line_in_view(self._cps_line)):
+            for line in (self._cookies_line, self._cps_line):
+                ax = line.axes
+                ax.relim()
+                ax.autoscale_view()
+                x_min, x_max = ax.get_xlim()
+                y_min, y_max = ax.get_ylim()
+                ax.set_xlim(x_min, x_min + (x_max - x_min) * 2)
+                ax.set_ylim(y_min, y_min + (y_max - y_min) * 2)
+            self._redraw_live_background()
+
+        canvas = self._live_fig.canvas
+        canvas.restore_region(self._bg)
+        for line in (self._cookies_line, self._cps_line):
+            line.axes.draw_artist(line)
+        canvas.blit(self._live_fig.bbox)
+        canvas.flush_events()
+    
+    def _redraw_live_background(self):
+        """
+        Redraw the static parts of the live figure and cache them for blitting
+        """
+        canvas = self._live_fig.canvas
+        canvas.draw()
+        self._bg = canvas.copy_from_bbox(self._live_fig.bbox)
+    
+    @staticmethod
+    def _line_in_view(line) -> bool:
+        """
+        Check whether all data of a line lies within its axes' current limits
+        """
+        x, y = line.get_data()
+        if len(x) == 0:
+            return True
+        x_min, x_max = line.axes.get_xlim()
+        y_min, y_max = line.axes.get_ylim()
+        return (x_min <= np.min(x) and np.max(x) <= x_max
+                and y_min <= np.min(y) and np.max(y) <= y_max)
+    
     def plot_building_distribution(self, buildings_data: Dict[str, int],
                                  title: str = "Building Distribution") -> plt.Figure:
         """
         Plot building quantity distribution pie chart
         """
-        fig, ax = plt.subplots(figsize=(10, 8), dpi=self.dpi)
+        fig, ax = self._subplots(figsize=(10, 8), dpi=self.dpi,
+                                 constrained_layout=True)
 
         # Filter out buildings with 0 quantity
         filtered_data = {k: v for k, v in buildings_data.items() if v > 0}
@@ -74,25 +289,21 @@ class DataVisualizer:
             ax.set_title(title, fontsize=14, fontweight='bold')
             return fig
 
-        names = list(filtered_data.keys())
         values = list(filtered_data.values())
+        labels = [f'{name}: {value}' for name, value in filtered_data.items()]
 
-        # Create pie chart
-        wedges, texts, autotexts = ax.pie(values, labels=names, autopct='%1.1f%%',
-                                         startangle=90, colors=self.colors[:len(names)])
-
-        # Beautify text
-        for autotext in autotexts:
-            autotext.set_color('white')
-            autotext.set_fontweight('bold')
+        # Create pie chart. labels=None: building names are shown only in the legend, not
+        # around the wedges (textprops turns all pie text white, which would hide outer labels)
+        wedges, _, _ = ax.pie(values, labels=None, autopct='%1.1f%%', startangle=90,
+                              colors=self.colors[:len(values)],
+                              textprops={'color': 'white', 'fontweight': 'bold'})
 
         ax.set_title(title, fontsize=14, fontweight='bold')
 
         # Add legend
-        ax.legend(wedges, [f'{name}: {value}' for name, value in zip(names, values)],
-                 title="Building Count", loc="center left", bbox_to_anchor=(1, 0, 0.5, 1))
-        
-        plt.tight_layout()
+        ax.legend(wedges, labels, title="Building Count",
+                 loc="center left", bbox_to_anchor=(1, 0, 0.5, 1))
+
         return fig
     
     def plot_cps_breakdown(self, cps_breakdown: Dict[str, float],
@@ -100,22 +311,24 @@ class DataVisualizer:
         """
         Plot CPS source breakdown bar chart
         """
-        fig, ax = plt.subplots(figsize=self.figsize, dpi=self.dpi)
+        fig, ax = self._subplots(figsize=self.figsize, dpi=self.dpi,
+                                 constrained_layout=True)
 
-        # Filter numeric data
-        filtered_data = {}
-        for k, v in cps_breakdown.items():
-            if isinstance(v, (int, float)) and v > 0:
-                filtered_data[k] = v
+        # Filter numeric data (non-numeric entries become NaN and fail the > 0 mask)
+        keys = np.array(list(cps_breakdown.keys()), dtype=object)
+        vals = np.fromiter((v if isinstance(v, (int, float)) else np.nan
+                            for v in cps_breakdown.values()),
+                           dtype=np.float64, count=len(cps_breakdown))
+        mask = vals > 0
 
-        if not filtered_data:
+        if not mask.any():
             ax.text(0.5, 0.5, 'No CPS Data', ha='center', va='center',
                    transform=ax.transAxes, fontsize=16)
             ax.set_title(title, fontsize=14, fontweight='bold')
             return fig
 
-        names = list(filtered_data.keys())
-        values = list(filtered_data.values())
+        names = keys[mask].tolist()
+        values = vals[mask].tolist()
 
         # Create bar chart
         bars = ax.bar(names, values, color=self.colors[:len(names)])
@@ -131,8 +344,9 @@ class DataVisualizer:
         ax.grid(True, alpha=0.3, axis='y')
 
         # Rotate x-axis labels
-        plt.xticks(rotation=45, ha='right')
-        plt.tight_layout()
+        for label in ax.get_xticklabels():
+            label.set_rotation(45)
+            label.set_horizontalalignment('right')
         return fig
     
     def plot_efficiency_comparison(self, efficiency_data: List[Tuple[str, float]],
@@ -140,7 +354,8 @@ class DataVisualizer:
         """
         Plot purchase efficiency comparison chart
         """
-        fig, ax = plt.subplots(figsize=self.figsize, dpi=self.dpi)
+        fig, ax = self._subplots(figsize=self.figsize, dpi=self.dpi,
+                                 constrained_layout=True)
 
         if not efficiency_data:
             ax.text(0.5, 0.5, 'No Efficiency Data', ha='center', va='center',
@@ -148,11 +363,14 @@ class DataVisualizer:
             ax.set_title(title, fontsize=14, fontweight='bold')
             return fig
 
-        # Sort by efficiency
-        efficiency_data.sort(key=lambda x: x[1], reverse=True)
+        # Sort by efficiency (stable, descending; the caller's list is left untouched)
+        keys = np.array([item[0] for item in efficiency_data], dtype=object)
+        vals = np.fromiter((item[1] for item in efficiency_data),
+                           dtype=np.float64, count=len(efficiency_data))
+        order = np.argsort(-vals, kind='stable')
 
-        names = [item[0] for item in efficiency_data]
-        values = [item[1] for item in efficiency_data]
+        names = keys[order].tolist()
+        values = vals[order].tolist()
 
         # Create horizontal bar chart
         bars = ax.barh(names, values, color=self.colors[:len(names)])
@@ -166,8 +384,7 @@ class DataVisualizer:
         ax.set_xlabel('Efficiency (CPS Gain/Price)', fontsize=12)
         ax.set_title(title, fontsize=14, fontweight='bold')
         ax.grid(True, alpha=0.3, axis='x')
-        
-        plt.tight_layout()
+
         return fig
     
     def plot_prestige_analysis(self, cookies_data: List[float], prestige_data: List[float],
@@ -175,7 +392,8 @@ class DataVisualizer:
         """
         Plot prestige vs cookies relationship chart
         """
-        fig, (ax1, ax2) = plt.subplots(1, 2, figsize=(15, 6), dpi=self.dpi)
+        fig, (ax1, ax2) = self._subplots(1, 2, figsize=(15, 6), dpi=self.dpi,
+                                         constrained_layout=True)
 
         # Prestige over time
         ax1.plot(range(len(prestige_data)), prestige_data, 'g-', linewidth=2, marker='o')
@@ -193,8 +411,7 @@ class DataVisualizer:
         ax2.grid(True, alpha=0.3)
         ax2.ticklabel_format(style='scientific', axis='x', scilimits=(0,0))
 
-        plt.suptitle(title, fontsize=14, fontweight='bold')
-        plt.tight_layout()
+        fig.suptitle(title, fontsize=14, fontweight='bold')
         return fig
     
     def plot_strategy_comparison(self, strategy_results: Dict[str, Dict[str, Any]],
@@ -202,7 +419,8 @@ class DataVisualizer:
         """
         Plot multi-strategy comparison chart
         """
-        fig, ((ax1, ax2), (ax3, ax4)) = plt.subplots(2, 2, figsize=(15, 12), dpi=self.dpi)
+        fig, ((ax1, ax2), (ax3, ax4)) = self._subplots(2, 2, figsize=(15, 12), dpi=self.dpi,
+                                                       constrained_layout=True)
 
         strategies = list(strategy_results.keys())
         colors = self.colors[:len(strategies)]
@@ -255,20 +473,26 @@ class DataVisualizer:
             ax4.text(bar.get_x() + bar.get_width()/2., height,
                     f'{value:.2e}', ha='center', va='bottom', fontweight='bold')
 
-        plt.suptitle(title, fontsize=16, fontweight='bold')
-        plt.tight_layout()
+        fig.suptitle(title, fontsize=16, fontweight='bold')
         return fig
     
     def plot_building_efficiency_curve(self, building_name: str,
-                                     amounts: List[int], efficiencies: List[float],
+                                     amounts: np.ndarray, efficiencies: np.ndarray,
                                      title: str = None) -> plt.Figure:
         """
         Plot building efficiency curve
+
+        amounts / efficiencies are expected as NumPy arrays; lists are converted once
+        here and the same arrays feed both argmax and the plot.
         """
         if title is None:
             title = f"{building_name} Efficiency Curve"
 
-        fig, ax = plt.subplots(figsize=self.figsize, dpi=self.dpi)
+        amounts = np.asarray(amounts)
+        efficiencies = np.asarray(efficiencies, dtype=np.float64)
+
+        fig, ax = self._subplots(figsize=self.figsize, dpi=self.dpi,
+                                 constrained_layout=True)
 
         ax.plot(amounts, efficiencies, 'b-', linewidth=2, marker='o', markersize=4)
         ax.set_xlabel(f'{building_name} Count', fontsize=12)
@@ -277,14 +501,13 @@ class DataVisualizer:
         ax.grid(True, alpha=0.3)
 
         # Mark highest efficiency point
-        max_idx = np.argmax(efficiencies)
+        max_idx = int(efficiencies.argmax())
         ax.annotate(f'Peak Efficiency\n({amounts[max_idx]}, {efficiencies[max_idx]:.6f})',
                    xy=(amounts[max_idx], efficiencies[max_idx]),
                    xytext=(amounts[max_idx] + len(amounts)*0.1, efficiencies[max_idx]),
                    arrowprops=dict(arrowstyle='->', color='red'),
                    fontsize=10, ha='left')
-        
-        plt.tight_layout()
+
         return fig
     
     def save_figure(self, fig: plt.Figure, filename: str, dpi: int = 300):
@@ -295,14 +518,86 @@ class DataVisualizer:
                    facecolor='white', edgecolor='none')
         print(f"Chart saved to: {filename}")
     
+    def save_figure_fast(self, fig: plt.Figure, filename: str):
+        """
+        Save a raster chart straight from the Agg pixel buffer (single rasterization,
+        zero-copy buffer_rgba); vector formats fall back to save_figure.
+        Saved at the figure's own dpi and without tight bbox cropping.
+        """
+        ext = os.path.splitext(filename)[1].lower()
+        if ext in _VECTOR_FORMATS:
+            self.save_figure(fig, filename)
+            return
+
+        from PIL import Image
+        from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+        canvas = fig.canvas
+        if not isinstance(canvas, FigureCanvasAgg):
+            canvas = FigureCanvasAgg(fig)
+        canvas.draw()
+        pixels = np.asarray(canvas.buffer_rgba())
+        height, width = pixels.shape[:2]
+        image = Image.frombuffer('RGBA', (width, height), pixels, 'raw', 'RGBA', 0, 1)
+        if ext in ('.jpg', '.jpeg'):
+            image = image.convert('RGB')
+        image.save(filename)
+        print(f"Chart saved to: {filename}")
+    
+    def render_async(self, plot_method: str, *args, filename: Optional[str] = None,
+                     dpi: Optional[int] = None, **kwargs) -> Future:
+        """
+        在后台线程中调用 plot_* 方法并渲染为PNG字节，模拟循环无需等待绘图
+        
+        列表/字典参数在提交时浅拷贝，调用方之后可继续修改原数据。
+        给出filename时同时写入文件。后台线程只创建独立的Figure，不调用pyplot，
+        主线程可以同时照常使用pyplot
+        """
+        plot = getattr(self, plot_method)
+        args = tuple(arg.copy() if isinstance(arg, (list, dict)) else arg for arg in args)
+        kwargs = {k: v.copy() if isinstance(v, (list, dict)) else v for k, v in kwargs.items()}
+        
+        def render() -> bytes:
+            self._thread_state.detached = True
+            try:
+                fig = plot(*args, **kwargs)
+            finally:
+                self._thread_state.detached = False
+            buffer = io.BytesIO()
+            fig.savefig(buffer, format='png', dpi=dpi or self.dpi, bbox_inches='tight',
+                        facecolor='white', edgecolor='none')
+            data = buffer.getvalue()
+            if filename:
+                with open(filename, 'wb') as f:
+                    f.write(data)
+            return data
+        
+        if self._render_worker is None:
+            self._render_worker = _RenderWorker()
+        return self._render_worker.submit(render)
+    
+    def stop_render_worker(self):
+        """
+        等待已提交的异步绘图完成并结束后台线程
+        """
+        if self._render_worker is not None:
+            self._render_worker.stop()
+            self._render_worker = None
+    
+    def refresh(self, fig: plt.Figure):
+        """
+        Request a redraw from the GUI event loop (draw_idle coalesces repeated requests)
+        """
+        fig.canvas.draw_idle()
+    
     def show_all_figures(self):
         """
         Show all charts
         """
-        plt.show()
+        self._plt.show()
 
     def close_all_figures(self):
         """
         Close all charts
         """
-        plt.close('all')
+        self._plt.close('all')
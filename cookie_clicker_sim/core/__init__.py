@@ -2,13 +2,13 @@
 核心数据模型模块
 """
 
-from .game_state import GameState
+from .game_state import GameState, Buff
 from .buildings import Building, BUILDINGS
 from .upgrades import Upgrade, UPGRADES
 from .constants import *
 
 __all__ = [
-    'GameState',
+    'GameState', 'Buff',
     'Building', 'BUILDINGS',
     'Upgrade', 'UPGRADES'
 ]
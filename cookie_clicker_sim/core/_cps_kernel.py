@@ -0,0 +1,113 @@
+"""
+建筑物CPS汇总内核
+
+在按BUILDINGS顺序排列的并行数组上求和，安装numba时被JIT编译，否则按普通Python函数运行。
+"""
+
+from ._jit import njit
+
+
+@njit(cache=True, fastmath=True)
+def _building_cps(i, base_cps, amounts, levels, upgrade_mult, grandma_synergy, synergy):
+    """
+    第i个建筑物的CPS (不含牛奶、声望倍数)
+    """
+    amount = amounts[i]
+    if amount <= 0:
+        return 0.0
+    cps = base_cps[i] * amount * upgrade_mult[i]
+    level = levels[i]
+    if level > 0:
+        cps *= 1.0 + level * 0.01
+    if grandma_synergy[i]:
+        cps *= synergy
+    return cps
+
+
+@njit(cache=True, fastmath=True)
+def total_cps(base_cps, amounts, levels, upgrade_mult, grandma_synergy, synergy, milk, prestige):
+    """
+    计算所有建筑物的总CPS (牛奶、声望倍数在求和后统一乘上)
+    """
+    total = 0.0
+    for i in range(len(base_cps)):
+        total += _building_cps(i, base_cps, amounts, levels, upgrade_mult, grandma_synergy, synergy)
+    return total * milk * prestige
+
+
+@njit(cache=True, fastmath=True)
+def building_cps(base_cps, amounts, levels, upgrade_mult, grandma_synergy, synergy, milk, prestige, out):
+    """
+    把每个建筑物的CPS贡献写入预分配的out数组
+    """
+    scale = milk * prestige
+    for i in range(len(base_cps)):
+        out[i] = _building_cps(i, base_cps, amounts, levels, upgrade_mult, grandma_synergy, synergy) * scale
+
+
+@njit(cache=True)
+def _marginal_cps(i, base_cps, levels, upgrade_mult, grandma_synergy, synergy, milk, prestige):
+    """
+    第i个建筑物再买一个的CPS增长 (同Building.marginal_cps)
+    
+    倍数按Building.get_total_multiplier的顺序连乘，不开启fastmath，结果与逐个调用get_efficiency一致
+    """
+    mult = 1.0
+    level = levels[i]
+    if level > 0:
+        mult *= 1.0 + level * 0.01
+    mult *= upgrade_mult[i]
+    if grandma_synergy[i]:
+        mult *= synergy
+    mult *= milk
+    mult *= prestige
+    return base_cps[i] * mult
+
+
+@njit(cache=True)
+def marginal_efficiency(base_cps, levels, upgrade_mult, grandma_synergy, synergy, milk, prestige,
+                        prices, increase_out, efficiency_out):
+    """
+    每个建筑物再买一个的CPS增长与效率(增长/价格)，分别写入increase_out与efficiency_out
+    """
+    for i in range(len(base_cps)):
+        increase = _marginal_cps(i, base_cps, levels, upgrade_mult, grandma_synergy, synergy, milk, prestige)
+        increase_out[i] = increase
+        price = prices[i]
+        efficiency_out[i] = increase / price if price > 0 else 0.0
+
+
+@njit(cache=True)
+def greedy_purchases(base_cps, base_price, price_mult, amounts, prices, levels, upgrade_mult,
+                     grandma_synergy, grandma_idx, milk, prestige, budget):
+    """
+    每次买入预算内效率最高的建筑物(效率相同取靠前者)，直到一个都买不起；amounts原地累加，返回剩余预算
+    
+    prices为各建筑物的当前价格，同样原地维护：每次购买只为买入的那个建筑物重新求幂
+    
+    升级、等级、牛奶、声望在过程中不变，只有奶奶加成随奶奶数量更新
+    """
+    while budget > 0:
+        grandma_count = amounts[grandma_idx]
+        synergy = 1 + grandma_count * 0.01 if grandma_count > 0 else 1.0
+        
+        best = -1
+        best_efficiency = 0.0
+        best_price = 0.0
+        for i in range(len(base_cps)):
+            price = prices[i]
+            if price > budget:
+                continue
+            increase = _marginal_cps(i, base_cps, levels, upgrade_mult, grandma_synergy, synergy, milk, prestige)
+            efficiency = increase / price if price > 0 else 0.0
+            if best < 0 or efficiency > best_efficiency:
+                best = i
+                best_efficiency = efficiency
+                best_price = price
+        
+        if best < 0:
+            break
+        amounts[best] += 1
+        prices[best] = base_price[best] * price_mult[best] ** float(amounts[best])
+        budget -= best_price
+    return budget
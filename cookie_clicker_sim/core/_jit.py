@@ -0,0 +1,25 @@
+"""
+可选的Numba JIT支持
+
+安装了numba时用其njit编译数值内核；未安装时退化为原样返回的Python函数，
+计算结果一致，只是速度较慢。
+"""
+
+try:
+    from numba import njit as _numba_njit
+    HAS_NUMBA = True
+except ImportError:
+    _numba_njit = None
+    HAS_NUMBA = False
+
+
+def njit(*args, **kwargs):
+    """
+    numba.njit的替身，支持 @njit 与 @njit(cache=True, ...) 两种写法
+    """
+    if HAS_NUMBA:
+        return _numba_njit(*args, **kwargs)
+    
+    if len(args) == 1 and callable(args[0]) and not kwargs:
+        return args[0]
+    return lambda func: func
@@ -4,9 +4,43 @@
 定义Cookie Clicker中的所有建筑物类型和相关计算
 """
 
+import functools
+import heapq
 import math
-from typing import Dict, List, Optional
+from array import array
+from typing import Dict, FrozenSet, List, Optional, Tuple
 from .constants import *
+from ._cps_kernel import building_cps, greedy_purchases, marginal_efficiency, total_cps
+from ._jit import HAS_NUMBA
+from .game_state import _BUILDING_INDEX, get_upgrade_id, upgrade_mask
+
+
+# 建筑物专属升级 (简化处理，实际应该从升级数据库中查询)
+_BUILDING_SPECIFIC_UPGRADES: Dict[str, FrozenSet[str]] = {
+    'Cursor': frozenset(['Reinforced index finger', 'Carpal tunnel prevention cream', 'Ambidextrous']),
+    'Grandma': frozenset(['Forwards from grandma', 'Steel-plated rolling pins', 'Lubricated dentures']),
+    'Farm': frozenset(['Cheap hoes', 'Fertilizer', 'Cookie trees']),
+    'Mine': frozenset(['Sugar gas', 'Megadrill', 'Ultradrill']),
+    'Factory': frozenset(['Sturdier conveyor belts', 'Child labor', 'Sweatshop']),
+    'Bank': frozenset(['Taller tellers', 'Scissor-resistant credit cards', 'Acid-proof vaults']),
+    'Temple': frozenset(['Golden idols', 'Sacrifices', 'Delicious blessing']),
+    'Wizard tower': frozenset(['Pointier hats', 'Beardlier beards', 'Ancient grimoires']),
+    'Shipment': frozenset(['Vanilla nebulae', 'Wormholes', 'Frequent flyer']),
+    'Alchemy lab': frozenset(['Antimony', 'Essence of dough', 'True chocolate']),
+    'Portal': frozenset(['Ancient tablet', 'Insane oatling workers', 'Soul bond']),
+    'Time machine': frozenset(['Flux capacitors', 'Time paradox resolver', 'Quantum conundrum']),
+    'Antimatter condenser': frozenset(['Sugar bosons', 'String theory', 'Large macaron collider']),
+    'Prism': frozenset(['Gem polish', 'Ninth color', 'Chocolate light']),
+    'Chancemaker': frozenset(['Your lucky cookie', 'All-natural clovers', 'Leprechaun village']),
+    'Fractal engine': frozenset(['Metabakeries', 'Mandelbrot cake', 'Fractoids'])
+}
+_NO_UPGRADES: FrozenSet[str] = frozenset()
+
+# 对所有建筑物生效的通用升级
+_GENERAL_UPGRADES: FrozenSet[str] = frozenset(
+    ['Forwards from grandma', 'Steel-plated rolling pins', 'Lubricated dentures']
+)
+_GENERAL_UPGRADES_MASK = upgrade_mask(_GENERAL_UPGRADES)
 
 
 class Building:
@@ -19,12 +53,18 @@ class Building:
         self.base_cps = base_cps
         self.icon_id = icon_id
         self.price_multiplier = price_multiplier
+        self.idx = -1  # 在BUILDINGS中的下标 (由initialize_buildings设置)
+        self._upgrade_mask = upgrade_mask(self.get_building_specific_upgrades())
         
         # 建筑物特殊属性
         self.grandma_synergy = False  # 是否与奶奶有协同效应
         self.special_upgrades = []    # 专属升级列表
         self.unlock_condition = None  # 解锁条件
         
+        # get_total_multiplier的缓存: (game_state, 缓存键, 倍数)
+        # Building实例被所有游戏状态共享，因此缓存同时记录所属的状态对象
+        self._mult_cache = (None, None, 1.0)
+        
     def get_price(self, current_amount: int) -> float:
         """
         计算购买下一个建筑物的价格
@@ -32,14 +72,25 @@ class Building:
         """
         return self.base_price * (self.price_multiplier ** current_amount)
     
+    def get_price_fast(self, price_factor: float) -> float:
+        """
+        用预先算好的 price_multiplier ^ current_amount 计算价格，免去幂运算
+        """
+        return self.base_price * price_factor
+    
     def get_bulk_price(self, current_amount: int, buy_amount: int) -> float:
         """
         计算批量购买的总价格
+        等比数列求和: price(current) × (m^buy_amount - 1) / (m - 1)
         """
-        total_price = 0.0
-        for i in range(buy_amount):
-            total_price += self.get_price(current_amount + i)
-        return total_price
+        if buy_amount <= 0:
+            return 0.0
+        
+        m = self.price_multiplier
+        start_price = self.get_price(current_amount)
+        if buy_amount == 1 or m == 1:
+            return start_price * buy_amount
+        return start_price * (m ** buy_amount - 1.0) / (m - 1.0)
     
     def get_cps_contribution(self, amount: int, game_state) -> float:
         """
@@ -56,14 +107,33 @@ class Building:
         
         return base_cps * multiplier
     
+    def marginal_cps(self, game_state) -> float:
+        """
+        再买一个该建筑物增加的CPS
+        
+        CPS贡献与数量成正比 (倍数与自身数量无关)，增量就是单个建筑物的CPS，
+        不必分别计算买前买后两次贡献再相减
+        """
+        return self.base_cps * self.get_total_multiplier(game_state)
+    
     def get_total_multiplier(self, game_state) -> float:
         """
         计算建筑物的总倍数
+        同一游戏状态的版本号(及直接赋值的声望相关属性)不变时直接返回缓存结果
         """
+        key = (game_state.state_version, game_state.prestige,
+               game_state.heavenly_power, game_state.ascension_mode)
+        cached_state, cached_key, cached_multiplier = self._mult_cache
+        if cached_state is game_state and cached_key == key:
+            return cached_multiplier
+        
         multiplier = 1.0
         
         # 建筑物等级加成 (每级+1%)
-        building_level = game_state.building_levels.get(self.name, 0)
+        if self.idx >= 0:
+            building_level = game_state._levels[self.idx]
+        else:
+            building_level = game_state.building_levels.get(self.name, 0)
         if building_level > 0:
             multiplier *= (1 + building_level * 0.01)
         
@@ -83,29 +153,33 @@ class Building:
         # 特殊建筑物倍数
         multiplier *= self.get_special_multiplier(game_state)
         
+        self._mult_cache = (game_state, key, multiplier)
         return multiplier
     
     def get_upgrade_multiplier(self, game_state) -> float:
         """
         计算升级带来的倍数
         """
-        multiplier = 1.0
+        owned = game_state.upgrades_owned_mask
         
-        # 通用升级
-        if game_state.has_upgrade('Forwards from grandma'):
-            multiplier *= 2.0
-        if game_state.has_upgrade('Steel-plated rolling pins'):
-            multiplier *= 2.0
-        if game_state.has_upgrade('Lubricated dentures'):
-            multiplier *= 2.0
+        # 通用升级与建筑物专属升级都是2倍 (大多数建筑物升级都是2倍)，按拥有数量一次求幂
+        doublings = (owned & _GENERAL_UPGRADES_MASK).bit_count()
+        doublings += (owned & self._upgrade_mask).bit_count()
         
-        # 建筑物专属升级
-        building_upgrades = self.get_building_specific_upgrades()
-        for upgrade_name in building_upgrades:
-            if game_state.has_upgrade(upgrade_name):
-                multiplier *= 2.0  # 大多数建筑物升级都是2倍
-        
-        return multiplier
+        return 2.0 ** doublings
+    
+    def get_upgrade_factor(self, upgrade_name: str) -> float:
+        """
+        单个升级使本建筑物CPS增加的倍数 (通用升级与专属升级各翻一倍，见get_upgrade_multiplier)
+        """
+        bit = 1 << get_upgrade_id(upgrade_name)
+        return 2.0 ** (bool(bit & _GENERAL_UPGRADES_MASK) + bool(bit & self._upgrade_mask))
+    
+    def get_multiplier_upgrades(self) -> FrozenSet[str]:
+        """
+        获取会使本建筑物CPS翻倍的全部升级 (通用升级 + 专属升级)
+        """
+        return _GENERAL_UPGRADES | self.get_building_specific_upgrades()
     
     def get_grandma_synergy_multiplier(self, game_state) -> float:
         """
@@ -114,7 +188,7 @@ class Building:
         if not self.grandma_synergy:
             return 1.0
         
-        grandma_count = game_state.get_building_count('Grandma')
+        grandma_count = game_state._amounts[_GRANDMA_IDX]
         if grandma_count <= 0:
             return 1.0
         
@@ -138,39 +212,20 @@ class Building:
         
         return multiplier
     
-    def get_building_specific_upgrades(self) -> List[str]:
+    def get_building_specific_upgrades(self) -> FrozenSet[str]:
         """
         获取建筑物专属升级列表
         """
-        # 这里简化处理，实际应该从升级数据库中查询
-        upgrades_map = {
-            'Cursor': ['Reinforced index finger', 'Carpal tunnel prevention cream', 'Ambidextrous'],
-            'Grandma': ['Forwards from grandma', 'Steel-plated rolling pins', 'Lubricated dentures'],
-            'Farm': ['Cheap hoes', 'Fertilizer', 'Cookie trees'],
-            'Mine': ['Sugar gas', 'Megadrill', 'Ultradrill'],
-            'Factory': ['Sturdier conveyor belts', 'Child labor', 'Sweatshop'],
-            'Bank': ['Taller tellers', 'Scissor-resistant credit cards', 'Acid-proof vaults'],
-            'Temple': ['Golden idols', 'Sacrifices', 'Delicious blessing'],
-            'Wizard tower': ['Pointier hats', 'Beardlier beards', 'Ancient grimoires'],
-            'Shipment': ['Vanilla nebulae', 'Wormholes', 'Frequent flyer'],
-            'Alchemy lab': ['Antimony', 'Essence of dough', 'True chocolate'],
-            'Portal': ['Ancient tablet', 'Insane oatling workers', 'Soul bond'],
-            'Time machine': ['Flux capacitors', 'Time paradox resolver', 'Quantum conundrum'],
-            'Antimatter condenser': ['Sugar bosons', 'String theory', 'Large macaron collider'],
-            'Prism': ['Gem polish', 'Ninth color', 'Chocolate light'],
-            'Chancemaker': ['Your lucky cookie', 'All-natural clovers', 'Leprechaun village'],
-            'Fractal engine': ['Metabakeries', 'Mandelbrot cake', 'Fractoids']
-        }
-        return upgrades_map.get(self.name, [])
+        return _BUILDING_SPECIFIC_UPGRADES.get(self.name, _NO_UPGRADES)
     
-    def get_efficiency(self, current_amount: int, game_state) -> float:
+    def get_efficiency(self, current_amount: int, game_state, price: Optional[float] = None) -> float:
         """
         计算购买效率 (CPS增长 / 价格)
+        price: 已知的下一个建筑物价格，省略时按数量重新计算
         """
-        price = self.get_price(current_amount)
-        current_cps = self.get_cps_contribution(current_amount, game_state)
-        new_cps = self.get_cps_contribution(current_amount + 1, game_state)
-        cps_increase = new_cps - current_cps
+        if price is None:
+            price = self.get_price(current_amount)
+        cps_increase = self.marginal_cps(game_state)
         
         return cps_increase / price if price > 0 else 0.0
     
@@ -190,28 +245,87 @@ class Building:
 # 创建所有建筑物实例
 BUILDINGS: Dict[str, Building] = {}
 
+# 按BUILDINGS顺序展开的并行数组 (Struct-of-Arrays)，供每帧的CPS汇总使用
+_NAMES: List[str] = []
+_BASE_CPS = array('d')
+_BASE_PRICE = array('d')
+_PRICE_MULT = array('d')
+_GRANDMA_SYNERGY = array('b')
+_GRANDMA_IDX = _BUILDING_INDEX['Grandma']
+
 def initialize_buildings():
     """初始化所有建筑物"""
     global BUILDINGS
     
     for i, (name, base_price, base_cps, icon_id) in enumerate(BUILDINGS_BASE_DATA):
         building = Building(name, base_price, base_cps, icon_id)
+        building.idx = i
         
         # 设置特殊属性
         if name != 'Cursor' and name != 'Grandma':
             building.grandma_synergy = True
         
         BUILDINGS[name] = building
+    
+    _NAMES[:] = BUILDINGS.keys()
+    _BASE_CPS[:] = array('d', (b.base_cps for b in BUILDINGS.values()))
+    _BASE_PRICE[:] = array('d', (b.base_price for b in BUILDINGS.values()))
+    _PRICE_MULT[:] = array('d', (b.price_multiplier for b in BUILDINGS.values()))
+    _GRANDMA_SYNERGY[:] = array('b', (b.grandma_synergy for b in BUILDINGS.values()))
 
 # 初始化建筑物
 initialize_buildings()
 
 
+@functools.lru_cache(maxsize=64)
+def _compile_cps_kernel(coefficients: tuple, synergy_flags: tuple):
+    """
+    生成常数内联的CPS求和函数 f(amounts, levels, synergy, milk, prestige)
+    
+    coefficients[i] 为 base_cps × 升级倍数，在升级集合不变期间是常数；
+    展开成一条直线表达式，求和时没有循环和倍数数组的读取
+    """
+    terms = []
+    for i, (coefficient, has_synergy) in enumerate(zip(coefficients, synergy_flags)):
+        term = f"{coefficient!r}*a[{i}]*(1.0+0.01*l[{i}])"
+        if has_synergy:
+            term += "*s"
+        terms.append(term)
+    src = ("def _total_cps(a, l, s, milk, prestige):\n"
+           f"    return ({' + '.join(terms) or '0.0'})*milk*prestige\n")
+    namespace = {}
+    exec(compile(src, "<cps_kernel>", "exec"), namespace)
+    return namespace['_total_cps']
+
+
 class BuildingManager:
     """建筑物管理器"""
     
     def __init__(self, game_state):
         self.game_state = game_state
+        
+        # 每个建筑物的升级倍数，只在已购升级变化后重新计算
+        self._upgrade_mult = array('d', bytes(8 * len(_NAMES)))
+        self._upgrade_mult_version = -1
+        
+        # 每个建筑物CPS贡献的输出数组 (get_building_cps原地填充)
+        self._building_cps = array('d', bytes(8 * len(_NAMES)))
+        
+        # 再买一个的CPS增长与效率 (get_marginal_efficiencies原地填充)
+        self._cps_increase = array('d', bytes(8 * len(_NAMES)))
+        self._efficiency = array('d', bytes(8 * len(_NAMES)))
+        
+        # 以当前升级倍数生成的CPS求和函数 (见_compile_cps_kernel)
+        self._kernel = None
+        self._kernel_version = -1
+        
+        # 价格倍数 price_multiplier ^ amount，只在对应建筑物数量变化时重新求幂
+        self._price_factor = array('d', bytes(8 * len(_NAMES)))
+        self._price_factor_amounts = array('q', [-1]) * len(_NAMES)
+        
+        # 效率最大堆: 条目为 (-效率, 建筑物下标, 计算时的数量)，每个建筑物恰好一个条目
+        self._efficiency_heap = []
+        self._efficiency_heap_key = None
     
     def buy_building(self, building_name: str, amount: int = 1) -> bool:
         """
@@ -221,7 +335,7 @@ class BuildingManager:
             return False
         
         building = BUILDINGS[building_name]
-        current_amount = self.game_state.get_building_count(building_name)
+        current_amount = self.game_state._amounts[building.idx]
         total_price = building.get_bulk_price(current_amount, amount)
         
         if self.game_state.spend_cookies(total_price):
@@ -238,15 +352,16 @@ class BuildingManager:
             return None
         
         building = BUILDINGS[building_name]
-        current_amount = self.game_state.get_building_count(building_name)
+        current_amount = self.game_state._amounts[building.idx]
+        price = self.get_price(building, current_amount)
         
         return {
             'name': building.name,
             'amount': current_amount,
-            'price': building.get_price(current_amount),
+            'price': price,
             'cps': building.get_cps_contribution(current_amount, self.game_state),
-            'efficiency': building.get_efficiency(current_amount, self.game_state),
-            'can_afford': building.can_afford(current_amount, self.game_state.cookies)
+            'efficiency': building.get_efficiency(current_amount, self.game_state, price),
+            'can_afford': self.game_state.cookies >= price
         }
     
     def get_all_buildings_info(self) -> Dict[str, Dict]:
@@ -257,32 +372,175 @@ class BuildingManager:
     
     def get_most_efficient_building(self) -> Optional[str]:
         """
-        获取效率最高的建筑物
+        获取效率最高(且买得起)的建筑物
+        
+        购买只会降低该建筑物自身的效率，所以堆顶条目若已过期就重新计算后下沉，
+        无需每次扫描全部建筑物；影响所有建筑物倍数的变化则整体重建堆
         """
+        game_state = self.game_state
+        amounts = game_state._amounts
+        heap = self._efficiency_heap
+        self._refresh_efficiency_heap()
+        
         best_building = None
-        best_efficiency = 0.0
-        
-        for building_name in BUILDINGS.keys():
-            building = BUILDINGS[building_name]
-            current_amount = self.game_state.get_building_count(building_name)
-            
-            if building.can_afford(current_amount, self.game_state.cookies):
-                efficiency = building.get_efficiency(current_amount, self.game_state)
-                if efficiency > best_efficiency:
-                    best_efficiency = efficiency
-                    best_building = building_name
+        skipped = []
+        while heap:
+            neg_efficiency, i, amount = heap[0]
+            building = BUILDINGS[_NAMES[i]]
+            current_amount = amounts[i]
+            if current_amount != amount:
+                heapq.heapreplace(heap, self._efficiency_entry(building, current_amount))
+                continue
+            if neg_efficiency >= 0:
+                break
+            if game_state.cookies >= self.get_price(building, amount):
+                best_building = building.name
+                break
+            skipped.append(heapq.heappop(heap))
+        
+        for entry in skipped:
+            heapq.heappush(heap, entry)
         
         return best_building
     
+    def _efficiency_entry(self, building: Building, amount: int) -> tuple:
+        """
+        生成效率堆条目
+        """
+        price = self.get_price(building, amount)
+        return (-building.get_efficiency(amount, self.game_state, price), building.idx, amount)
+    
+    def _refresh_efficiency_heap(self):
+        """
+        全局倍数变化(升级、等级、奶奶数量、牛奶、声望)或有建筑物数量减少时重建效率堆
+        """
+        game_state = self.game_state
+        amounts = game_state._amounts
+        key = (game_state._state_version, game_state.building_levels.version,
+               amounts[_GRANDMA_IDX], game_state.prestige,
+               game_state.heavenly_power, game_state.ascension_mode)
+        heap = self._efficiency_heap
+        
+        if key == self._efficiency_heap_key and heap:
+            if all(amounts[i] >= amount for _, i, amount in heap):
+                return
+        
+        heap[:] = [self._efficiency_entry(BUILDINGS[name], amounts[i])
+                   for i, name in enumerate(_NAMES)]
+        heapq.heapify(heap)
+        self._efficiency_heap_key = key
+    
+    def get_price(self, building: Building, current_amount: int) -> float:
+        """
+        获取建筑物当前价格 (价格倍数按数量缓存，数量不变时无需求幂)
+        """
+        i = building.idx
+        if self._price_factor_amounts[i] != current_amount:
+            self._price_factor[i] = building.price_multiplier ** current_amount
+            self._price_factor_amounts[i] = current_amount
+        return building.get_price_fast(self._price_factor[i])
+    
+    def get_prices(self) -> array:
+        """
+        按BUILDINGS顺序获取所有建筑物的当前价格
+        """
+        amounts = self.game_state._amounts
+        return array('d', (self.get_price(BUILDINGS[name], amounts[i])
+                           for i, name in enumerate(_NAMES)))
+    
+    def _get_upgrade_mult(self) -> array:
+        """
+        获取按建筑物顺序排列的升级倍数向量 (以升级集合版本号为缓存键)
+        
+        特殊倍数(龙、万神殿、花园)目前恒为1，一并折叠进该向量；实现这些系统后需加入缓存键
+        """
+        game_state = self.game_state
+        version = game_state.upgrades_owned.version
+        if version != self._upgrade_mult_version:
+            for i, building in enumerate(BUILDINGS.values()):
+                self._upgrade_mult[i] = (building.get_upgrade_multiplier(game_state)
+                                         * building.get_special_multiplier(game_state))
+            self._upgrade_mult_version = version
+        return self._upgrade_mult
+    
+    def _get_kernel(self):
+        """
+        获取与当前升级集合对应的CPS求和函数，升级集合变化时重新生成
+        """
+        version = self.game_state.upgrades_owned.version
+        if version != self._kernel_version:
+            upgrade_mult = self._get_upgrade_mult()
+            coefficients = tuple(base_cps * mult for base_cps, mult in zip(_BASE_CPS, upgrade_mult))
+            self._kernel = _compile_cps_kernel(coefficients, tuple(_GRANDMA_SYNERGY))
+            self._kernel_version = version
+        return self._kernel
+    
     def calculate_total_cps(self) -> float:
         """
         计算所有建筑物的总CPS
+        
+        牛奶和声望倍数对所有建筑物相同，提到求和之外只乘一次；
+        有numba时用编译好的循环内核，否则用按升级集合生成的直线求和函数
+        """
+        game_state = self.game_state
+        amounts = game_state._amounts
+        
+        grandma_count = amounts[_GRANDMA_IDX]
+        synergy = 1 + grandma_count * 0.01 if grandma_count > 0 else 1.0
+        milk = game_state.get_milk_multiplier()
+        prestige = game_state.get_prestige_multiplier()
+        
+        if HAS_NUMBA:
+            return total_cps(_BASE_CPS, amounts, game_state._levels, self._get_upgrade_mult(),
+                             _GRANDMA_SYNERGY, synergy, milk, prestige)
+        return self._get_kernel()(amounts, game_state._levels, synergy, milk, prestige)
+    
+    def get_building_cps(self) -> array:
+        """
+        按BUILDINGS顺序计算每个建筑物的CPS贡献 (返回内部预分配数组，下次调用时会被覆盖)
         """
-        total_cps = 0.0
+        game_state = self.game_state
+        amounts = game_state._amounts
         
-        for building_name, building in BUILDINGS.items():
-            amount = self.game_state.get_building_count(building_name)
-            cps = building.get_cps_contribution(amount, self.game_state)
-            total_cps += cps
+        grandma_count = amounts[_GRANDMA_IDX]
+        synergy = 1 + grandma_count * 0.01 if grandma_count > 0 else 1.0
         
-        return total_cps
+        building_cps(_BASE_CPS, amounts, game_state._levels, self._get_upgrade_mult(),
+                     _GRANDMA_SYNERGY, synergy, game_state.get_milk_multiplier(),
+                     game_state.get_prestige_multiplier(), self._building_cps)
+        return self._building_cps
+    
+    def get_marginal_efficiencies(self, prices: Optional[array] = None) -> Tuple[array, array]:
+        """
+        按BUILDINGS顺序计算每个建筑物再买一个的 (CPS增长, 效率)，一次内核调用完成
+        
+        prices: 已由get_prices()取得的价格，省略时重新获取；返回内部预分配数组，下次调用时会被覆盖
+        """
+        game_state = self.game_state
+        amounts = game_state._amounts
+        if prices is None:
+            prices = self.get_prices()
+        
+        grandma_count = amounts[_GRANDMA_IDX]
+        synergy = 1 + grandma_count * 0.01 if grandma_count > 0 else 1.0
+        
+        marginal_efficiency(_BASE_CPS, game_state._levels, self._get_upgrade_mult(),
+                            _GRANDMA_SYNERGY, synergy, game_state.get_milk_multiplier(),
+                            game_state.get_prestige_multiplier(), prices,
+                            self._cps_increase, self._efficiency)
+        return self._cps_increase, self._efficiency
+    
+    def greedy_purchase(self, budget: float) -> Tuple[array, float]:
+        """
+        在预算内反复买入效率最高且买得起的建筑物，直到一个都买不起 (不修改游戏状态)
+        
+        返回 (按BUILDINGS顺序的购买后数量, 剩余预算)；整个过程在一次内核调用中完成
+        """
+        game_state = self.game_state
+        amounts = array('q', game_state._amounts)
+        remaining = greedy_purchases(_BASE_CPS, _BASE_PRICE, _PRICE_MULT, amounts, self.get_prices(),
+                                     game_state._levels, self._get_upgrade_mult(),
+                                     _GRANDMA_SYNERGY, _GRANDMA_IDX,
+                                     game_state.get_milk_multiplier(),
+                                     game_state.get_prestige_multiplier(), float(budget))
+        return amounts, remaining
@@ -0,0 +1,45 @@
+"""
+建筑物数组视图 (Struct-of-Arrays)
+
+把BUILDINGS注册表按字段展开为并行的NumPy数组，供需要对全部建筑物做向量运算的代码使用。
+Building类仍是建筑物的主要表示；本模块只在导入时遍历一次注册表。
+"""
+
+import numpy as np
+from typing import Dict
+from .buildings import BUILDINGS
+from .constants import BUILDING_PRICE_MULTIPLIER, MAX_BUILDING_AMOUNT
+
+
+def _readonly(array: np.ndarray) -> np.ndarray:
+    """标记为只读，防止共享的模块级数组被意外修改"""
+    array.setflags(write=False)
+    return array
+
+
+# 建筑物名称，顺序与BUILDINGS一致
+NAMES = _readonly(np.array(list(BUILDINGS.keys())))
+
+# 名称 -> 数组下标
+NAME_TO_IDX: Dict[str, int] = {name: i for i, name in enumerate(BUILDINGS)}
+
+# 基础价格与基础CPS
+BASE_PRICES = _readonly(np.fromiter((b.base_price for b in BUILDINGS.values()),
+                                    dtype=np.float64, count=len(BUILDINGS)))
+BASE_CPS = _readonly(np.fromiter((b.base_cps for b in BUILDINGS.values()),
+                                 dtype=np.float64, count=len(BUILDINGS)))
+
+# 价格倍数幂次表: POW_TABLE[n] = BUILDING_PRICE_MULTIPLIER ** n
+POW_TABLE = _readonly(np.power(BUILDING_PRICE_MULTIPLIER, np.arange(MAX_BUILDING_AMOUNT + 1)))
+
+
+def price_factors(amounts: np.ndarray) -> np.ndarray:
+    """
+    按数量取价格倍数 BUILDING_PRICE_MULTIPLIER ** amounts
+    
+    GameState不限制建筑物数量，超出MAX_BUILDING_AMOUNT(幂次表末端)时改为直接求幂
+    """
+    amounts = np.asarray(amounts)
+    if amounts.size == 0 or amounts.max() <= MAX_BUILDING_AMOUNT:
+        return POW_TABLE[amounts]
+    return np.power(BUILDING_PRICE_MULTIPLIER, amounts.astype(np.float64))
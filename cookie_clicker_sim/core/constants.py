@@ -13,6 +13,9 @@ PRESTIGE_BASE = 1_000_000_000_000  # 声望计算基数 (1万亿)
 # 建筑物价格增长率
 BUILDING_PRICE_MULTIPLIER = 1.15
 
+# 单种建筑物数量上限 (游戏内部限制)
+MAX_BUILDING_AMOUNT = 5000
+
 # 牛奶系统
 ACHIEVEMENTS_PER_MILK = 25  # 每25个成就解锁一种牛奶
 
@@ -41,12 +44,11 @@ BUILDINGS_BASE_DATA = [
     ('Fractal engine', 310000000000000000, 150000000000.0, 15),
 ]
 
-def calculate_building_base_cps(building_index):
+def _building_base_cps_formula(n):
     """
     根据建筑物索引计算基础CPS
     基于源码公式: Math.ceil((Math.pow(n*1,n*0.5+2))*10)/10
     """
-    n = building_index
     if n == 0:  # Cursor特殊处理
         return 0.1
     
@@ -58,13 +60,11 @@ def calculate_building_base_cps(building_index):
     
     return base_cps
 
-def calculate_building_base_price(building_index):
+def _building_base_price_formula(n):
     """
     根据建筑物索引计算基础价格
     基于源码公式: (n+9+(n<5?0:Math.pow(n-5,1.75)*5))*Math.pow(10,n)*(Math.max(1,n-14))
     """
-    n = building_index
-    
     base = n + 9
     if n >= 5:
         base += ((n - 5) ** 1.75) * 5
@@ -72,16 +72,40 @@ def calculate_building_base_price(building_index):
     price = base * (10 ** n) * max(1, n - 14)
     return price
 
+# 已有建筑物索引的结果在导入时算好一次，之后按索引查表
+_BUILDING_BASE_CPS_TABLE = tuple(_building_base_cps_formula(n)
+                                 for n in range(len(BUILDINGS_BASE_DATA)))
+_BUILDING_BASE_PRICE_TABLE = tuple(_building_base_price_formula(n)
+                                   for n in range(len(BUILDINGS_BASE_DATA)))
+
+def calculate_building_base_cps(building_index):
+    """
+    根据建筑物索引计算基础CPS (已有建筑物直接查表，其余按公式计算)
+    """
+    if isinstance(building_index, int) and 0 <= building_index < len(_BUILDING_BASE_CPS_TABLE):
+        return _BUILDING_BASE_CPS_TABLE[building_index]
+    return _building_base_cps_formula(building_index)
+
+def calculate_building_base_price(building_index):
+    """
+    根据建筑物索引计算基础价格 (已有建筑物直接查表，其余按公式计算)
+    """
+    if isinstance(building_index, int) and 0 <= building_index < len(_BUILDING_BASE_PRICE_TABLE):
+        return _BUILDING_BASE_PRICE_TABLE[building_index]
+    return _building_base_price_formula(building_index)
+
 def calculate_prestige(cookies_reset):
     """
     计算声望等级
     公式: Math.pow(cookies/1000000000000, 1/3)
+    只使用算术运算符，可直接传入NumPy数组按元素计算
     """
     return (cookies_reset / PRESTIGE_BASE) ** (1 / HC_FACTOR)
 
 def calculate_cookies_for_prestige(prestige_level):
     """
     计算达到指定声望等级需要的饼干数
+    同样支持NumPy数组输入 (传入浮点数组，整数数组的立方乘以PRESTIGE_BASE会溢出)
     """
     return (prestige_level ** HC_FACTOR) * PRESTIGE_BASE
 
@@ -4,16 +4,326 @@
 管理Cookie Clicker的完整游戏状态，包括饼干、建筑物、升级、成就等
 """
 
+import heapq
+import itertools
 import time
-import copy
-from typing import Dict, Set, Optional
+from array import array
+from types import MappingProxyType
+from dataclasses import dataclass
+from typing import Any, Dict, Mapping, Set, Optional
 from .constants import *
 
 
+# 建筑物名称 -> 下标 (与BUILDINGS顺序一致)
+_BUILDING_INDEX: Dict[str, int] = {name: i for i, (name, _, _, _) in enumerate(BUILDINGS_BASE_DATA)}
+
+# 各种牛奶的解锁门槛: _MILK_THRESHOLDS[i]个成就解锁第i+1种牛奶 (最多12种)
+_MAX_MILK_TYPE = 12
+_MILK_THRESHOLDS = tuple(ACHIEVEMENTS_PER_MILK * i for i in range(1, _MAX_MILK_TYPE + 1))
+
+# 升级名称 -> 位下标 (名称首次用到时分配；UPGRADES与建筑物专属升级在导入时登记)
+UPGRADE_ID: Dict[str, int] = {}
+
+
+def get_upgrade_id(upgrade_name: str) -> int:
+    """获取升级的位下标，未登记的名称分配新下标"""
+    upgrade_id = UPGRADE_ID.get(upgrade_name)
+    if upgrade_id is None:
+        upgrade_id = UPGRADE_ID[upgrade_name] = len(UPGRADE_ID)
+    return upgrade_id
+
+
+def upgrade_mask(upgrade_names) -> int:
+    """把一组升级名称转换为位掩码"""
+    mask = 0
+    for upgrade_name in upgrade_names:
+        mask |= 1 << get_upgrade_id(upgrade_name)
+    return mask
+
+# 实例编号: 每个新建、拷贝或反序列化得到的实例各取一个，不会像id()那样在对象回收后被复用
+_INSTANCE_UIDS = itertools.count()
+
+# 影响牛奶倍数的小猫升级
+_KITTEN_MASK = upgrade_mask(['Kitten helpers', 'Kitten workers', 'Kitten engineers'])
+
+
+@dataclass(slots=True, frozen=True)
+class Buff:
+    """生效中的buff: 到期时刻(按buff计时)与效果数据"""
+    expire_at: float
+    effect: Any
+
+
+class _VersionedDict(dict):
+    """
+    记录写入次数的字典
+    
+    外部代码会直接写入 game_state.buildings[name] = n，版本号让依赖这些数据的缓存也能及时失效
+    """
+    __slots__ = ('version',)
+    
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.version = 0
+    
+    def __setitem__(self, key, value):
+        super().__setitem__(key, value)
+        self.version += 1
+    
+    def __delitem__(self, key):
+        super().__delitem__(key)
+        self.version += 1
+    
+    def update(self, *args, **kwargs):
+        super().update(*args, **kwargs)
+        self.version += 1
+    
+    def setdefault(self, key, default=None):
+        self.version += 1
+        return super().setdefault(key, default)
+    
+    def pop(self, *args):
+        self.version += 1
+        return super().pop(*args)
+    
+    def popitem(self):
+        self.version += 1
+        return super().popitem()
+    
+    def clear(self):
+        super().clear()
+        self.version += 1
+    
+    def copy(self):
+        """浅拷贝，保持带版本号的类型"""
+        return self.__class__(self)
+    
+    def __reduce__(self):
+        """拷贝/序列化时经由__init__重建，槽属性在写入条目之前就已存在"""
+        return (self.__class__, (dict(self),), (None, {'version': self.version}))
+
+
+class _UpgradeSet(set):
+    """
+    已购升级集合，随内容同步维护位掩码(第UPGRADE_ID[name]位)与版本号
+    
+    外部代码会直接调用 game_state.upgrades_owned.add(name)，不经过add_upgrade，
+    由集合自己维护掩码和版本号，依赖它们的缓存才不会读到旧值
+    """
+    __slots__ = ('mask', 'version')
+    
+    def __init__(self, iterable=()):
+        super().__init__(iterable)
+        self.mask = upgrade_mask(self)
+        self.version = 0
+    
+    def _rebuild(self):
+        """批量修改后按内容重算掩码"""
+        self.mask = upgrade_mask(self)
+        self.version += 1
+    
+    def add(self, upgrade_name):
+        if upgrade_name not in self:
+            super().add(upgrade_name)
+            self.mask |= 1 << get_upgrade_id(upgrade_name)
+            self.version += 1
+    
+    def discard(self, upgrade_name):
+        if upgrade_name in self:
+            self.remove(upgrade_name)
+    
+    def remove(self, upgrade_name):
+        super().remove(upgrade_name)
+        self.mask &= ~(1 << get_upgrade_id(upgrade_name))
+        self.version += 1
+    
+    def pop(self):
+        upgrade_name = super().pop()
+        self.mask &= ~(1 << get_upgrade_id(upgrade_name))
+        self.version += 1
+        return upgrade_name
+    
+    def clear(self):
+        super().clear()
+        self.mask = 0
+        self.version += 1
+    
+    def update(self, *others):
+        super().update(*others)
+        self._rebuild()
+    
+    def intersection_update(self, *others):
+        super().intersection_update(*others)
+        self._rebuild()
+    
+    def difference_update(self, *others):
+        super().difference_update(*others)
+        self._rebuild()
+    
+    def symmetric_difference_update(self, other):
+        super().symmetric_difference_update(other)
+        self._rebuild()
+    
+    def __ior__(self, other):
+        super().__ior__(other)
+        self._rebuild()
+        return self
+    
+    def __iand__(self, other):
+        super().__iand__(other)
+        self._rebuild()
+        return self
+    
+    def __isub__(self, other):
+        super().__isub__(other)
+        self._rebuild()
+        return self
+    
+    def __ixor__(self, other):
+        super().__ixor__(other)
+        self._rebuild()
+        return self
+    
+    def copy(self):
+        """浅拷贝，保持类型并沿用掩码与版本号"""
+        new = self.__class__.__new__(self.__class__)
+        set.update(new, self)
+        new.mask = self.mask
+        new.version = self.version
+        return new
+    
+    def __reduce__(self):
+        """拷贝/序列化时经由__init__重建 (掩码随之重算)，再恢复版本号"""
+        return (self.__class__, (list(self),), (None, {'version': self.version}))
+
+
+class _BuildingTable(_VersionedDict):
+    """
+    按建筑物名称存储整数的字典，同时把已知建筑物的值镜像到按下标排列的数组
+    
+    内部热路径通过 array[building.idx] 读取，不必对字符串求哈希；
+    外部代码仍可像普通字典一样读写
+    """
+    __slots__ = ('array',)
+    
+    def __init__(self, *args, **kwargs):
+        self.array = array('q', bytes(8 * len(_BUILDING_INDEX)))
+        super().__init__(*args, **kwargs)
+        self._sync()
+    
+    def fill(self, value):
+        """把所有条目设为同一个值 (数组原地修改，外部持有的引用保持有效)"""
+        dict.update(self, dict.fromkeys(self, value))
+        values = self.array
+        for i in range(len(values)):
+            values[i] = value
+        self.version += 1
+    
+    def copy(self):
+        """浅拷贝，直接复制镜像数组而不是按字典重新同步"""
+        new = self.__class__.__new__(self.__class__)
+        dict.update(new, self)
+        new.version = 0
+        new.array = self.array[:]
+        return new
+    
+    def __reduce__(self):
+        """数组随状态一起拷贝，使GameState上指向它的别名在拷贝后仍是同一对象"""
+        cls, args, (_, slots) = super().__reduce__()
+        slots['array'] = self.array
+        return cls, args, (None, slots)
+    
+    def _sync(self):
+        """按字典内容重写整个数组 (批量修改后调用)"""
+        values = self.array
+        for name, i in _BUILDING_INDEX.items():
+            values[i] = int(dict.get(self, name, 0))
+    
+    def __setitem__(self, key, value):
+        super().__setitem__(key, value)
+        i = _BUILDING_INDEX.get(key)
+        if i is not None:
+            self.array[i] = int(value)
+    
+    def __delitem__(self, key):
+        super().__delitem__(key)
+        i = _BUILDING_INDEX.get(key)
+        if i is not None:
+            self.array[i] = 0
+    
+    def update(self, *args, **kwargs):
+        super().update(*args, **kwargs)
+        self._sync()
+    
+    def setdefault(self, key, default=None):
+        value = super().setdefault(key, default)
+        self._sync()
+        return value
+    
+    def pop(self, *args):
+        value = super().pop(*args)
+        self._sync()
+        return value
+    
+    def popitem(self):
+        item = super().popitem()
+        self._sync()
+        return item
+    
+    def clear(self):
+        super().clear()
+        self._sync()
+    
+    def assign(self, other):
+        """用另一个建筑物表的内容覆盖本表 (复用已有的哈希表与数组)"""
+        dict.clear(self)
+        dict.update(self, other)
+        self.array[:] = other.array
+        self.version += 1
+
+
 class GameState:
     """游戏状态类，存储所有游戏数据"""
     
-    def __init__(self):
+    # 固定属性布局: 无实例__dict__，属性读写按槽位偏移完成 (各属性含义见__init__)
+    __slots__ = (
+        '_uid',
+        'cookies', 'cookies_earned', 'cookies_reset', 'cookies_per_second', 'cookies_per_click',
+        'cookie_clicks', 'handmade_cookies',
+        'buildings', 'building_levels', '_amounts', '_levels',
+        'upgrades_owned', 'upgrades_unlocked', '_state_version',
+        'achievements', 'achievements_owned',
+        'prestige', 'heavenly_chips', 'heavenly_chips_spent', 'heavenly_power', 'ascension_mode',
+        'game_time', 'session_start', 'last_update', '_clock',
+        'season', 'season_time', 'santa_level',
+        'milk_progress', 'milk_type', '_next_milk_threshold', '_milk_mult', '_milk_mult_dirty',
+        '_milk_mult_kittens',
+        'golden_cookies_clicked', 'golden_cookies_missed', 'last_golden_cookie',
+        'buffs', '_buff_clock', '_buff_heap',
+        'garden_unlocked', 'grimoire_unlocked', 'pantheon_unlocked',
+        'garden_plants', 'garden_soil',
+        'pantheon_slots', 'pantheon_swaps',
+        'magic_power', 'max_magic_power', 'spells_cast',
+        'stat_buildings_owned', 'stat_upgrades_owned', 'stat_resets', 'stat_playtime',
+        '_building_manager', '_upgrade_manager',
+    )
+    
+    # copy()中需要单独复制的可变属性 (其余属性为不可变值，直接共享)
+    _CONTAINER_ATTRS = ('buildings', 'building_levels', 'garden_plants',
+                        'buffs', '_buff_heap')
+    _SET_ATTRS = ('upgrades_owned', 'upgrades_unlocked', 'achievements')
+    
+    # acquire/release复用的空闲实例
+    _pool = []
+    _pool_cap = 64
+    
+    def __init__(self, clock=None):
+        """
+        clock: 返回当前时间(秒)的无参函数，默认time.monotonic；
+        模拟器传入自己的虚拟时钟，模拟过程中不再查询系统时间
+        """
+        self._uid = next(_INSTANCE_UIDS)      # 实例编号 (外部缓存的键)
+        
         # 基础饼干数据
         self.cookies = 0.0                    # 当前饼干数量
         self.cookies_earned = 0.0             # 本次运行总获得饼干数
@@ -26,18 +336,23 @@ class GameState:
         self.handmade_cookies = 0.0           # 手动点击获得的饼干数
         
         # 建筑物数量 {building_name: amount}
-        self.buildings = {}
+        self.buildings = _BuildingTable()
         for name, _, _, _ in BUILDINGS_BASE_DATA:
             self.buildings[name] = 0
         
         # 建筑物等级 {building_name: level}
-        self.building_levels = {}
+        self.building_levels = _BuildingTable()
         for name, _, _, _ in BUILDINGS_BASE_DATA:
             self.building_levels[name] = 0
         
+        # 按建筑物下标排列的数量/等级数组 (与上面两个字典同步，供内部按 building.idx 读取)
+        self._amounts = self.buildings.array
+        self._levels = self.building_levels.array
+        
         # 升级状态
-        self.upgrades_owned = set()           # 已购买的升级
+        self.upgrades_owned = _UpgradeSet()   # 已购买的升级 (附带位掩码与版本号)
         self.upgrades_unlocked = set()        # 已解锁但未购买的升级
+        self._state_version = 0               # 升级/牛奶/声望等变化时递增 (见state_version)
         
         # 成就系统
         self.achievements = set()             # 已获得的成就
@@ -52,16 +367,22 @@ class GameState:
         
         # 时间相关
         self.game_time = 0.0                  # 游戏总时间(秒)
-        self.session_start = time.time()      # 本次会话开始时间
-        self.last_update = time.time()        # 上次更新时间
+        self._clock = clock if clock is not None else time.monotonic
+        self.session_start = self._clock()    # 本次会话开始时间
+        self.last_update = self.session_start # 上次更新时间
         
         # 特殊系统状态
         self.season = ''                      # 当前季节
         self.season_time = 0                  # 季节剩余时间
+        self.santa_level = 0                  # 圣诞老人等级 (Santa's legacy按等级加成CPS)
         
         # 牛奶系统
         self.milk_progress = 0.0              # 牛奶进度
         self.milk_type = 0                    # 牛奶类型
+        self._next_milk_threshold = _MILK_THRESHOLDS[0]  # 解锁下一种牛奶所需成就数
+        self._milk_mult = 1.0                 # 缓存的牛奶CPS倍数
+        self._milk_mult_dirty = True          # 牛奶进度变化后需重新计算
+        self._milk_mult_kittens = 0           # 计算_milk_mult时已购小猫升级的位掩码
         
         # 金饼干系统
         self.golden_cookies_clicked = 0       # 金饼干点击次数
@@ -69,7 +390,9 @@ class GameState:
         self.last_golden_cookie = 0           # 上次金饼干时间
         
         # Buff系统
-        self.buffs = {}                       # 当前生效的buff
+        self.buffs = _VersionedDict()         # 当前生效的buff {buff_name: Buff}
+        self._buff_clock = 0.0                # buff计时 (update_buffs累计的时间)
+        self._buff_heap = []                  # (到期时刻, buff名称) 最小堆，过期条目延迟丢弃
         
         # 小游戏状态
         self.garden_unlocked = False          # 花园是否解锁
@@ -89,21 +412,132 @@ class GameState:
         self.max_magic_power = 0              # 最大魔法值
         self.spells_cast = 0                  # 施法次数
         
-        # 统计数据
-        self.stats = {
-            'buildings_owned': 0,
-            'upgrades_owned': 0,
-            'resets': 0,
-            'playtime': 0.0
-        }
+        # 统计数据 (平铺为槽位属性，字典形式见stats属性)
+        self.stat_buildings_owned = 0
+        self.stat_upgrades_owned = 0
+        self.stat_resets = 0
+        self.stat_playtime = 0.0
+        
+        # 绑定到本状态的管理器 (首次使用时创建，见get_building_manager/get_upgrade_manager)
+        self._building_manager = None
+        self._upgrade_manager = None
+    
+    @property
+    def stats(self) -> Mapping[str, Any]:
+        """
+        统计数据的只读视图 (每次访问重新组装)
+        
+        数据实际存放在stat_*属性中，写入视图会直接抛出TypeError，而不是悄悄丢失
+        """
+        return MappingProxyType({
+            'buildings_owned': self.stat_buildings_owned,
+            'upgrades_owned': self.stat_upgrades_owned,
+            'resets': self.stat_resets,
+            'playtime': self.stat_playtime
+        })
+    
+    @property
+    def uid(self) -> int:
+        """实例编号：每个实例(包括拷贝)唯一，外部按状态缓存时用作键"""
+        return self._uid
+    
+    @property
+    def state_version(self):
+        """
+        游戏状态版本号：任何影响建筑物倍数的变化(升级、建筑物数量/等级、牛奶、声望)都会使其增大
+        """
+        return (self._state_version + self.buildings.version + self.building_levels.version
+                + self.upgrades_owned.version)
+    
+    @property
+    def upgrades_owned_mask(self):
+        """已购升级的位掩码 (第UPGRADE_ID[name]位)"""
+        return self.upgrades_owned.mask
     
     def copy(self):
-        """创建游戏状态的深拷贝"""
-        return copy.deepcopy(self)
+        """
+        创建游戏状态的独立副本
+        
+        按槽位直接赋值、逐个复制可变容器，不走copy.deepcopy的通用遍历 (Buff不可变，直接共享)
+        """
+        new = _copy_slots(self)
+        new._uid = next(_INSTANCE_UIDS)
+        for attr in self._CONTAINER_ATTRS:
+            setattr(new, attr, getattr(self, attr).copy())
+        for attr in self._SET_ATTRS:
+            setattr(new, attr, getattr(self, attr).copy())
+        new.pantheon_slots = self.pantheon_slots[:]
+        new._building_manager = None
+        new._upgrade_manager = None
+        new._amounts = new.buildings.array
+        new._levels = new.building_levels.array
+        return new
+    
+    @classmethod
+    def acquire(cls, src):
+        """
+        取得src的独立副本，优先复用release()归还的实例
+        
+        复用时原地覆盖目标实例已有的字典、集合和数组，不重新分配容器。
+        版本号取两者较大值再加一，绑定在该实例上的缓存不会误判为命中
+        """
+        if not cls._pool:
+            return src.copy()
+        dst = cls._pool.pop()
+        _assign_slots(dst, src)
+        upgrade_version = max(dst.upgrades_owned.version, src.upgrades_owned.version) + 1
+        dst._state_version = max(dst._state_version, src._state_version) + 1
+        dst.buildings.assign(src.buildings)
+        dst.building_levels.assign(src.building_levels)
+        for attr in ('garden_plants', 'buffs', *cls._SET_ATTRS):
+            container = getattr(dst, attr)
+            container.clear()
+            container.update(getattr(src, attr))
+        dst.upgrades_owned.version = upgrade_version
+        dst._buff_heap[:] = src._buff_heap
+        dst.pantheon_slots[:] = src.pantheon_slots
+        dst._upgrade_manager = None  # 解锁进度属于上一次的内容；建筑物管理器的缓存按版本号失效，保留
+        return dst
+    
+    @classmethod
+    def release(cls, state):
+        """归还acquire()得到的实例，调用方之后不得再使用它"""
+        if len(cls._pool) < cls._pool_cap:
+            cls._pool.append(state)
+    
+    def touch_last_update(self):
+        """
+        把last_update设为当前时间 (与session_start使用同一个时钟)
+        
+        模拟步进时不逐步更新该字段，读取前调用
+        """
+        self.last_update = self._clock()
+    
+    def get_building_manager(self):
+        """
+        获取绑定到本状态的建筑物管理器 (同一状态只创建一次)
+        
+        管理器内部的缓存都以版本号为键，状态变化后自行失效，因此不随版本号重建
+        """
+        manager = self._building_manager
+        if manager is None:
+            from .buildings import BuildingManager  # buildings模块依赖本模块，只能延迟导入
+            manager = self._building_manager = BuildingManager(self)
+        return manager
+    
+    def get_upgrade_manager(self):
+        """
+        获取绑定到本状态的升级管理器 (同一状态只创建一次；重生或读档后重新创建)
+        """
+        manager = self._upgrade_manager
+        if manager is None:
+            from .upgrades import UpgradeManager
+            manager = self._upgrade_manager = UpgradeManager(self)
+        return manager
     
     def get_total_buildings(self):
         """获取建筑物总数"""
-        return sum(self.buildings.values())
+        return sum(self._amounts)
     
     def get_building_count(self, building_name):
         """获取指定建筑物数量"""
@@ -113,7 +547,14 @@ class GameState:
         """增加建筑物数量"""
         if building_name in self.buildings:
             self.buildings[building_name] += amount
-            self.stats['buildings_owned'] = self.get_total_buildings()
+            self.stat_buildings_owned += amount
+            return True
+        return False
+    
+    def set_building_level(self, building_name, level):
+        """设置建筑物等级"""
+        if building_name in self.building_levels:
+            self.building_levels[building_name] = level
             return True
         return False
     
@@ -124,7 +565,7 @@ class GameState:
     def add_upgrade(self, upgrade_name):
         """添加升级"""
         self.upgrades_owned.add(upgrade_name)
-        self.stats['upgrades_owned'] = len(self.upgrades_owned)
+        self.stat_upgrades_owned = len(self.upgrades_owned)
     
     def has_achievement(self, achievement_name):
         """检查是否拥有指定成就"""
@@ -134,16 +575,39 @@ class GameState:
         """添加成就"""
         if achievement_name not in self.achievements:
             self.achievements.add(achievement_name)
-            self.achievements_owned = len(self.achievements)
-            self.update_milk_progress()
+            self.achievements_owned = owned = len(self.achievements)
+            if owned < self._next_milk_threshold:
+                # 未达到下一种牛奶的门槛，牛奶类型不变，只更新进度
+                self.milk_progress = owned / ACHIEVEMENTS_PER_MILK
+                self._milk_mult_dirty = True
+                self._state_version += 1
+            else:
+                self.update_milk_progress()
+            if self._upgrade_manager is not None:
+                self._upgrade_manager.on_achievement()
     
     def update_milk_progress(self):
         """更新牛奶进度"""
         self.milk_progress = self.achievements_owned / ACHIEVEMENTS_PER_MILK
-        self.milk_type = min(int(self.milk_progress), 12)  # 最多12种牛奶
+        self.milk_type = min(int(self.milk_progress), _MAX_MILK_TYPE)  # 最多12种牛奶
+        self._next_milk_threshold = (_MILK_THRESHOLDS[self.milk_type]
+                                     if self.milk_type < _MAX_MILK_TYPE else float('inf'))
+        self._milk_mult_dirty = True
+        self._state_version += 1
     
     def get_milk_multiplier(self):
-        """获取牛奶CPS倍数"""
+        """获取牛奶CPS倍数 (只在成就或小猫升级变化后重新计算)"""
+        kittens = self.upgrades_owned.mask & _KITTEN_MASK
+        if not self._milk_mult_dirty and self._milk_mult_kittens == kittens:
+            return self._milk_mult
+        
+        self._milk_mult = self._calculate_milk_multiplier()
+        self._milk_mult_dirty = False
+        self._milk_mult_kittens = kittens
+        return self._milk_mult
+    
+    def _calculate_milk_multiplier(self):
+        """计算牛奶CPS倍数"""
         if self.milk_progress <= 0:
             return 1.0
         
@@ -176,7 +640,10 @@ class GameState:
     def update_prestige(self):
         """更新声望等级"""
         total_cookies = self.cookies_reset + self.cookies_earned
-        self.prestige = int(calculate_prestige(total_cookies))
+        prestige = int(calculate_prestige(total_cookies))
+        if prestige != self.prestige:
+            self.prestige = prestige
+            self._state_version += 1
     
     def get_prestige_multiplier(self):
         """获取声望CPS倍数"""
@@ -186,11 +653,9 @@ class GameState:
     
     def add_buff(self, buff_name, duration, effect):
         """添加buff效果"""
-        self.buffs[buff_name] = {
-            'duration': duration,
-            'effect': effect,
-            'start_time': self.game_time
-        }
+        expire_at = self._buff_clock + duration
+        self.buffs[buff_name] = Buff(expire_at, effect)
+        heapq.heappush(self._buff_heap, (expire_at, buff_name))
     
     def remove_buff(self, buff_name):
         """移除buff效果"""
@@ -198,15 +663,18 @@ class GameState:
             del self.buffs[buff_name]
     
     def update_buffs(self, dt):
-        """更新buff状态"""
-        expired_buffs = []
-        for buff_name, buff_data in self.buffs.items():
-            buff_data['duration'] -= dt
-            if buff_data['duration'] <= 0:
-                expired_buffs.append(buff_name)
+        """
+        更新buff状态
         
-        for buff_name in expired_buffs:
-            self.remove_buff(buff_name)
+        只弹出堆顶已到期的条目；已被移除或重新添加的buff留下的旧条目在弹出时跳过
+        """
+        self._buff_clock += dt
+        heap = self._buff_heap
+        while heap and heap[0][0] <= self._buff_clock:
+            expire_at, buff_name = heapq.heappop(heap)
+            buff = self.buffs.get(buff_name)
+            if buff is not None and buff.expire_at == expire_at:
+                del self.buffs[buff_name]
     
     def get_active_buffs(self):
         """获取当前生效的buff列表"""
@@ -225,42 +693,58 @@ class GameState:
         self.handmade_cookies = 0.0
         
         # 重置建筑物
-        for name in self.buildings:
-            self.buildings[name] = 0
-            self.building_levels[name] = 0
+        self.buildings.fill(0)
+        self.building_levels.fill(0)
         
-        # 重置升级(保留天堂升级)
-        heavenly_upgrades = {u for u in self.upgrades_owned if 'heavenly' in u.lower()}
-        self.upgrades_owned = heavenly_upgrades
+        # 重置升级(保留天堂升级)；upgrades模块依赖本模块，只能在这里延迟导入
+        from .upgrades import HEAVENLY_UPGRADES
+        self.upgrades_owned &= HEAVENLY_UPGRADES
         self.upgrades_unlocked.clear()
+        self._upgrade_manager = None  # 解锁进度从头开始
+        self._state_version += 1
+        self._milk_mult_dirty = True
         
         # 重置buff
         self.buffs.clear()
+        self._buff_heap.clear()
         
         # 重置时间
         self.game_time = 0.0
-        self.session_start = time.time()
+        self.session_start = self._clock()
         
         # 更新统计
-        self.stats['resets'] += 1
-        self.stats['buildings_owned'] = 0
-        self.stats['upgrades_owned'] = len(self.upgrades_owned)
+        self.stat_resets += 1
+        self.stat_buildings_owned = 0
+        self.stat_upgrades_owned = len(self.upgrades_owned)
     
-    def to_dict(self):
-        """转换为字典格式(用于保存)"""
+    def to_dict(self, *, snapshot=True):
+        """
+        转换为字典格式(用于保存)
+        
+        snapshot=False时直接返回buildings/building_levels的内部字典而不复制，
+        适用于立即序列化写盘的场景；调用方不得修改返回的字典
+        """
+        if snapshot:
+            buildings = dict(self.buildings)
+            building_levels = dict(self.building_levels)
+        else:
+            buildings = self.buildings
+            building_levels = self.building_levels
+        
         return {
             'cookies': self.cookies,
             'cookies_earned': self.cookies_earned,
             'cookies_reset': self.cookies_reset,
-            'buildings': self.buildings.copy(),
-            'building_levels': self.building_levels.copy(),
+            'buildings': buildings,
+            'building_levels': building_levels,
             'upgrades_owned': list(self.upgrades_owned),
             'achievements': list(self.achievements),
             'prestige': self.prestige,
             'heavenly_chips': self.heavenly_chips,
             'heavenly_chips_spent': self.heavenly_chips_spent,
+            'santa_level': self.santa_level,
             'game_time': self.game_time,
-            'stats': self.stats.copy()
+            'stats': dict(self.stats)
         }
     
     def from_dict(self, data):
@@ -270,13 +754,21 @@ class GameState:
         self.cookies_reset = data.get('cookies_reset', 0.0)
         self.buildings.update(data.get('buildings', {}))
         self.building_levels.update(data.get('building_levels', {}))
-        self.upgrades_owned = set(data.get('upgrades_owned', []))
+        self.upgrades_owned.clear()
+        self.upgrades_owned.update(data.get('upgrades_owned', []))
+        self._state_version += 1
         self.achievements = set(data.get('achievements', []))
+        self._upgrade_manager = None
         self.prestige = data.get('prestige', 0)
         self.heavenly_chips = data.get('heavenly_chips', 0)
         self.heavenly_chips_spent = data.get('heavenly_chips_spent', 0)
+        self.santa_level = data.get('santa_level', 0)
         self.game_time = data.get('game_time', 0.0)
-        self.stats.update(data.get('stats', {}))
+        stats = data.get('stats', {})
+        self.stat_buildings_owned = stats.get('buildings_owned', self.stat_buildings_owned)
+        self.stat_upgrades_owned = stats.get('upgrades_owned', self.stat_upgrades_owned)
+        self.stat_resets = stats.get('resets', self.stat_resets)
+        self.stat_playtime = stats.get('playtime', self.stat_playtime)
         
         # 更新派生数据
         self.achievements_owned = len(self.achievements)
@@ -292,3 +784,64 @@ class GameState:
     
     def __repr__(self):
         return self.__str__()
+
+
+def _make_slot_copier(cls):
+    """
+    生成把所有槽位逐一赋给新实例的函数 (直线赋值，比getattr/setattr循环快得多)
+    """
+    lines = ["def _copy_slots(self):",
+             "    new = cls.__new__(cls)"]
+    lines += [f"    new.{attr} = self.{attr}" for attr in cls.__slots__]
+    lines.append("    return new")
+    namespace = {'cls': cls}
+    exec(compile("\n".join(lines), f"<{cls.__name__}.copy>", "exec"), namespace)
+    return namespace['_copy_slots']
+
+
+def _make_state_methods(cls, fields):
+    """
+    生成按固定字段顺序打包/解包状态元组的__getstate__/__setstate__
+    
+    pickle和copy.deepcopy只需处理一个元组，不必逐个槽位查找属性名
+    """
+    lines = ["def __getstate__(self):",
+             "    return (" + "".join(f"self.{attr}, " for attr in fields) + ")",
+             "def __setstate__(self, state):",
+             "    (" + "".join(f"self.{attr}, " for attr in fields) + ") = state",
+             "    self._uid = next(_INSTANCE_UIDS)",
+             "    self._building_manager = self._upgrade_manager = None",
+             "    self._amounts = self.buildings.array",
+             "    self._levels = self.building_levels.array"]
+    namespace = {'_INSTANCE_UIDS': _INSTANCE_UIDS}
+    exec(compile("\n".join(lines), f"<{cls.__name__}.__getstate__>", "exec"), namespace)
+    return namespace['__getstate__'], namespace['__setstate__']
+
+
+def _make_slot_assigner(cls, attrs):
+    """
+    生成把指定槽位从src赋给已有实例的函数 (acquire复用实例时使用)
+    """
+    lines = ["def _assign_slots(dst, src):"]
+    lines += [f"    dst.{attr} = src.{attr}" for attr in attrs]
+    namespace = {}
+    exec(compile("\n".join(lines), f"<{cls.__name__}.acquire>", "exec"), namespace)
+    return namespace['_assign_slots']
+
+
+_copy_slots = _make_slot_copier(GameState)
+
+# acquire按值赋的槽位: 可变容器、数组别名与版本号另行处理
+_assign_slots = _make_slot_assigner(GameState, tuple(
+    attr for attr in GameState.__slots__
+    if attr not in GameState._CONTAINER_ATTRS + GameState._SET_ATTRS + (
+        '_uid', '_amounts', '_levels', 'pantheon_slots', '_state_version',
+        '_building_manager', '_upgrade_manager')))
+
+# 序列化字段: _amounts/_levels是建筑物表数组的别名，恢复时重新指向；实例编号恢复时重新分配；
+# 管理器不序列化，恢复后按需重新创建
+GameState._STATE_FIELDS = tuple(attr for attr in GameState.__slots__
+                                if attr not in ('_uid', '_amounts', '_levels',
+                                                '_building_manager', '_upgrade_manager'))
+GameState.__getstate__, GameState.__setstate__ = _make_state_methods(
+    GameState, GameState._STATE_FIELDS)
@@ -4,8 +4,10 @@
 定义Cookie Clicker中的所有升级类型和效果计算
 """
 
-from typing import Dict, List, Optional, Callable, Any
+from typing import Dict, List, Optional, Callable, Any, Tuple
 from .constants import *
+from .game_state import _BUILDING_INDEX, get_upgrade_id, _VersionedDict
+from .buildings import BUILDINGS
 
 
 class Upgrade:
@@ -13,29 +15,38 @@ class Upgrade:
     
     def __init__(self, name: str, price: float, effect_type: str, 
                  effect_value: float, unlock_condition: Optional[Callable] = None,
-                 description: str = "", icon_id: int = 0):
+                 description: str = "", icon_id: int = 0,
+                 building_target: Optional[str] = None, is_heavenly: bool = False):
         self.name = name
         self.price = price
         self.effect_type = effect_type
         self.effect_value = effect_value
         self.unlock_condition = unlock_condition
+        self.predicate = None  # 编译后的解锁条件 (操作码, 操作数, 阈值)，优先于unlock_condition
         self.description = description
         self.icon_id = icon_id
+        self.id = get_upgrade_id(name)  # 在已购升级位掩码中的位下标
         
         # 状态
         self.unlocked = False
         self.bought = False
         
         # 特殊属性
-        self.is_heavenly = False      # 是否为天堂升级
-        self.is_debug = False         # 是否为调试升级
-        self.is_seasonal = False      # 是否为季节升级
-        self.building_target = None   # 目标建筑物(如果是建筑物专属升级)
+        self.is_heavenly = is_heavenly          # 是否为天堂升级
+        self.is_debug = False                   # 是否为调试升级
+        self.is_seasonal = False                # 是否为季节升级
+        self.building_target = building_target  # 目标建筑物(如果是建筑物专属升级)
+        
+        # 效果描述只依赖上面这些构造后不变的属性，生成一次后直接复用
+        self._effect_desc = self._build_effect_description()
     
     def check_unlock_condition(self, game_state) -> bool:
         """
         检查解锁条件
         """
+        if self.predicate is not None:
+            op, arg, threshold = self.predicate
+            return _read_operand(op, arg, game_state) >= threshold
         if self.unlock_condition is None:
             return True
         return self.unlock_condition(game_state)
@@ -66,12 +77,19 @@ class Upgrade:
             game_state.spend_cookies(self.price)
         
         self.bought = True
+        _AVAILABLE_UPGRADES.pop(self.name, None)
         game_state.add_upgrade(self.name)
         return True
     
     def get_effect_description(self) -> str:
         """
-        获取效果描述
+        获取效果描述 (初始化时生成一次)
+        """
+        return self._effect_desc
+    
+    def _build_effect_description(self) -> str:
+        """
+        按效果类型格式化效果描述
         """
         if self.effect_type == UPGRADE_TYPES['CPS_MULT']:
             return f"+{self.effect_value*100:.0f}% CpS"
@@ -100,7 +118,7 @@ UPGRADES_DATA = [
         'price': 100,
         'effect_type': UPGRADE_TYPES['CLICK_MULT'],
         'effect_value': 1.0,  # +100% = 2倍
-        'unlock_condition': lambda gs: gs.cookie_clicks >= 15,
+        'trigger': ('clicks', 15),
         'description': 'The mouse and cursors are twice as efficient.'
     },
     {
@@ -108,7 +126,7 @@ UPGRADES_DATA = [
         'price': 500,
         'effect_type': UPGRADE_TYPES['CLICK_MULT'], 
         'effect_value': 1.0,
-        'unlock_condition': lambda gs: gs.cookie_clicks >= 100,
+        'trigger': ('clicks', 100),
         'description': 'The mouse and cursors are twice as efficient.'
     },
     {
@@ -116,7 +134,7 @@ UPGRADES_DATA = [
         'price': 10000,
         'effect_type': UPGRADE_TYPES['CLICK_MULT'],
         'effect_value': 1.0,
-        'unlock_condition': lambda gs: gs.cookie_clicks >= 1000,
+        'trigger': ('clicks', 1000),
         'description': 'The mouse and cursors are twice as efficient.'
     },
     
@@ -127,7 +145,7 @@ UPGRADES_DATA = [
         'effect_type': UPGRADE_TYPES['BUILDING_MULT'],
         'effect_value': 1.0,
         'building_target': 'Grandma',
-        'unlock_condition': lambda gs: gs.get_building_count('Grandma') >= 1,
+        'trigger': ('building', 'Grandma', 1),
         'description': 'Grandmas are twice as efficient.'
     },
     {
@@ -136,7 +154,7 @@ UPGRADES_DATA = [
         'effect_type': UPGRADE_TYPES['BUILDING_MULT'],
         'effect_value': 1.0,
         'building_target': 'Grandma',
-        'unlock_condition': lambda gs: gs.get_building_count('Grandma') >= 5,
+        'trigger': ('building', 'Grandma', 5),
         'description': 'Grandmas are twice as efficient.'
     },
     {
@@ -145,7 +163,7 @@ UPGRADES_DATA = [
         'effect_type': UPGRADE_TYPES['BUILDING_MULT'],
         'effect_value': 1.0,
         'building_target': 'Grandma',
-        'unlock_condition': lambda gs: gs.get_building_count('Grandma') >= 25,
+        'trigger': ('building', 'Grandma', 25),
         'description': 'Grandmas are twice as efficient.'
     },
     
@@ -156,7 +174,7 @@ UPGRADES_DATA = [
         'effect_type': UPGRADE_TYPES['BUILDING_MULT'],
         'effect_value': 1.0,
         'building_target': 'Farm',
-        'unlock_condition': lambda gs: gs.get_building_count('Farm') >= 1,
+        'trigger': ('building', 'Farm', 1),
         'description': 'Farms are twice as efficient.'
     },
     {
@@ -165,7 +183,7 @@ UPGRADES_DATA = [
         'effect_type': UPGRADE_TYPES['BUILDING_MULT'],
         'effect_value': 1.0,
         'building_target': 'Farm',
-        'unlock_condition': lambda gs: gs.get_building_count('Farm') >= 5,
+        'trigger': ('building', 'Farm', 5),
         'description': 'Farms are twice as efficient.'
     },
     {
@@ -174,7 +192,7 @@ UPGRADES_DATA = [
         'effect_type': UPGRADE_TYPES['BUILDING_MULT'],
         'effect_value': 1.0,
         'building_target': 'Farm',
-        'unlock_condition': lambda gs: gs.get_building_count('Farm') >= 25,
+        'trigger': ('building', 'Farm', 25),
         'description': 'Farms are twice as efficient.'
     },
     
@@ -184,7 +202,7 @@ UPGRADES_DATA = [
         'price': 9000000,
         'effect_type': UPGRADE_TYPES['SPECIAL'],
         'effect_value': 0.05,
-        'unlock_condition': lambda gs: gs.milk_progress >= 0.5,
+        'trigger': ('milk', 0.5),
         'description': 'You gain more CpS the more milk you have.'
     },
     {
@@ -192,7 +210,7 @@ UPGRADES_DATA = [
         'price': 9000000000,
         'effect_type': UPGRADE_TYPES['SPECIAL'],
         'effect_value': 0.1,
-        'unlock_condition': lambda gs: gs.milk_progress >= 1.0,
+        'trigger': ('milk', 1.0),
         'description': 'You gain more CpS the more milk you have.'
     },
     {
@@ -200,7 +218,7 @@ UPGRADES_DATA = [
         'price': 9000000000000,
         'effect_type': UPGRADE_TYPES['SPECIAL'],
         'effect_value': 0.2,
-        'unlock_condition': lambda gs: gs.milk_progress >= 2.0,
+        'trigger': ('milk', 2.0),
         'description': 'You gain more CpS the more milk you have.'
     },
     
@@ -219,7 +237,7 @@ UPGRADES_DATA = [
         'effect_type': UPGRADE_TYPES['SPECIAL'],
         'effect_value': 0.20,
         'is_heavenly': True,
-        'unlock_condition': lambda gs: gs.has_upgrade('Heavenly chip secret'),
+        'trigger': ('upgrade', 'Heavenly chip secret'),
         'description': 'Heavenly chips are 20% more powerful.'
     },
     {
@@ -228,7 +246,7 @@ UPGRADES_DATA = [
         'effect_type': UPGRADE_TYPES['SPECIAL'],
         'effect_value': 0.25,
         'is_heavenly': True,
-        'unlock_condition': lambda gs: gs.has_upgrade('Heavenly cookie stand'),
+        'trigger': ('upgrade', 'Heavenly cookie stand'),
         'description': 'Heavenly chips are 25% more powerful.'
     },
     
@@ -238,7 +256,7 @@ UPGRADES_DATA = [
         'price': 777777777,
         'effect_type': UPGRADE_TYPES['SPECIAL'],
         'effect_value': 1.0,
-        'unlock_condition': lambda gs: gs.golden_cookies_clicked >= 7,
+        'trigger': ('golden_clicks', 7),
         'description': 'Golden cookies appear twice as often and last twice as long.'
     },
     {
@@ -246,15 +264,85 @@ UPGRADES_DATA = [
         'price': 77777777777,
         'effect_type': UPGRADE_TYPES['SPECIAL'],
         'effect_value': 1.0,
-        'unlock_condition': lambda gs: gs.golden_cookies_clicked >= 27,
+        'trigger': ('golden_clicks', 27),
         'description': 'Golden cookies appear twice as often and last twice as long.'
     }
 ]
 
 
+# 解锁触发条件: ('clicks', n) / ('building', 建筑物, n) / ('milk', x) / ('golden_clicks', n) / ('upgrade', 升级)
+# 都是"某个单调增长的值达到阈值"，按触发键分桶后每次只需把当前值与桶内最小阈值比较
+
+def _split_trigger(trigger: Optional[tuple]) -> Tuple[tuple, Any]:
+    """
+    把触发条件拆成 (触发键, 阈值)；没有条件的升级归入 ('always',)
+    """
+    if trigger is None:
+        return ('always',), True
+    if trigger[0] == 'upgrade':
+        return trigger, True
+    return trigger[:-1], trigger[-1]
+
+
+# 触发键编译后的操作码: 建筑物名称换成数组下标，升级名称换成位下标
+_OP_ALWAYS = 0
+_OP_CLICKS = 1
+_OP_BUILDING = 2
+_OP_MILK = 3
+_OP_GOLDEN_CLICKS = 4
+_OP_UPGRADE = 5
+
+
+def _compile_trigger(key: tuple) -> Tuple[int, int]:
+    """
+    把触发键编译为 (操作码, 操作数)
+    """
+    kind = key[0]
+    if kind == 'clicks':
+        return _OP_CLICKS, 0
+    if kind == 'building':
+        return _OP_BUILDING, _BUILDING_INDEX[key[1]]
+    if kind == 'milk':
+        return _OP_MILK, 0
+    if kind == 'golden_clicks':
+        return _OP_GOLDEN_CLICKS, 0
+    if kind == 'upgrade':
+        return _OP_UPGRADE, get_upgrade_id(key[1])
+    if kind == 'always':
+        return _OP_ALWAYS, 0
+    raise ValueError(f"未知的解锁触发条件: {key}")
+
+
+def _read_operand(op: int, arg: int, game_state) -> Any:
+    """
+    读取操作码对应的当前值 (建筑物读数组、升级读位掩码，不做字符串查找)
+    """
+    if op == _OP_BUILDING:
+        return game_state._amounts[arg]
+    if op == _OP_CLICKS:
+        return game_state.cookie_clicks
+    if op == _OP_MILK:
+        return game_state.milk_progress
+    if op == _OP_GOLDEN_CLICKS:
+        return game_state.golden_cookies_clicked
+    if op == _OP_UPGRADE:
+        return game_state.upgrades_owned_mask >> arg & 1
+    return True
+
+
 # 创建升级实例
 UPGRADES: Dict[str, Upgrade] = {}
 
+# 已解锁且未购买的升级 (按解锁顺序的有序集合)；解锁/购买状态存放在共享的Upgrade实例上，
+# 因此该集合同样是全局的，只在状态变化的两处(解锁、Upgrade.buy)增删；版本号供UpgradeManager缓存列表
+_AVAILABLE_UPGRADES: Dict[str, None] = _VersionedDict()
+
+# 触发键 -> [(阈值, 升级名称)]，按阈值从大到小排列 (末尾是最先满足的)
+_TRIGGER_BUCKETS: Dict[tuple, List[Tuple[Any, str]]] = {}
+
+# 触发键 -> (操作码, 操作数)
+_TRIGGER_OPS: Dict[tuple, Tuple[int, int]] = {}
+
 def initialize_upgrades():
     """初始化所有升级"""
     global UPGRADES
@@ -265,35 +353,150 @@ def initialize_upgrades():
             price=upgrade_data['price'],
             effect_type=upgrade_data['effect_type'],
             effect_value=upgrade_data['effect_value'],
-            unlock_condition=upgrade_data.get('unlock_condition'),
-            description=upgrade_data['description']
+            description=upgrade_data['description'],
+            building_target=upgrade_data.get('building_target'),
+            is_heavenly=upgrade_data.get('is_heavenly', False)
         )
         
-        # 设置特殊属性
-        upgrade.is_heavenly = upgrade_data.get('is_heavenly', False)
-        upgrade.building_target = upgrade_data.get('building_target')
-        
         UPGRADES[upgrade.name] = upgrade
+        
+        trigger = upgrade_data.get('trigger')
+        key, threshold = _split_trigger(trigger)
+        if key not in _TRIGGER_OPS:
+            _TRIGGER_OPS[key] = _compile_trigger(key)
+        if trigger is not None:
+            upgrade.predicate = (*_TRIGGER_OPS[key], threshold)
+        _TRIGGER_BUCKETS.setdefault(key, []).append((threshold, upgrade.name))
+    
+    for bucket in _TRIGGER_BUCKETS.values():
+        bucket.sort(key=lambda entry: entry[0], reverse=True)
 
 # 初始化升级
 initialize_upgrades()
 
+# 重生时保留的天堂升级
+HEAVENLY_UPGRADES = frozenset(name for name, upgrade in UPGRADES.items() if upgrade.is_heavenly)
+
+
+# 升级价值估算 (CPS提升/价格)，按效果类型分派
+
+def _value_cps_mult(upgrade: Upgrade, game_state) -> float:
+    """
+    全局CPS倍数升级: 按当前CPS估算提升
+    """
+    cps_increase = game_state.cookies_per_second * upgrade.effect_value
+    return cps_increase / upgrade.price
+
+
+def _value_building_mult(upgrade: Upgrade, game_state) -> float:
+    """
+    建筑物倍数升级: 按目标建筑物当前的CPS估算提升
+    """
+    building = BUILDINGS.get(upgrade.building_target) if upgrade.building_target else None
+    if building is None:
+        return _value_default(upgrade, game_state)
+    amount = game_state.get_building_count(upgrade.building_target)
+    cps_increase = building.get_cps_contribution(amount, game_state) * upgrade.effect_value
+    return cps_increase / upgrade.price
+
+
+def _value_default(upgrade: Upgrade, game_state) -> float:
+    """
+    其他类型升级的价值较难量化，返回固定值
+    """
+    return 1.0 / upgrade.price
+
+
+_VALUE_FNS: Dict[str, Callable[[Upgrade, Any], float]] = {
+    UPGRADE_TYPES['CPS_MULT']: _value_cps_mult,
+    UPGRADE_TYPES['BUILDING_MULT']: _value_building_mult,
+}
+
 
 class UpgradeManager:
     """升级管理器"""
     
     def __init__(self, game_state):
         self.game_state = game_state
+        
+        # 尚待检查的升级 (按触发键分桶，满足后从桶中弹出)
+        self._pending = {key: bucket[:] for key, bucket in _TRIGGER_BUCKETS.items()}
+        
+        # 列表缓存: (键, 结果)。可购买列表按_AVAILABLE_UPGRADES的版本号失效，
+        # 买得起列表还取决于饼干/天堂芯片数量
+        self._available_cache = (None, ())
+        self._affordable_cache = (None, ())
+        
+        # 上次全量检查时各触发值的快照，没有变化时update_unlocks直接返回
+        self._unlock_key = None
     
     def update_unlocks(self):
         """
-        更新升级解锁状态
+        全量更新升级解锁状态 (每个触发键只读一次当前值)
+        
+        模拟过程中的点击、购买和成就经由on_*钩子只检查受影响的触发键；
+        全量检查只在状态可能被外部直接修改之后(开始模拟、重生)进行
+        """
+        game_state = self.game_state
+        unlock_key = (game_state.buildings.version, game_state.upgrades_owned_mask,
+                      game_state.milk_progress, game_state.cookie_clicks,
+                      game_state.golden_cookies_clicked)
+        if unlock_key == self._unlock_key:
+            return
+        self._unlock_key = unlock_key
+        
+        for key in list(self._pending):
+            self._check_trigger(key)
+    
+    def on_click(self):
+        """
+        点击后只检查点击次数相关的升级
+        """
+        self._check_trigger(('clicks',))
+    
+    def on_building_bought(self, building_name: str):
+        """
+        购买建筑物后只检查该建筑物数量相关的升级
+        """
+        self._check_trigger(('building', building_name))
+    
+    def on_upgrade_bought(self, upgrade_name: str):
+        """
+        购买升级后只检查以该升级为前置条件的升级
+        """
+        self._check_trigger(('upgrade', upgrade_name))
+    
+    def on_achievement(self):
+        """
+        获得成就(牛奶增加)后只检查牛奶相关的升级
+        """
+        self._check_trigger(('milk',))
+    
+    def get_next_threshold(self, key: tuple):
         """
-        for upgrade in UPGRADES.values():
+        该触发键下一个待检查升级的阈值 (当前值达到它之前不会解锁任何升级)，没有时返回None
+        """
+        bucket = self._pending.get(key)
+        return bucket[-1][0] if bucket else None
+    
+    def _check_trigger(self, key: tuple):
+        """
+        解锁该触发键下所有阈值已满足的升级
+        """
+        bucket = self._pending.get(key)
+        if bucket is None:
+            return
+        
+        value = _read_operand(*_TRIGGER_OPS[key], self.game_state)
+        while bucket and value >= bucket[-1][0]:
+            upgrade = UPGRADES[bucket.pop()[1]]
             if not upgrade.unlocked and not upgrade.bought:
-                if upgrade.check_unlock_condition(self.game_state):
-                    upgrade.unlocked = True
-                    self.game_state.upgrades_unlocked.add(upgrade.name)
+                upgrade.unlocked = True
+                _AVAILABLE_UPGRADES[upgrade.name] = None
+                self.game_state.upgrades_unlocked.add(upgrade.name)
+        
+        if not bucket:
+            del self._pending[key]
     
     def buy_upgrade(self, upgrade_name: str) -> bool:
         """
@@ -305,26 +508,35 @@ class UpgradeManager:
         upgrade = UPGRADES[upgrade_name]
         return upgrade.buy(self.game_state)
     
-    def get_available_upgrades(self) -> List[str]:
+    def get_available_version(self) -> int:
+        """
+        获取可购买升级集合的版本号 (解锁或购买升级时增大，可用作外部缓存的键)
+        """
+        return _AVAILABLE_UPGRADES.version
+    
+    def get_available_upgrades(self) -> Tuple[str, ...]:
         """
-        获取可购买的升级列表
+        获取可购买的升级列表 (版本号不变时返回同一个元组)
         """
-        available = []
-        for upgrade_name, upgrade in UPGRADES.items():
-            if upgrade.unlocked and not upgrade.bought:
-                available.append(upgrade_name)
-        return available
+        version = _AVAILABLE_UPGRADES.version
+        key, upgrades = self._available_cache
+        if key != version:
+            upgrades = tuple(_AVAILABLE_UPGRADES)
+            self._available_cache = (version, upgrades)
+        return upgrades
     
-    def get_affordable_upgrades(self) -> List[str]:
+    def get_affordable_upgrades(self) -> Tuple[str, ...]:
         """
-        获取买得起的升级列表
+        获取买得起的升级列表 (只检查已解锁未购买的升级；同一版本、同一余额下返回缓存的元组)
         """
-        affordable = []
-        for upgrade_name, upgrade in UPGRADES.items():
-            if (upgrade.unlocked and not upgrade.bought and 
-                upgrade.can_afford(self.game_state)):
-                affordable.append(upgrade_name)
-        return affordable
+        game_state = self.game_state
+        cache_key = (_AVAILABLE_UPGRADES.version, game_state.cookies, game_state.heavenly_chips)
+        key, upgrades = self._affordable_cache
+        if key != cache_key:
+            upgrades = tuple([upgrade_name for upgrade_name in _AVAILABLE_UPGRADES
+                              if UPGRADES[upgrade_name].can_afford(game_state)])
+            self._affordable_cache = (cache_key, upgrades)
+        return upgrades
     
     def get_upgrade_info(self, upgrade_name: str) -> Optional[Dict]:
         """
@@ -349,41 +561,19 @@ class UpgradeManager:
         """
         获取效率最高的升级
         """
-        # 简化实现：优先购买便宜的升级
-        affordable = self.get_affordable_upgrades()
-        if not affordable:
-            return None
-        
-        # 按价格排序，优先购买便宜的
-        affordable_upgrades = [(name, UPGRADES[name].price) for name in affordable]
-        affordable_upgrades.sort(key=lambda x: x[1])
-        
-        return affordable_upgrades[0][0]
+        # 简化实现：优先购买便宜的升级 (一次遍历取价格最低者，无需排序)
+        game_state = self.game_state
+        return min((upgrade_name for upgrade_name in _AVAILABLE_UPGRADES
+                    if UPGRADES[upgrade_name].can_afford(game_state)),
+                   key=lambda upgrade_name: UPGRADES[upgrade_name].price, default=None)
     
     def calculate_upgrade_value(self, upgrade_name: str) -> float:
         """
         计算升级的价值 (CPS提升/价格)
         """
-        if upgrade_name not in UPGRADES:
+        upgrade = UPGRADES.get(upgrade_name)
+        if upgrade is None:
             return 0.0
         
-        upgrade = UPGRADES[upgrade_name]
-        
         # 简化计算：根据升级类型估算价值
-        if upgrade.effect_type == UPGRADE_TYPES['CPS_MULT']:
-            current_cps = self.game_state.cookies_per_second
-            cps_increase = current_cps * upgrade.effect_value
-            return cps_increase / upgrade.price
-        elif upgrade.effect_type == UPGRADE_TYPES['BUILDING_MULT']:
-            # 计算特定建筑物的CPS提升
-            if upgrade.building_target:
-                from .buildings import BUILDINGS
-                building = BUILDINGS.get(upgrade.building_target)
-                if building:
-                    amount = self.game_state.get_building_count(upgrade.building_target)
-                    current_building_cps = building.get_cps_contribution(amount, self.game_state)
-                    cps_increase = current_building_cps * upgrade.effect_value
-                    return cps_increase / upgrade.price
-        
-        # 其他类型升级的价值较难量化，返回固定值
-        return 1.0 / upgrade.price
+        return _VALUE_FNS.get(upgrade.effect_type, _value_default)(upgrade, self.game_state)
@@ -1,13 +1,35 @@
 """
 游戏引擎模块
+
+引擎类在首次访问时才导入 (PEP 562)，只用到核心模块的代码不必承担引擎的导入开销
 """
 
-from .cps_calculator import CPSCalculator
-from .purchase_optimizer import PurchaseOptimizer
-from .simulator import GameSimulator
+import importlib
+
+# 导出名称 -> 所在子模块
+_LAZY_EXPORTS = {
+    'CPSCalculator': '.cps_calculator',
+    'PurchaseOptimizer': '.purchase_optimizer',
+    'GameSimulator': '.simulator',
+    'SimulationStats': '.simulator',
+}
 
 __all__ = [
     'CPSCalculator',
     'PurchaseOptimizer', 
-    'GameSimulator'
+    'GameSimulator',
+    'SimulationStats'
 ]
+
+
+def __getattr__(name):
+    module_name = _LAZY_EXPORTS.get(name)
+    if module_name is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(module_name, __name__), name)
+    globals()[name] = value  # 之后的访问直接命中模块字典
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
@@ -0,0 +1,30 @@
+"""
+模拟器静止期的逐步累加内核
+
+安装numba时被JIT编译，否则按普通Python函数运行。
+"""
+
+from ..core._jit import njit
+
+
+@njit(cache=True)
+def run_quiescent(totals, targets, increments, steps):
+    """
+    重复steps步: 每一步依次执行 totals[targets[j]] += increments[j] (原地修改totals)
+    
+    同一累计量的多个增量须在targets中相邻，按每步内的加法顺序排列；
+    与逐个调用simulate_step的浮点加法顺序相同，结果逐位一致
+    """
+    n = len(targets)
+    j = 0
+    while j < n:
+        i = targets[j]
+        k = j
+        while k < n and targets[k] == i:
+            k += 1
+        total = totals[i]
+        for _ in range(steps):
+            for m in range(j, k):
+                total += increments[m]
+        totals[i] = total
+        j = k
@@ -4,6 +4,7 @@ CPS计算引擎
 负责计算Cookie Clicker中的每秒饼干产量(CPS)
 """
 
+import math
 from typing import Dict, List
 from ..core.game_state import GameState
 from ..core.buildings import BUILDINGS, BuildingManager
@@ -11,12 +12,75 @@ from ..core.upgrades import UPGRADES
 from ..core.constants import *
 
 
+# 提供全局CPS倍数的升级 -> 倍数 (按原有判断顺序排列，连乘顺序保持不变)
+CPS_MULT_UPGRADES: Dict[str, float] = {
+    # 通用CPS升级
+    'Specialized chocolate chips': 1.01,
+    'Designer cocoa beans': 1.02,
+    'Underworld ovens': 1.03,
+    'Exotic nuts': 1.04,
+    'Arcane sugar': 1.05,
+    # 圣诞节升级
+    'Increased merriness': 1.15,
+    'Improved jolliness': 1.15,
+    'A lump of coal': 1.01,
+    'An itchy sweater': 1.01,
+    "Santa's dominion": 1.2,
+    # 幸运饼干升级
+    'Fortune #100': 1.01,
+    'Fortune #101': 1.07,
+}
+_CPS_MULT_NAMES = frozenset(CPS_MULT_UPGRADES)
+
+# 点击升级 (大多数点击升级都是2倍)
+_CLICK_UPGRADES = frozenset([
+    'Reinforced index finger',
+    'Carpal tunnel prevention cream', 
+    'Ambidextrous',
+    'Thousand fingers',
+    'Million fingers',
+    'Billion fingers',
+    'Trillion fingers'
+])
+
+# 万神殿CPS倍数表: PANTHEON_CPS_MULT[神灵ID][槽位]，神灵ID为PANTHEON_GODS中的顺序 (Holobore为0)
+PANTHEON_CPS_MULT = tuple(
+    tuple(god[f'slot{slot + 1}'].get('cps_mult', 1.0) for slot in range(3))
+    for god in PANTHEON_GODS.values()
+)
+_PANTHEON_SLOTS = 3
+
+# 季节 -> CPS倍数 (没有CPS效果的季节不在表中)
+_SEASON_CPS_MULT: Dict[str, float] = {
+    season: data['effects']['cps_mult']
+    for season, data in SEASONS.items() if 'cps_mult' in data['effects']
+}
+
+# 按名称生效的buff -> CPS倍数
+_BUFF_MULTS: Dict[str, float] = {
+    'frenzy': 7.0,
+    'elder_frenzy': 666.0,
+    'clot': 0.5,  # 负面buff
+}
+
+# 提供固定CPS加成的升级 -> 每秒饼干数 (在全局倍数之前累加)
+SPECIAL_CPS_UPGRADES: Dict[str, float] = {
+    '"egg"': 9,  # 隐藏升级
+}
+
+
+# CPS缓存最多保留的状态数
+_CPS_CACHE_SIZE = 64
+
+
 class CPSCalculator:
     """CPS计算器"""
     
     def __init__(self):
-        self.cache = {}  # 缓存计算结果
-        self.cache_valid = False
+        self.cache = {}  # 实例编号 -> (缓存键, 总CPS)，每个状态只保留最新结果，最多_CPS_CACHE_SIZE个状态
+        self._scale_cache = (None, 1.0)  # (缓存键, 全局倍数×buff倍数)，见_get_cps_scale
+        self._upgrade_mult_cache = (None, 1.0)  # ((实例编号, 升级版本号, 圣诞老人等级), 升级倍数)
+        self._click_cache = (None, 1.0)  # ((实例编号, CPS缓存键), 点击力量)
     
     def calculate_total_cps(self, game_state: GameState) -> float:
         """
@@ -24,8 +88,9 @@ class CPSCalculator:
         """
         # 检查缓存
         cache_key = self._get_cache_key(game_state)
-        if self.cache_valid and cache_key in self.cache:
-            return self.cache[cache_key]
+        hit = self.cache.get(game_state.uid)
+        if hit is not None and hit[0] == cache_key:
+            return hit[1]
         
         total_cps = 0.0
         
@@ -38,25 +103,68 @@ class CPSCalculator:
         total_cps += special_cps
         
         # 3. 应用全局倍数
-        global_multiplier = self._calculate_global_multiplier(game_state)
+        global_multiplier = self.calculate_global_multiplier(game_state)
         total_cps *= global_multiplier
         
         # 4. 应用buff效果
-        buff_multiplier = self._calculate_buff_multiplier(game_state)
+        buff_multiplier = self.calculate_buff_multiplier(game_state)
         total_cps *= buff_multiplier
         
         # 缓存结果
-        self.cache[cache_key] = total_cps
-        self.cache_valid = True
+        self._store_cps(game_state.uid, cache_key, total_cps)
         
         return total_cps
     
+    def _store_cps(self, uid: int, cache_key: tuple, total_cps: float):
+        """
+        写入CPS缓存；超过容量时淘汰最久未写入的状态 (拷贝出的临时状态各有编号，不淘汰会一直累积)
+        """
+        cache = self.cache
+        cache.pop(uid, None)
+        cache[uid] = (cache_key, total_cps)
+        if len(cache) > _CPS_CACHE_SIZE:
+            del cache[next(iter(cache))]
+    
+    def add_building_cps(self, game_state: GameState, building_name: str,
+                         previous_cps: float) -> float:
+        """
+        刚买入一个建筑物后的总CPS: 买入前的总CPS加上该建筑物的边际CPS，结果写入缓存
+        
+        全局倍数和buff倍数不随建筑物数量变化，只有奶奶会改变其他建筑物的协同倍数，仍完整重算
+        """
+        if building_name == 'Grandma':
+            return self.calculate_total_cps(game_state)
+        
+        marginal_cps = BUILDINGS[building_name].marginal_cps(game_state)
+        total_cps = previous_cps + marginal_cps * self._get_cps_scale(game_state)
+        self._store_cps(game_state.uid, self._get_cache_key(game_state), total_cps)
+        return total_cps
+    
+    def _get_cps_scale(self, game_state: GameState) -> float:
+        """
+        全局倍数×buff倍数，以不含建筑物数量的版本号等为键缓存
+        """
+        key = (game_state.uid, game_state.upgrades_owned.version, game_state.milk_progress,
+               game_state.buffs.version, game_state.prestige, game_state.heavenly_power,
+               game_state.ascension_mode, game_state.season)
+        cached_key, scale = self._scale_cache
+        if cached_key != key:
+            scale = (self.calculate_global_multiplier(game_state)
+                     * self.calculate_buff_multiplier(game_state))
+            self._scale_cache = (key, scale)
+        return scale
+    
+    def _get_building_manager(self, game_state: GameState) -> BuildingManager:
+        """
+        获取绑定到该游戏状态的建筑物管理器
+        """
+        return game_state.get_building_manager()
+    
     def _calculate_buildings_cps(self, game_state: GameState) -> float:
         """
         计算所有建筑物的CPS贡献
         """
-        building_manager = BuildingManager(game_state)
-        return building_manager.calculate_total_cps()
+        return self._get_building_manager(game_state).calculate_total_cps()
     
     def _calculate_special_cps(self, game_state: GameState) -> float:
         """
@@ -64,103 +172,63 @@ class CPSCalculator:
         """
         special_cps = 0.0
         
-        # "egg"升级 (隐藏升级)
-        if game_state.has_upgrade('"egg"'):
-            special_cps += 9
+        for upgrade_name, cps in SPECIAL_CPS_UPGRADES.items():
+            if game_state.has_upgrade(upgrade_name):
+                special_cps += cps
         
         # 其他特殊CPS来源可以在这里添加
         
         return special_cps
     
-    def _calculate_global_multiplier(self, game_state: GameState) -> float:
+    def calculate_global_multiplier(self, game_state: GameState) -> float:
         """
         计算全局CPS倍数
         """
-        multiplier = 1.0
-        
-        # 1. 声望倍数
-        multiplier *= game_state.get_prestige_multiplier()
-        
-        # 2. 牛奶倍数
-        multiplier *= game_state.get_milk_multiplier()
-        
-        # 3. 升级倍数
-        multiplier *= self._calculate_upgrade_multiplier(game_state)
-        
-        # 4. 季节倍数
-        multiplier *= self._calculate_season_multiplier(game_state)
-        
-        # 5. 龙系统倍数
-        multiplier *= self._calculate_dragon_multiplier(game_state)
-        
-        # 6. 万神殿倍数
-        multiplier *= self._calculate_pantheon_multiplier(game_state)
-        
-        # 7. 花园倍数
-        multiplier *= self._calculate_garden_multiplier(game_state)
-        
-        return multiplier
+        # 一次math.prod按顺序连乘各项，省去逐项的局部变量读写
+        return math.prod((
+            game_state.get_prestige_multiplier(),            # 1. 声望倍数
+            game_state.get_milk_multiplier(),                # 2. 牛奶倍数
+            self._calculate_upgrade_multiplier(game_state),  # 3. 升级倍数
+            self._calculate_season_multiplier(game_state),   # 4. 季节倍数
+            self._calculate_pantheon_multiplier(game_state), # 5. 万神殿倍数
+            # 龙系统/花园尚未实现 (恒为1.0)，实现后再把
+            # _calculate_dragon_multiplier/_calculate_garden_multiplier加回这里
+        ))
     
     def _calculate_upgrade_multiplier(self, game_state: GameState) -> float:
         """
-        计算升级带来的CPS倍数
+        计算升级带来的CPS倍数 (只取决于已购升级与圣诞老人等级，按升级集合版本号缓存)
         """
-        multiplier = 1.0
+        key = (game_state.uid, game_state.upgrades_owned.version, game_state.santa_level)
+        cached_key, multiplier = self._upgrade_mult_cache
+        if cached_key == key:
+            return multiplier
         
-        # 通用CPS升级
-        cps_upgrades = [
-            ('Specialized chocolate chips', 1.01),
-            ('Designer cocoa beans', 1.02),
-            ('Underworld ovens', 1.03),
-            ('Exotic nuts', 1.04),
-            ('Arcane sugar', 1.05),
-        ]
+        multiplier = 1.0
         
-        for upgrade_name, mult in cps_upgrades:
-            if game_state.has_upgrade(upgrade_name):
-                multiplier *= mult
-        
-        # 圣诞节升级
-        if game_state.has_upgrade('Increased merriness'):
-            multiplier *= 1.15
-        if game_state.has_upgrade('Improved jolliness'):
-            multiplier *= 1.15
-        if game_state.has_upgrade('A lump of coal'):
-            multiplier *= 1.01
-        if game_state.has_upgrade('An itchy sweater'):
-            multiplier *= 1.01
-        if game_state.has_upgrade("Santa's dominion"):
-            multiplier *= 1.2
-        
-        # 幸运饼干升级
-        if game_state.has_upgrade('Fortune #100'):
-            multiplier *= 1.01
-        if game_state.has_upgrade('Fortune #101'):
-            multiplier *= 1.07
+        # 一次集合求交找出已拥有的倍数升级，通常为空
+        owned = game_state.upgrades_owned & _CPS_MULT_NAMES
+        if owned:
+            for upgrade_name, mult in CPS_MULT_UPGRADES.items():
+                if upgrade_name in owned:
+                    multiplier *= mult
         
         # 圣诞老人等级加成
         if game_state.has_upgrade("Santa's legacy"):
-            santa_level = getattr(game_state, 'santa_level', 0)
-            multiplier *= (1 + (santa_level + 1) * 0.03)
+            multiplier *= (1 + (game_state.santa_level + 1) * 0.03)
         
+        self._upgrade_mult_cache = (key, multiplier)
         return multiplier
     
     def _calculate_season_multiplier(self, game_state: GameState) -> float:
         """
         计算季节效果倍数
         """
-        multiplier = 1.0
-        
-        if game_state.season in SEASONS:
-            season_data = SEASONS[game_state.season]
-            if 'cps_mult' in season_data['effects']:
-                multiplier *= season_data['effects']['cps_mult']
-        
-        return multiplier
+        return _SEASON_CPS_MULT.get(game_state.season, 1.0)
     
     def _calculate_dragon_multiplier(self, game_state: GameState) -> float:
         """
-        计算龙系统倍数
+        计算龙系统倍数 (尚未实现，目前不参与全局倍数)
         """
         multiplier = 1.0
         
@@ -172,25 +240,21 @@ class CPSCalculator:
     def _calculate_pantheon_multiplier(self, game_state: GameState) -> float:
         """
         计算万神殿倍数
+        
+        空槽位(-1)、未知的神灵ID以及超出3个的槽位都不产生倍数
         """
         multiplier = 1.0
+        gods = len(PANTHEON_CPS_MULT)
         
-        # 禁欲主义神灵 (Holobore)
-        if hasattr(game_state, 'pantheon_slots'):
-            for i, god_id in enumerate(game_state.pantheon_slots):
-                if god_id == 0:  # Holobore的ID
-                    if i == 0:    # 钻石槽位
-                        multiplier *= 1.15
-                    elif i == 1:  # 红宝石槽位
-                        multiplier *= 1.10
-                    elif i == 2:  # 翡翠槽位
-                        multiplier *= 1.05
+        for slot, god_id in enumerate(getattr(game_state, 'pantheon_slots', ())[:_PANTHEON_SLOTS]):
+            if 0 <= god_id < gods:
+                multiplier *= PANTHEON_CPS_MULT[god_id][slot]
         
         return multiplier
     
     def _calculate_garden_multiplier(self, game_state: GameState) -> float:
         """
-        计算花园效果倍数
+        计算花园效果倍数 (尚未实现，目前不参与全局倍数)
         """
         multiplier = 1.0
         
@@ -199,35 +263,31 @@ class CPSCalculator:
         
         return multiplier
     
-    def _calculate_buff_multiplier(self, game_state: GameState) -> float:
+    def calculate_buff_multiplier(self, game_state: GameState) -> float:
         """
         计算buff效果倍数
         """
-        multiplier = 1.0
-        
-        # Frenzy效果
-        if 'frenzy' in game_state.buffs:
-            multiplier *= 7.0
-        
-        # Elder Frenzy效果
-        if 'elder_frenzy' in game_state.buffs:
-            multiplier *= 666.0
-        
-        # Clot效果 (负面buff)
-        if 'clot' in game_state.buffs:
-            multiplier *= 0.5
+        buffs = game_state.buffs
+        if not buffs:  # 绝大多数时间没有buff
+            return 1.0
         
-        # 其他buff效果
-        for buff_name, buff_data in game_state.buffs.items():
-            if 'cps_mult' in buff_data.get('effect', {}):
-                multiplier *= buff_data['effect']['cps_mult']
+        # 按名称生效的buff倍数与效果数据中的cps_mult在同一次遍历中累乘
+        multiplier = 1.0
+        for buff_name, buff in buffs.items():
+            multiplier *= _BUFF_MULTS.get(buff_name, 1.0)
+            multiplier *= buff.effect.get('cps_mult', 1.0)
         
         return multiplier
     
     def calculate_click_power(self, game_state: GameState) -> float:
         """
-        计算点击力量
+        计算点击力量 (与CPS取决于相同的状态，按同一缓存键缓存)
         """
+        key = self.get_state_key(game_state)
+        cached_key, click_power = self._click_cache
+        if cached_key == key:
+            return click_power
+        
         # 基础点击力量
         click_power = 1.0
         
@@ -248,51 +308,44 @@ class CPSCalculator:
         if 'dragonflight' in game_state.buffs:
             click_power *= 1111.0
         
+        self._click_cache = (key, click_power)
         return click_power
     
     def _calculate_click_multiplier(self, game_state: GameState) -> float:
         """
         计算点击倍数
         """
-        multiplier = 1.0
-        
-        # 点击升级
-        click_upgrades = [
-            'Reinforced index finger',
-            'Carpal tunnel prevention cream', 
-            'Ambidextrous',
-            'Thousand fingers',
-            'Million fingers',
-            'Billion fingers',
-            'Trillion fingers'
-        ]
-        
-        for upgrade_name in click_upgrades:
-            if game_state.has_upgrade(upgrade_name):
-                multiplier *= 2.0  # 大多数点击升级都是2倍
+        # 点击升级: 已拥有的点击升级集合求交后一次求幂
+        doublings = len(game_state.upgrades_owned & _CLICK_UPGRADES)
+        multiplier = 2.0 ** doublings
         
         return multiplier
     
-    def _get_cache_key(self, game_state: GameState) -> str:
+    def get_state_key(self, game_state: GameState) -> tuple:
+        """
+        CPS与点击力量所依赖状态的键: 键相同时calculate_total_cps/calculate_click_power的结果不变
+        """
+        return (game_state.uid, self._get_cache_key(game_state))
+    
+    def _get_cache_key(self, game_state: GameState) -> tuple:
         """
         生成缓存键
+        
+        建筑物、升级、牛奶的变化都会推进state_version，buff字典有自己的版本号；
+        声望相关属性、季节与圣诞老人等级会被直接赋值，单独放入键中
         """
-        # 简化的缓存键，实际应该包含所有影响CPS的因素
-        key_parts = [
-            str(game_state.buildings),
-            str(game_state.upgrades_owned),
-            str(game_state.prestige),
-            str(game_state.milk_progress),
-            str(game_state.buffs.keys())
-        ]
-        return '|'.join(key_parts)
+        return (game_state.state_version, game_state.buffs.version, game_state.prestige,
+                game_state.heavenly_power, game_state.ascension_mode, game_state.season,
+                game_state.santa_level)
     
     def invalidate_cache(self):
         """
         使缓存失效
+        
+        购买、buff等变化会改变缓存键，无需调用；只在直接修改了键中未包含的字段后使用
         """
         self.cache.clear()
-        self.cache_valid = False
+        self._click_cache = (None, 1.0)
     
     def get_cps_breakdown(self, game_state: GameState) -> Dict[str, float]:
         """
@@ -300,12 +353,12 @@ class CPSCalculator:
         """
         breakdown = {}
         
-        # 建筑物CPS
-        for building_name, building in BUILDINGS.items():
-            amount = game_state.get_building_count(building_name)
-            if amount > 0:
-                cps = building.get_cps_contribution(amount, game_state)
-                breakdown[building_name] = cps
+        # 建筑物CPS (一次内核调用算出全部建筑物的贡献)
+        building_cps = self._get_building_manager(game_state).get_building_cps()
+        amounts = game_state._amounts
+        for i, building_name in enumerate(BUILDINGS):
+            if amounts[i] > 0:
+                breakdown[building_name] = building_cps[i]
         
         # 特殊CPS
         special_cps = self._calculate_special_cps(game_state)
@@ -313,11 +366,11 @@ class CPSCalculator:
             breakdown['Special'] = special_cps
         
         # 全局倍数
-        global_mult = self._calculate_global_multiplier(game_state)
+        global_mult = self.calculate_global_multiplier(game_state)
         breakdown['Global Multiplier'] = global_mult
         
         # Buff倍数
-        buff_mult = self._calculate_buff_multiplier(game_state)
+        buff_mult = self.calculate_buff_multiplier(game_state)
         if buff_mult != 1.0:
             breakdown['Buff Multiplier'] = buff_mult
         
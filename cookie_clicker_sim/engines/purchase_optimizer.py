@@ -4,16 +4,40 @@
 负责分析最优的购买策略，包括建筑物和升级的效率计算
 """
 
+import heapq
 import math
 from typing import Dict, List, Optional, Tuple, Any
 from ..core.game_state import GameState
-from ..core.buildings import BUILDINGS, BuildingManager
-from ..core.upgrades import UPGRADES, UpgradeManager
-from .cps_calculator import CPSCalculator
+from ..core.buildings import BUILDINGS
+from ..core.upgrades import UPGRADES
+from .cps_calculator import CPSCalculator, CPS_MULT_UPGRADES, SPECIAL_CPS_UPGRADES
+
+
+def _build_upgrade_effects() -> Dict[str, tuple]:
+    """
+    把CPS效果为固定倍数或固定加成的升级整理成表，购买效率可以直接按当前CPS推算:
+    ('global_mult', 倍数) / ('special_add', CPS) / ('building_mult', 按BUILDINGS顺序的各建筑物倍数)
+    
+    小猫(牛奶)、Santa's legacy等效果随状态变化的升级不在表中，仍按拷贝状态重算的方式评估
+    """
+    effects = {name: ('global_mult', mult) for name, mult in CPS_MULT_UPGRADES.items()}
+    effects.update((name, ('special_add', cps)) for name, cps in SPECIAL_CPS_UPGRADES.items())
+    
+    building_upgrades = set()
+    for building in BUILDINGS.values():
+        building_upgrades |= building.get_multiplier_upgrades()
+    for name in building_upgrades:
+        factors = tuple(building.get_upgrade_factor(name) for building in BUILDINGS.values())
+        effects[name] = ('building_mult', factors)
+    return effects
+
+
+UPGRADE_EFFECTS: Dict[str, tuple] = _build_upgrade_effects()
 
 
 class PurchaseOption:
     """购买选项"""
+    __slots__ = ('type', 'name', 'price', 'efficiency', 'cps_increase', 'payback_time')
     
     def __init__(self, option_type: str, name: str, price: float, 
                  efficiency: float, cps_increase: float = 0.0):
@@ -35,9 +59,11 @@ class PurchaseOption:
 class PurchaseOptimizer:
     """购买优化器"""
     
-    def __init__(self):
-        self.cps_calculator = CPSCalculator()
+    def __init__(self, cps_calculator: Optional[CPSCalculator] = None):
+        # 与模拟器共用同一个计算器时，模拟步骤算过的CPS可以直接命中缓存
+        self.cps_calculator = cps_calculator or CPSCalculator()
         self.efficiency_cache = {}
+        self._ranking_cache = (None, [])  # (状态键, 按效率降序排列的全部选项)，见get_ranked_options
         
     def get_best_purchase(self, game_state: GameState, 
                          budget: Optional[float] = None) -> Optional[PurchaseOption]:
@@ -49,12 +75,35 @@ class PurchaseOptimizer:
         
         options = self.get_all_purchase_options(game_state, budget)
         
-        if not options:
-            return None
+        # 一次遍历取最高效的选择 (效率相同时取先出现的，与稳定降序排序后取首项一致)
+        return max(options, key=lambda x: x.efficiency, default=None)
+    
+    def get_ranked_options(self, game_state: GameState) -> List[PurchaseOption]:
+        """
+        获取按效率稳定降序排列的全部选项 (不限预算)，状态不变时直接返回缓存
         
-        # 按效率排序，返回最高效的选择
-        options.sort(key=lambda x: x.efficiency, reverse=True)
-        return options[0]
+        效率只取决于状态而与饼干数无关，所以列表在两次购买之间保持有效；
+        缓存键与CPS缓存相同，另加可购买升级集合的版本号
+        """
+        key = (self.cps_calculator.get_state_key(game_state),
+               game_state.get_upgrade_manager().get_available_version())
+        cached_key, options = self._ranking_cache
+        if cached_key != key:
+            options = self.get_purchase_priority_list(game_state, max_items=len(BUILDINGS) + len(UPGRADES))
+            self._ranking_cache = (key, options)
+        return options
+    
+    def get_best_ranked_purchase(self, game_state: GameState) -> Optional[PurchaseOption]:
+        """
+        从get_ranked_options中取第一个买得起的选项，结果与get_best_purchase相同
+        """
+        cookies = game_state.cookies
+        for option in self.get_ranked_options(game_state):
+            if option.price > cookies:
+                continue
+            if option.type == 'building' or UPGRADES[option.name].can_afford(game_state):
+                return option
+        return None
     
     def get_all_purchase_options(self, game_state: GameState, 
                                 budget: float) -> List[PurchaseOption]:
@@ -78,28 +127,13 @@ class PurchaseOptimizer:
         """
         获取建筑物购买选项
         """
-        options = []
+        # 价格、CPS增长与效率都由建筑物管理器按数组一次算出，只为买得起的建筑物创建选项
+        building_manager = game_state.get_building_manager()
+        prices = building_manager.get_prices()
+        cps_increases, efficiencies = building_manager.get_marginal_efficiencies(prices)
         
-        for building_name, building in BUILDINGS.items():
-            current_amount = game_state.get_building_count(building_name)
-            price = building.get_price(current_amount)
-            
-            if price <= budget:
-                efficiency = self._calculate_building_efficiency(
-                    building_name, current_amount, game_state
-                )
-                
-                # 计算CPS增长
-                current_cps = building.get_cps_contribution(current_amount, game_state)
-                new_cps = building.get_cps_contribution(current_amount + 1, game_state)
-                cps_increase = new_cps - current_cps
-                
-                option = PurchaseOption(
-                    'building', building_name, price, efficiency, cps_increase
-                )
-                options.append(option)
-        
-        return options
+        return [PurchaseOption('building', building_name, prices[i], efficiencies[i], cps_increases[i])
+                for i, building_name in enumerate(BUILDINGS) if prices[i] <= budget]
     
     def _get_upgrade_options(self, game_state: GameState, 
                             budget: float) -> List[PurchaseOption]:
@@ -107,7 +141,7 @@ class PurchaseOptimizer:
         获取升级购买选项
         """
         options = []
-        upgrade_manager = UpgradeManager(game_state)
+        upgrade_manager = game_state.get_upgrade_manager()
         
         for upgrade_name in upgrade_manager.get_affordable_upgrades():
             upgrade = UPGRADES[upgrade_name]
@@ -133,9 +167,7 @@ class PurchaseOptimizer:
         building = BUILDINGS[building_name]
         
         # 计算CPS增长
-        current_cps = building.get_cps_contribution(current_amount, game_state)
-        new_cps = building.get_cps_contribution(current_amount + 1, game_state)
-        cps_increase = new_cps - current_cps
+        cps_increase = building.marginal_cps(game_state)
         
         # 计算价格
         price = building.get_price(current_amount)
@@ -150,22 +182,55 @@ class PurchaseOptimizer:
         """
         upgrade = UPGRADES[upgrade_name]
         
+        effect = UPGRADE_EFFECTS.get(upgrade_name)
+        if effect is not None:
+            cps_increase = self._estimate_upgrade_cps_increase(upgrade_name, effect, game_state)
+            return cps_increase / upgrade.price if upgrade.price > 0 else 0.0
+        
         # 计算升级前后的CPS差异
         current_cps = self.cps_calculator.calculate_total_cps(game_state)
         
-        # 模拟购买升级
-        temp_state = game_state.copy()
-        temp_state.add_upgrade(upgrade_name)
-        
-        # 使缓存失效以重新计算
-        self.cps_calculator.invalidate_cache()
-        new_cps = self.cps_calculator.calculate_total_cps(temp_state)
+        # 模拟购买升级 (临时状态用完即归还，下次评估复用)
+        temp_state = GameState.acquire(game_state)
+        try:
+            temp_state.add_upgrade(upgrade_name)
+            
+            # 临时状态有自己的实例编号和更新后的版本号，不会命中原状态的缓存，无需清空缓存
+            new_cps = self.cps_calculator.calculate_total_cps(temp_state)
+        finally:
+            GameState.release(temp_state)
         
         cps_increase = new_cps - current_cps
         
         # 效率 = CPS增长 / 价格
         return cps_increase / upgrade.price if upgrade.price > 0 else 0.0
     
+    def _estimate_upgrade_cps_increase(self, upgrade_name: str, effect: tuple,
+                                       game_state: GameState) -> float:
+        """
+        按UPGRADE_EFFECTS中的效果由当前CPS推算购买升级后的CPS增长，不拷贝状态
+        """
+        if game_state.has_upgrade(upgrade_name):
+            return 0.0
+        
+        calculator = self.cps_calculator
+        kind, value = effect
+        if kind == 'global_mult':
+            return calculator.calculate_total_cps(game_state) * (value - 1.0)
+        
+        # 建筑物与固定加成在全局倍数和buff之前累加
+        scale = (calculator.calculate_global_multiplier(game_state)
+                 * calculator.calculate_buff_multiplier(game_state))
+        if kind == 'special_add':
+            return value * scale
+        
+        building_cps = game_state.get_building_manager().get_building_cps()
+        increase = 0.0
+        for cps, factor in zip(building_cps, value):
+            if factor != 1.0:
+                increase += cps * (factor - 1.0)
+        return increase * scale
+    
     def get_optimal_strategy(self, game_state: GameState, 
                            time_horizon: float = 3600) -> List[PurchaseOption]:
         """
@@ -186,17 +251,24 @@ class PurchaseOptimizer:
                 break
             
             # 执行购买
+            cps_before = self.cps_calculator.calculate_total_cps(temp_state)
+            bought_building = False
             if best_option.type == 'building':
-                building_manager = BuildingManager(temp_state)
+                building_manager = temp_state.get_building_manager()
                 if building_manager.buy_building(best_option.name):
                     strategy.append(best_option)
+                    bought_building = True
             elif best_option.type == 'upgrade':
-                upgrade_manager = UpgradeManager(temp_state)
+                upgrade_manager = temp_state.get_upgrade_manager()
                 if upgrade_manager.buy_upgrade(best_option.name):
                     strategy.append(best_option)
             
-            # 更新CPS
-            temp_state.cookies_per_second = self.cps_calculator.calculate_total_cps(temp_state)
+            # 更新CPS (买入建筑物时由边际CPS增量推算)
+            if bought_building:
+                temp_state.cookies_per_second = self.cps_calculator.add_building_cps(
+                    temp_state, best_option.name, cps_before)
+            else:
+                temp_state.cookies_per_second = self.cps_calculator.calculate_total_cps(temp_state)
         
         return strategy
     
@@ -214,11 +286,15 @@ class PurchaseOptimizer:
         
         efficiency_curve = []
         
+        # CPS增长与数量无关，只算一次；价格只在起点求幂，之后每多一个乘一次价格倍数
+        cps_increase = building.marginal_cps(game_state)
+        price = building.get_price(current_amount)
+        price_multiplier = building.price_multiplier
+        
         for amount in range(current_amount, current_amount + max_amount):
-            efficiency = self._calculate_building_efficiency(
-                building_name, amount, game_state
-            )
+            efficiency = cps_increase / price if price > 0 else 0.0
             efficiency_curve.append((amount, efficiency))
+            price *= price_multiplier
         
         return efficiency_curve
     
@@ -227,6 +303,12 @@ class PurchaseOptimizer:
         """
         寻找最优建筑物配比
         """
+        # 预算内没有买得起的升级时，贪心过程只会买建筑物 (买建筑物不会解锁新升级，预算只减不增)，
+        # 整个循环交给建筑物管理器的数值内核
+        if not self._has_upgrade_within_budget(game_state, total_budget):
+            amounts, _ = game_state.get_building_manager().greedy_purchase(total_budget)
+            return dict(zip(BUILDINGS, amounts))
+        
         # 使用贪心算法寻找最优配比
         optimal_ratio = {}
         temp_state = game_state.copy()
@@ -244,7 +326,7 @@ class PurchaseOptimizer:
                 break
             
             # 购买建筑物
-            building_manager = BuildingManager(temp_state)
+            building_manager = temp_state.get_building_manager()
             if building_manager.buy_building(best_option.name):
                 optimal_ratio[best_option.name] += 1
             else:
@@ -252,6 +334,17 @@ class PurchaseOptimizer:
         
         return optimal_ratio
     
+    def _has_upgrade_within_budget(self, game_state: GameState, budget: float) -> bool:
+        """
+        饼干数为budget时是否有可购买的升级 (与_get_upgrade_options的筛选条件一致)
+        """
+        for upgrade_name in game_state.get_upgrade_manager().get_available_upgrades():
+            upgrade = UPGRADES[upgrade_name]
+            if upgrade.price <= budget and (not upgrade.is_heavenly
+                                            or game_state.heavenly_chips >= upgrade.price):
+                return True
+        return False
+    
     def calculate_time_to_afford(self, target_price: float, 
                                game_state: GameState) -> float:
         """
@@ -274,41 +367,30 @@ class PurchaseOptimizer:
         """
         获取购买优先级列表
         """
-        # 获取所有可能的购买选项(不限制预算)
-        all_options = []
-        
-        # 建筑物选项
-        for building_name, building in BUILDINGS.items():
-            current_amount = game_state.get_building_count(building_name)
-            price = building.get_price(current_amount)
-            efficiency = self._calculate_building_efficiency(
-                building_name, current_amount, game_state
-            )
-            
-            current_cps = building.get_cps_contribution(current_amount, game_state)
-            new_cps = building.get_cps_contribution(current_amount + 1, game_state)
-            cps_increase = new_cps - current_cps
-            
-            option = PurchaseOption(
-                'building', building_name, price, efficiency, cps_increase
-            )
-            all_options.append(option)
+        # 获取所有可能的购买选项(不限制预算)，先存为并行列表，只为前max_items项创建PurchaseOption
+        # 建筑物选项 (全部建筑物的CPS增长与效率由一次内核调用算出；内核输出数组会被复用，先转为列表)
+        building_manager = game_state.get_building_manager()
+        prices = building_manager.get_prices()
+        cps_increases, efficiencies = building_manager.get_marginal_efficiencies(prices)
+        types = ['building'] * len(BUILDINGS)
+        names = list(BUILDINGS)
+        prices = prices.tolist()
+        efficiencies = efficiencies.tolist()
+        cps_increases = cps_increases.tolist()
         
         # 升级选项
-        upgrade_manager = UpgradeManager(game_state)
+        upgrade_manager = game_state.get_upgrade_manager()
         for upgrade_name in upgrade_manager.get_available_upgrades():
-            upgrade = UPGRADES[upgrade_name]
-            efficiency = self._calculate_upgrade_efficiency(upgrade_name, game_state)
-            
-            option = PurchaseOption(
-                'upgrade', upgrade_name, upgrade.price, efficiency
-            )
-            all_options.append(option)
-        
-        # 按效率排序
-        all_options.sort(key=lambda x: x.efficiency, reverse=True)
-        
-        return all_options[:max_items]
+            types.append('upgrade')
+            names.append(upgrade_name)
+            prices.append(UPGRADES[upgrade_name].price)
+            efficiencies.append(self._calculate_upgrade_efficiency(upgrade_name, game_state))
+            cps_increases.append(0.0)
+        
+        # 按效率取前max_items项 (与按效率稳定降序排序后截取的结果相同)
+        top = heapq.nlargest(max_items, range(len(names)), key=efficiencies.__getitem__)
+        return [PurchaseOption(types[i], names[i], prices[i], efficiencies[i], cps_increases[i])
+                for i in top]
     
     def simulate_purchase_sequence(self, game_state: GameState, 
                                  purchase_list: List[str], 
@@ -345,19 +427,26 @@ class PurchaseOptimizer:
             results['time_taken'] += wait_time
             
             # 执行购买
+            cps_before = self.cps_calculator.calculate_total_cps(temp_state)
+            bought_building = False
             if item_name in BUILDINGS:
-                building_manager = BuildingManager(temp_state)
+                building_manager = temp_state.get_building_manager()
                 if building_manager.buy_building(item_name):
                     results['purchases_made'].append(item_name)
                     results['total_cost'] += price
+                    bought_building = True
             elif item_name in UPGRADES:
-                upgrade_manager = UpgradeManager(temp_state)
+                upgrade_manager = temp_state.get_upgrade_manager()
                 if upgrade_manager.buy_upgrade(item_name):
                     results['purchases_made'].append(item_name)
                     results['total_cost'] += price
             
-            # 更新CPS
-            temp_state.cookies_per_second = self.cps_calculator.calculate_total_cps(temp_state)
+            # 更新CPS (买入建筑物时由边际CPS增量推算)
+            if bought_building:
+                temp_state.cookies_per_second = self.cps_calculator.add_building_cps(
+                    temp_state, item_name, cps_before)
+            else:
+                temp_state.cookies_per_second = self.cps_calculator.calculate_total_cps(temp_state)
         
         results['final_cps'] = temp_state.cookies_per_second
         results['cps_improvement'] = results['final_cps'] - results['initial_cps']
@@ -4,25 +4,63 @@
 Cookie Clicker的完整游戏模拟引擎
 """
 
-import time
-import copy
+from array import array
+from dataclasses import dataclass
 from typing import Dict, List, Optional, Callable, Any
 from ..core.game_state import GameState
-from ..core.buildings import BuildingManager
-from ..core.upgrades import UpgradeManager
+from ..core.upgrades import UPGRADES
 from .cps_calculator import CPSCalculator
 from .purchase_optimizer import PurchaseOptimizer
+from ._fastloop import run_quiescent
+
+
+# 一次最多跳过的空闲时间步数 (CPS为0时的上限)
+_MAX_IDLE_STEPS = 1 << 62
+
+# 自动点击的频率 (次/秒)
+_AUTO_CLICKS_PER_SECOND = 10
+
+
+@dataclass(slots=True)
+class SimulationStats:
+    """模拟统计数据 (每个时间步都会更新，用槽属性代替字典)"""
+    total_time: float = 0.0
+    total_steps: int = 0
+    cookies_produced: float = 0.0
+    buildings_bought: int = 0
+    upgrades_bought: int = 0
+    ascensions: int = 0
+    
+    def to_dict(self) -> Dict[str, Any]:
+        """
+        转为新的普通字典 (字段都是数值，不需要dataclasses.asdict的逐字段深拷贝)
+        """
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+class _SimulationClock:
+    """
+    模拟器的虚拟时钟: 返回已模拟的秒数，由simulate_step推进，不查询系统时间
+    """
+    __slots__ = ('now',)
+    
+    def __init__(self):
+        self.now = 0.0
+    
+    def __call__(self) -> float:
+        return self.now
 
 
 class GameSimulator:
     """游戏模拟器"""
     
     def __init__(self, initial_state: Optional[GameState] = None):
-        self.game_state = initial_state or GameState()
+        self._clock = _SimulationClock()
+        self.game_state = initial_state or GameState(clock=self._clock)
         self.cps_calculator = CPSCalculator()
-        self.purchase_optimizer = PurchaseOptimizer()
-        self.building_manager = BuildingManager(self.game_state)
-        self.upgrade_manager = UpgradeManager(self.game_state)
+        self.purchase_optimizer = PurchaseOptimizer(self.cps_calculator)
+        self.building_manager = self.game_state.get_building_manager()
+        self.upgrade_manager = self.game_state.get_upgrade_manager()
         
         # 模拟设置
         self.auto_buy_enabled = True
@@ -30,54 +68,50 @@ class GameSimulator:
         self.auto_ascend_enabled = False
         
         # 统计数据
-        self.simulation_stats = {
-            'total_time': 0.0,
-            'total_steps': 0,
-            'cookies_produced': 0.0,
-            'buildings_bought': 0,
-            'upgrades_bought': 0,
-            'ascensions': 0
-        }
+        self.simulation_stats = SimulationStats()
         
-        # 事件回调
+        # 事件回调 (_has_callbacks为False时触发事件直接返回)
         self.event_callbacks = {}
+        self._has_callbacks = False
+        
+        # 上一次计算CPS时的状态键，键不变时simulate_step沿用game_state.cookies_per_second
+        self._cps_key = None
     
     def reset(self, new_state: Optional[GameState] = None):
         """重置模拟器"""
-        self.game_state = new_state or GameState()
-        self.building_manager = BuildingManager(self.game_state)
-        self.upgrade_manager = UpgradeManager(self.game_state)
+        self._clock = _SimulationClock()
+        self.game_state = new_state or GameState(clock=self._clock)
+        self.building_manager = self.game_state.get_building_manager()
+        self.upgrade_manager = self.game_state.get_upgrade_manager()
         self.cps_calculator.invalidate_cache()
+        self._cps_key = None
         
         # 重置统计
-        self.simulation_stats = {
-            'total_time': 0.0,
-            'total_steps': 0,
-            'cookies_produced': 0.0,
-            'buildings_bought': 0,
-            'upgrades_bought': 0,
-            'ascensions': 0
-        }
+        self.simulation_stats = SimulationStats()
     
     def simulate_step(self, dt: float = 1.0):
         """
         模拟一个时间步长
         """
-        # 更新CPS
-        self.game_state.cookies_per_second = self.cps_calculator.calculate_total_cps(
-            self.game_state
-        )
+        # 每步多次用到的属性先取到局部变量
+        game_state = self.game_state
+        stats = self.simulation_stats
+        cps_calculator = self.cps_calculator
+        
+        # 更新CPS (状态键与上一步相同时CPS不变，不必再查询计算器)
+        cps_key = cps_calculator.get_state_key(game_state)
+        if cps_key != self._cps_key:
+            game_state.cookies_per_second = cps_calculator.calculate_total_cps(game_state)
+            self._cps_key = cps_key
         
         # 生产饼干
-        cookies_produced = self.game_state.cookies_per_second * dt
-        self.game_state.earn_cookies(cookies_produced)
-        self.simulation_stats['cookies_produced'] += cookies_produced
+        cookies_produced = game_state.cookies_per_second * dt
+        game_state.earn_cookies(cookies_produced)
+        stats.cookies_produced += cookies_produced
         
-        # 更新buff状态
-        self.game_state.update_buffs(dt)
-        
-        # 更新升级解锁状态
-        self.upgrade_manager.update_unlocks()
+        # 更新buff状态 (buff时钟只用于相对计时，没有buff时不推进也不影响之后添加的buff)
+        if game_state.buffs:
+            game_state.update_buffs(dt)
         
         # 自动点击
         if self.auto_click_enabled:
@@ -92,38 +126,191 @@ class GameSimulator:
             self._auto_ascend()
         
         # 更新时间
-        self.game_state.game_time += dt
-        self.game_state.last_update = time.time()
-        self.simulation_stats['total_time'] += dt
-        self.simulation_stats['total_steps'] += 1
+        game_state.game_time += dt
+        self._clock.now += dt
+        stats.total_time += dt
+        stats.total_steps += 1
         
         # 触发事件回调
-        self._trigger_event('step', dt)
+        if self._has_callbacks:
+            self._trigger_event('step', dt)
     
     def simulate_time_period(self, duration: float, time_step: float = 1.0):
         """
         模拟指定时间段
         """
-        steps = int(duration / time_step)
-        remaining_time = duration % time_step
+        self.upgrade_manager.update_unlocks()
+        
+        # 时长与步长都是整数时(最常见的 duration=3600, time_step=1.0)按整数整除，步数与尾步都是精确的
+        if float(duration).is_integer() and float(time_step).is_integer():
+            steps, remaining_time = divmod(int(duration), int(time_step))
+        else:
+            steps = int(duration / time_step)
+            remaining_time = duration % time_step
         
-        for _ in range(steps):
-            self.simulate_step(time_step)
+        # 没有任何逐步生效的逻辑时，整段时间的逐步累加交给数值内核一次完成
+        if self._is_quiescent():
+            self._fast_forward(time_step, steps)
+            if remaining_time > 0:
+                self._fast_forward(remaining_time, 1)
+            return self.game_state
+        
+        simulate_step = self.simulate_step
+        can_skip_idle_steps = self._can_skip_idle_steps
+        done = 0
+        while done < steps:
+            # 只有自动购买时，两次购买之间的空闲时间步一次跳过
+            if can_skip_idle_steps():
+                done += self._advance_to_purchase(time_step, steps - done)
+            else:
+                simulate_step(time_step)
+                done += 1
         
         if remaining_time > 0:
             self.simulate_step(remaining_time)
         
         return self.game_state
     
+    def _is_quiescent(self) -> bool:
+        """
+        接下来的时间步是否只是按不变的CPS(及点击力量)生产饼干 (没有自动购买、重生、buff和逐步回调)
+        """
+        return not (self.auto_buy_enabled or self._has_step_logic())
+    
+    def _can_skip_idle_steps(self) -> bool:
+        """
+        是否只有自动购买在逐步生效，可以跳过购买之间的空闲时间步
+        """
+        return self.auto_buy_enabled and not self._has_step_logic()
+    
+    def _has_step_logic(self) -> bool:
+        """
+        是否有需要逐步模拟的逻辑 (自动重生、buff计时、逐步回调)；自动点击可以整段累加
+        """
+        return bool(self.auto_ascend_enabled or self.game_state.buffs
+                    or (self._has_callbacks and self.event_callbacks.get('step')))
+    
+    def simulate_until_event(self, max_time: float, time_step: float = 1.0) -> float:
+        """
+        模拟到下一次自动购买发生的时间步(含该步)或max_time为止，返回推进的时间
+        
+        购买之前的空闲时间步一次累加完成，结果与逐步调用simulate_step一致；
+        有其他逐步逻辑时只模拟一步
+        """
+        max_steps = int(max_time / time_step)
+        if max_steps <= 0:
+            return 0.0
+        
+        self.upgrade_manager.update_unlocks()
+        stats = self.simulation_stats
+        purchases = stats.buildings_bought + stats.upgrades_bought
+        done = 0
+        while done < max_steps:
+            if not self._can_skip_idle_steps():
+                self.simulate_step(time_step)
+                return (done + 1) * time_step
+            done += self._advance_to_purchase(time_step, max_steps - done)
+            if stats.buildings_bought + stats.upgrades_bought != purchases:
+                break
+        return done * time_step
+    
+    def _advance_to_purchase(self, dt: float, max_steps: int) -> int:
+        """
+        跳过确定不会购买的时间步，再正常模拟一步 (通常在这一步购买)，返回推进的步数
+        """
+        cps = self.cps_calculator.calculate_total_cps(self.game_state)
+        cookies_from_clicks, clicks = self._get_auto_click_yield(dt)
+        
+        idle_steps = min(self._count_idle_steps(cps * dt + cookies_from_clicks, clicks), max_steps - 1)
+        self._fast_forward(dt, idle_steps)
+        self.simulate_step(dt)
+        return idle_steps + 1
+    
+    def _count_idle_steps(self, cookies_per_step: float, clicks_per_step: int = 0) -> int:
+        """
+        饼干数达到最便宜选项的价格之前，确定不会发生购买的时间步数 (留两步余量吸收浮点误差)
+        
+        自动点击会在途中按点击次数解锁新升级，步数同时限制在下一个点击阈值之前
+        """
+        game_state = self.game_state
+        limit = _MAX_IDLE_STEPS
+        if clicks_per_step > 0:
+            threshold = self.upgrade_manager.get_next_threshold(('clicks',))
+            if threshold is not None:
+                limit = max(0, int((threshold - game_state.cookie_clicks) // clicks_per_step) - 2)
+        
+        cheapest = min(game_state.get_building_manager().get_prices())
+        for upgrade_name in self.upgrade_manager.get_available_upgrades():
+            upgrade = UPGRADES[upgrade_name]
+            if upgrade.price < cheapest and (not upgrade.is_heavenly
+                                             or game_state.heavenly_chips >= upgrade.price):
+                cheapest = upgrade.price
+        
+        shortfall = cheapest - game_state.cookies
+        if shortfall <= 0:
+            return 0
+        if cookies_per_step <= 0:
+            return limit
+        return min(limit, max(0, int(min(shortfall / cookies_per_step, _MAX_IDLE_STEPS)) - 2))
+    
+    def _fast_forward(self, dt: float, steps: int):
+        """
+        推进一段静止期的steps个时间步: CPS和点击力量只算一次，各累计量的逐步加法由run_quiescent完成
+        """
+        if steps <= 0:
+            return
+        
+        game_state = self.game_state
+        stats = self.simulation_stats
+        game_state.cookies_per_second = self.cps_calculator.calculate_total_cps(game_state)
+        cookies_produced = game_state.cookies_per_second * dt
+        cookies_from_clicks, clicks = self._get_auto_click_yield(dt)
+        
+        # 累计量: 饼干、累计饼干、生产统计、游戏时间、时钟、总时间、手工饼干；
+        # 每步先加生产的饼干再加点击的饼干，与simulate_step的顺序一致
+        totals = array('d', (game_state.cookies, game_state.cookies_earned, stats.cookies_produced,
+                             game_state.game_time, self._clock.now, stats.total_time,
+                             game_state.handmade_cookies))
+        if self.auto_click_enabled:
+            targets = array('q', (0, 0, 1, 1, 2, 3, 4, 5, 6))
+            increments = array('d', (cookies_produced, cookies_from_clicks,
+                                     cookies_produced, cookies_from_clicks,
+                                     cookies_produced, dt, dt, dt, cookies_from_clicks))
+        else:
+            targets = array('q', (0, 1, 2, 3, 4, 5))
+            increments = array('d', (cookies_produced, cookies_produced, cookies_produced, dt, dt, dt))
+        run_quiescent(totals, targets, increments, steps)
+        (game_state.cookies, game_state.cookies_earned, stats.cookies_produced,
+         game_state.game_time, self._clock.now, stats.total_time,
+         game_state.handmade_cookies) = totals
+        
+        # _count_idle_steps保证途中不会越过点击解锁阈值，累加完只需检查一次
+        if clicks:
+            game_state.cookie_clicks += clicks * steps
+            self.upgrade_manager.on_click()
+        
+        stats.total_steps += steps
+    
+    def _get_auto_click_yield(self, dt: float):
+        """
+        每个时间步自动点击获得的 (饼干, 点击次数)；未开启自动点击时为 (0.0, 0)
+        """
+        if not self.auto_click_enabled:
+            return 0.0, 0
+        click_power = self.cps_calculator.calculate_click_power(self.game_state)
+        return click_power * _AUTO_CLICKS_PER_SECOND * dt, int(_AUTO_CLICKS_PER_SECOND * dt)
+    
     def simulate_until_condition(self, condition: Callable[[GameState], bool], 
                                max_time: float = 86400, time_step: float = 1.0) -> bool:
         """
         模拟直到满足条件
         """
+        self.upgrade_manager.update_unlocks()
+        simulate_step = self.simulate_step
         elapsed_time = 0.0
         
         while elapsed_time < max_time:
-            self.simulate_step(time_step)
+            simulate_step(time_step)
             elapsed_time += time_step
             
             if condition(self.game_state):
@@ -135,14 +322,12 @@ class GameSimulator:
         """
         自动点击逻辑
         """
-        # 简单的自动点击：每秒点击10次
-        clicks_per_second = 10
-        click_power = self.cps_calculator.calculate_click_power(self.game_state)
-        
-        cookies_from_clicks = click_power * clicks_per_second * dt
+        # 简单的自动点击：每秒点击_AUTO_CLICKS_PER_SECOND次
+        cookies_from_clicks, clicks = self._get_auto_click_yield(dt)
         self.game_state.earn_cookies(cookies_from_clicks)
         self.game_state.handmade_cookies += cookies_from_clicks
-        self.game_state.cookie_clicks += int(clicks_per_second * dt)
+        self.game_state.cookie_clicks += clicks
+        self.upgrade_manager.on_click()
     
     def _auto_purchase(self):
         """
@@ -152,7 +337,8 @@ class GameSimulator:
         purchases_made = 0
         
         while purchases_made < max_purchases_per_step:
-            best_option = self.purchase_optimizer.get_best_purchase(self.game_state)
+            # 排好序的选项在两次购买之间不变，每次只需找出第一个买得起的
+            best_option = self.purchase_optimizer.get_best_ranked_purchase(self.game_state)
             
             if not best_option:
                 break
@@ -161,15 +347,16 @@ class GameSimulator:
             if best_option.type == 'building':
                 success = self.building_manager.buy_building(best_option.name)
                 if success:
-                    self.simulation_stats['buildings_bought'] += 1
+                    self.simulation_stats.buildings_bought += 1
+                    self.upgrade_manager.on_building_bought(best_option.name)
             elif best_option.type == 'upgrade':
                 success = self.upgrade_manager.buy_upgrade(best_option.name)
                 if success:
-                    self.simulation_stats['upgrades_bought'] += 1
+                    self.simulation_stats.upgrades_bought += 1
+                    self.upgrade_manager.on_upgrade_bought(best_option.name)
             
             if success:
                 purchases_made += 1
-                self.cps_calculator.invalidate_cache()  # 使缓存失效
                 self._trigger_event('purchase', best_option)
             else:
                 break
@@ -207,12 +394,14 @@ class GameSimulator:
         self.game_state.reset_for_ascension()
         
         # 重新初始化管理器
-        self.building_manager = BuildingManager(self.game_state)
-        self.upgrade_manager = UpgradeManager(self.game_state)
+        self.building_manager = self.game_state.get_building_manager()
+        self.upgrade_manager = self.game_state.get_upgrade_manager()
+        self.upgrade_manager.update_unlocks()
         self.cps_calculator.invalidate_cache()
+        self._cps_key = None
         
         # 更新统计
-        self.simulation_stats['ascensions'] += 1
+        self.simulation_stats.ascensions += 1
         
         # 触发事件
         self._trigger_event('ascension', prestige_gain)
@@ -227,6 +416,7 @@ class GameSimulator:
         self.game_state.earn_cookies(total_cookies)
         self.game_state.handmade_cookies += total_cookies
         self.game_state.cookie_clicks += times
+        self.upgrade_manager.on_click()
         
         self._trigger_event('click', {'times': times, 'cookies': total_cookies})
     
@@ -236,8 +426,8 @@ class GameSimulator:
         """
         success = self.building_manager.buy_building(building_name, amount)
         if success:
-            self.cps_calculator.invalidate_cache()
-            self.simulation_stats['buildings_bought'] += amount
+            self.simulation_stats.buildings_bought += amount
+            self.upgrade_manager.on_building_bought(building_name)
             self._trigger_event('building_purchase', {
                 'name': building_name, 
                 'amount': amount
@@ -250,8 +440,8 @@ class GameSimulator:
         """
         success = self.upgrade_manager.buy_upgrade(upgrade_name)
         if success:
-            self.cps_calculator.invalidate_cache()
-            self.simulation_stats['upgrades_bought'] += 1
+            self.simulation_stats.upgrades_bought += 1
+            self.upgrade_manager.on_upgrade_bought(upgrade_name)
             self._trigger_event('upgrade_purchase', {'name': upgrade_name})
         return success
     
@@ -260,7 +450,6 @@ class GameSimulator:
         添加buff效果
         """
         self.game_state.add_buff(buff_name, duration, effect)
-        self.cps_calculator.invalidate_cache()
         self._trigger_event('buff_added', {
             'name': buff_name, 
             'duration': duration, 
@@ -282,15 +471,15 @@ class GameSimulator:
                 'prestige': self.game_state.prestige,
                 'heavenly_chips': self.game_state.heavenly_chips
             },
-            'simulation_stats': self.simulation_stats.copy(),
+            'simulation_stats': self.simulation_stats.to_dict(),
             'efficiency_metrics': {
-                'cookies_per_hour': (self.simulation_stats['cookies_produced'] / 
-                                   max(self.simulation_stats['total_time'], 1) * 3600),
-                'average_cps': (self.simulation_stats['cookies_produced'] / 
-                              max(self.simulation_stats['total_time'], 1)),
-                'purchases_per_hour': ((self.simulation_stats['buildings_bought'] + 
-                                      self.simulation_stats['upgrades_bought']) / 
-                                     max(self.simulation_stats['total_time'], 1) * 3600)
+                'cookies_per_hour': (self.simulation_stats.cookies_produced / 
+                                   max(self.simulation_stats.total_time, 1) * 3600),
+                'average_cps': (self.simulation_stats.cookies_produced / 
+                              max(self.simulation_stats.total_time, 1)),
+                'purchases_per_hour': ((self.simulation_stats.buildings_bought + 
+                                      self.simulation_stats.upgrades_bought) / 
+                                     max(self.simulation_stats.total_time, 1) * 3600)
             }
         }
     
@@ -315,11 +504,14 @@ class GameSimulator:
         if event_name not in self.event_callbacks:
             self.event_callbacks[event_name] = []
         self.event_callbacks[event_name].append(callback)
+        self._has_callbacks = True
     
     def _trigger_event(self, event_name: str, data: Any = None):
         """
         触发事件回调
         """
+        if not self._has_callbacks:
+            return
         if event_name in self.event_callbacks:
             for callback in self.event_callbacks[event_name]:
                 try:
@@ -327,13 +519,22 @@ class GameSimulator:
                 except Exception as e:
                     print(f"Error in event callback {event_name}: {e}")
     
+    def touch_last_update(self):
+        """
+        更新game_state.last_update (模拟步进时不逐步更新，需要读取前调用)
+        
+        时间取自状态自己的时钟，与session_start同一基准：模拟器创建的状态为模拟时间，
+        外部传入的initial_state为其创建时使用的时钟
+        """
+        self.game_state.touch_last_update()
+    
     def save_state(self) -> Dict[str, Any]:
         """
         保存当前状态
         """
         return {
             'game_state': self.game_state.to_dict(),
-            'simulation_stats': self.simulation_stats.copy(),
+            'simulation_stats': self.simulation_stats.to_dict(),
             'settings': {
                 'auto_buy_enabled': self.auto_buy_enabled,
                 'auto_click_enabled': self.auto_click_enabled,
@@ -349,7 +550,8 @@ class GameSimulator:
         self.game_state.from_dict(state_data['game_state'])
 
         # 加载统计数据
-        self.simulation_stats.update(state_data.get('simulation_stats', {}))
+        for field_name, value in state_data.get('simulation_stats', {}).items():
+            setattr(self.simulation_stats, field_name, value)
 
         # 加载设置
         settings = state_data.get('settings', {})
@@ -358,17 +560,16 @@ class GameSimulator:
         self.auto_ascend_enabled = settings.get('auto_ascend_enabled', False)
 
         # 重新初始化管理器
-        self.building_manager = BuildingManager(self.game_state)
-        self.upgrade_manager = UpgradeManager(self.game_state)
-        self.cps_calculator.invalidate_cache()
+        self.building_manager = self.game_state.get_building_manager()
+        self.upgrade_manager = self.game_state.get_upgrade_manager()
 
-        # 重新计算CPS
+        # 重新计算CPS (from_dict推进了状态版本号，缓存键随之改变，无需清空缓存)
         self.game_state.cookies_per_second = self.cps_calculator.calculate_total_cps(self.game_state)
     
     def __str__(self):
         return (f"GameSimulator(cookies={self.game_state.cookies:.0f}, "
                 f"cps={self.game_state.cookies_per_second:.1f}, "
-                f"time={self.simulation_stats['total_time']:.1f}s)")
+                f"time={self.simulation_stats.total_time:.1f}s)")
     
     def __repr__(self):
         return self.__str__()
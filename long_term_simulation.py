@@ -86,7 +86,7 @@ class LongTermSimulator:
             'total_buildings': gs.get_total_buildings(),
             'upgrades_owned': len(gs.upgrades_owned),
             'achievements': len(gs.achievements),
-            'ascensions': self.simulator.simulation_stats['ascensions']
+            'ascensions': self.simulator.simulation_stats.ascensions
         }
         
         self.data_points.append(data_point)
@@ -98,8 +98,8 @@ def create_comprehensive_charts():
         strategy_results['Auto Optimization'] = {
             'final_cookies': simulator.game_state.cookies,
             'final_cps': simulator.game_state.cookies_per_second,
-            'total_purchases': (simulator.simulation_stats['buildings_bought'] + 
-                              simulator.simulation_stats['upgrades_bought']),
+            'total_purchases': (simulator.simulation_stats.buildings_bought + 
+                              simulator.simulation_stats.upgrades_bought),
             'efficiency': simulator.game_state.cookies / 4  # 每小时饼干数
         }
         
@@ -123,7 +123,7 @@ def create_comprehensive_charts():
         strategy_results['Cheap Buildings'] = {
             'final_cookies': sim_b.game_state.cookies,
             'final_cps': sim_b.game_state.cookies_per_second,
-            'total_purchases': sim_b.simulation_stats['buildings_bought'],
+            'total_purchases': sim_b.simulation_stats.buildings_bought,
             'efficiency': sim_b.game_state.cookies / 4
         }
         
@@ -136,8 +136,8 @@ def create_comprehensive_charts():
         strategy_results['Balanced Development'] = {
             'final_cookies': sim_c.game_state.cookies,
             'final_cps': sim_c.game_state.cookies_per_second,
-            'total_purchases': (sim_c.simulation_stats['buildings_bought'] + 
-                              sim_c.simulation_stats['upgrades_bought']),
+            'total_purchases': (sim_c.simulation_stats.buildings_bought + 
+                              sim_c.simulation_stats.upgrades_bought),
             'efficiency': sim_c.game_state.cookies / 4
         }
         
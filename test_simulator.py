@@ -84,6 +84,9 @@ def test_optimization():
     simulator = GameSimulator()
     simulator.game_state.cookies = 10000  # 给足够的饼干
     
+    # 优化器与模拟器共用同一个CPS计算器
+    assert simulator.purchase_optimizer.cps_calculator is simulator.cps_calculator
+    
     # 测试购买建议
     recommendations = simulator.get_purchase_recommendations(3)
     print(f"✓ 购买建议数量: {len(recommendations)}")
@@ -98,6 +101,34 @@ def test_optimization():
         print("✓ 无可购买项目")
 
 
+def test_ranked_options():
+    """测试缓存的效率排名与逐次计算的结果一致"""
+    print("\n=== 测试效率排名缓存 ===")
+    
+    def describe(option):
+        return None if option is None else (option.type, option.name, option.price, option.efficiency)
+    
+    _reset_upgrade_state()
+    simulator = GameSimulator()
+    optimizer = simulator.purchase_optimizer
+    game_state = simulator.game_state
+    game_state.cookies = 500
+    
+    for _ in range(20):
+        ranked = optimizer.get_ranked_options(game_state)
+        assert optimizer.get_ranked_options(game_state) is ranked
+        full = optimizer.get_purchase_priority_list(game_state, max_items=len(ranked) + 1)
+        assert [describe(o) for o in ranked] == [describe(o) for o in full]
+        assert (describe(optimizer.get_best_ranked_purchase(game_state))
+                == describe(optimizer.get_best_purchase(game_state)))
+        
+        simulator.simulate_time_period(120)
+        assert optimizer.get_ranked_options(game_state) is not ranked
+    _reset_upgrade_state()
+    
+    print("✓ 排名缓存与完整计算一致，状态变化后重新计算")
+
+
 def test_simulation_period():
     """测试时间段模拟"""
     print("\n=== 测试时间段模拟 ===")
@@ -134,6 +165,26 @@ def test_simulation_period():
     print(f"  购买的升级: {stats['upgrades_bought']}")
 
 
+def test_prediction_batch():
+    """测试批量时间预测与逐个预测一致"""
+    print("\n=== 测试批量时间预测 ===")
+    
+    from cookie_clicker_sim.analysis.predictor import ProgressPredictor
+    
+    predictor = ProgressPredictor()
+    game_state = GameState()
+    game_state.cookies = 1000
+    targets = [0, 500, 1000, 1000.5, 2e4, 1e12]
+    
+    for cps in (0.0, 0.1, 37.5):
+        game_state.cookies_per_second = cps
+        batch = predictor.predict_time_to_cookies_batch(game_state, targets)
+        single = [predictor.predict_time_to_cookies(game_state, target) for target in targets]
+        assert batch.tolist() == single, (cps, batch.tolist(), single)
+    
+    print("✓ 批量预测与predict_time_to_cookies逐个结果一致 (含已达到目标与CPS为0的情况)")
+
+
 def test_save_load():
     """测试保存和加载"""
     print("\n=== 测试保存和加载 ===")
@@ -170,6 +221,131 @@ def test_save_load():
         print("✗ 保存/加载测试失败")
 
 
+def test_to_dict_without_snapshot():
+    """测试to_dict(snapshot=False)与快照内容一致，且不复制建筑物字典"""
+    print("\n=== 测试免复制序列化 ===")
+    
+    import json
+    
+    game_state = GameState()
+    game_state.cookies = 1234.5
+    game_state.buildings['Grandma'] = 3
+    game_state.set_building_level('Farm', 2)
+    game_state.add_upgrade('Reinforced index finger')
+    
+    snapshot = game_state.to_dict()
+    live = game_state.to_dict(snapshot=False)
+    assert json.dumps(live, sort_keys=True) == json.dumps(snapshot, sort_keys=True)
+    assert live['buildings'] is game_state.buildings
+    assert live['building_levels'] is game_state.building_levels
+    
+    # 快照是独立副本，之后的修改不影响它
+    game_state.buildings['Grandma'] = 4
+    assert snapshot['buildings']['Grandma'] == 3
+    assert live['buildings']['Grandma'] == 4
+    
+    restored = GameState()
+    restored.from_dict(json.loads(json.dumps(snapshot)))
+    assert restored.buildings['Grandma'] == 3 and restored.building_levels['Farm'] == 2
+    
+    print("✓ snapshot=False直接引用内部字典，序列化结果与快照相同")
+
+
+def test_state_pool():
+    """测试状态池复用的实例不残留上一次的内容"""
+    print("\n=== 测试状态池 ===")
+    
+    from cookie_clicker_sim import CPSCalculator
+    
+    GameState._pool.clear()
+    calculator = CPSCalculator()
+    
+    used = GameState()
+    used.buildings['Cursor'] = 10
+    used.add_upgrade('Reinforced index finger')
+    used.add_buff('Frenzy', 77, {'cps_mult': 7})
+    used.get_upgrade_manager()
+    
+    pooled = GameState.acquire(used)
+    assert calculator.calculate_total_cps(pooled) > 0
+    upgrade_version = pooled.upgrades_owned.version
+    state_version = pooled.state_version
+    GameState.release(pooled)
+    
+    fresh = GameState.acquire(GameState())
+    assert fresh is pooled
+    assert not any(fresh.buildings.values()) and not any(fresh._amounts)
+    assert not fresh.upgrades_owned and fresh.upgrades_owned_mask == 0
+    assert not fresh.buffs and not fresh._buff_heap
+    assert fresh._upgrade_manager is None
+    assert fresh.upgrades_owned.version > upgrade_version
+    assert fresh.state_version > state_version
+    assert calculator.calculate_total_cps(fresh) == 0
+    
+    GameState.release(fresh)
+    GameState._pool.clear()
+    print("✓ 复用的实例没有残留的建筑物、升级、buff和管理器，版本号向前推进")
+
+
+def _reset_upgrade_state():
+    """清空模块级的升级解锁/购买标记，使前后两次模拟互不影响"""
+    from cookie_clicker_sim.core import upgrades
+    for upgrade in upgrades.UPGRADES.values():
+        upgrade.unlocked = False
+        upgrade.bought = False
+    upgrades._AVAILABLE_UPGRADES.clear()
+
+
+def _run_recorded(seed, duration, time_step, per_tick):
+    """
+    按固定初始状态模拟一段时间，返回最终状态、统计和购买时间线
+    
+    per_tick=True时注册step回调，迫使模拟器逐tick推进而不走快速路径
+    """
+    import random
+    from dataclasses import asdict
+    
+    _reset_upgrade_state()
+    rng = random.Random(seed)
+    simulator = GameSimulator()
+    game_state = simulator.game_state
+    game_state.cookies = rng.uniform(15, 1e4)
+    simulator.auto_click_enabled = seed % 2 == 0
+    for name in ('Cursor', 'Grandma', 'Farm'):
+        game_state.buildings[name] = rng.randint(0, 5)
+    
+    if per_tick:
+        simulator.set_event_callback('step', lambda state, dt: None)
+    timeline = []
+    simulator.set_event_callback(
+        'purchase', lambda state, option: timeline.append((state.game_time, option.name)))
+    simulator.simulate_time_period(duration, time_step)
+    
+    return {
+        'cookies': game_state.cookies,
+        'cookies_earned': game_state.cookies_earned,
+        'game_time': game_state.game_time,
+        'buildings': dict(game_state.buildings),
+        'upgrades': sorted(game_state.upgrades_owned),
+        'stats': asdict(simulator.simulation_stats),
+        'timeline': timeline,
+    }
+
+
+def test_fast_path_matches_stepping():
+    """测试快速路径与逐tick模拟结果完全一致"""
+    print("\n=== 测试快速路径一致性 ===")
+    
+    for seed in range(4):
+        for duration, time_step in ((3600, 1.0), (2000.5, 0.5), (500, 0.1)):
+            fast = _run_recorded(seed, duration, time_step, per_tick=False)
+            stepped = _run_recorded(seed, duration, time_step, per_tick=True)
+            assert fast == stepped, (seed, duration, time_step)
+    _reset_upgrade_state()
+    
+    print("✓ 快速路径与逐tick模拟的状态、统计和购买时间线一致")
+
+
 def run_performance_test():
     """运行性能测试"""
     print("\n=== 性能测试 ===")
@@ -210,8 +386,13 @@ if __name__ == "__main__":
         test_basic_functionality()
         test_simulator()
         test_optimization()
+        test_ranked_options()
         test_simulation_period()
+        test_prediction_batch()
         test_save_load()
+        test_to_dict_without_snapshot()
+        test_state_pool()
+        test_fast_path_matches_stepping()
         run_performance_test()
         
         print("\n" + "=" * 40)
@@ -245,6 +245,36 @@ def test_data_collection():
         return False
 
 
+def test_downsample():
+    """测试长曲线降采样"""
+    print("\n=== 测试曲线降采样 ===")
+    
+    import numpy as np
+    from cookie_clicker_sim.analysis.visualizer import _downsample
+    
+    x = np.arange(100000, dtype=np.float64)
+    y = np.sin(x / 500) * x
+    sampled_x, sampled_y = _downsample(x, y, 2000)
+    
+    # 保留首尾点，x单调递增，选出的都是原始数据点
+    assert len(sampled_x) == len(sampled_y) == 2000
+    assert sampled_x[0] == x[0] and sampled_x[-1] == x[-1]
+    assert np.all(np.diff(sampled_x) > 0)
+    assert np.array_equal(sampled_y, y[sampled_x.astype(np.intp)])
+    
+    # 孤立的尖峰不会被均值抹掉
+    spike = np.zeros_like(x)
+    spike[54321] = 1e9
+    assert _downsample(x, spike, 500)[1].max() == 1e9
+    
+    # 点数不超过目标时原样返回
+    short_x, short_y = _downsample([0, 1, 2], [3, 4, 5])
+    assert short_x.tolist() == [0, 1, 2] and short_y.tolist() == [3, 4, 5]
+    
+    print("✓ 降采样保留首尾点与极值，短序列原样返回")
+    return True
+
+
 def run_quick_demo():
     """运行快速演示"""
     print("\n=== 快速可视化演示 ===")
@@ -310,6 +340,7 @@ if __name__ == "__main__":
         test_basic_charts,
         test_advanced_charts,
         test_data_collection,
+        test_downsample,
         run_quick_demo
     ]
     